@@ -0,0 +1,5 @@
+from dotenv import load_dotenv
+
+# Settings are read from the environment when the app modules are imported
+# (engine, scheduler, caches), so backend/.env is loaded before any of them.
+load_dotenv()
@@ -0,0 +1,212 @@
+"""Token-budgeted conversation context for chat turns.
+
+A turn's context is a rolling summary of the session's older messages
+plus as many recent messages as fit in CONTEXT_TOKEN_BUDGET, filled newest
+first. Once the unsummarized messages fill most of the budget,
+`summarize_session` (run in the background after the reply is sent) folds
+the oldest of them into the summary, so prompt size stays flat however
+long a session gets.
+"""
+import os
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from app import models
+from app.database import SessionLocal, run_db
+from app.resilience import llm_policy
+from app.scheduler import llm_scheduler, estimate_tokens
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+# Summarize once unsummarized history passes this share of the budget ...
+SUMMARY_TRIGGER_RATIO = float(os.getenv("SUMMARY_TRIGGER_RATIO", "0.75"))
+# ... folding the oldest messages until this share is left
+SUMMARY_KEEP_RATIO = float(os.getenv("SUMMARY_KEEP_RATIO", "0.5"))
+SUMMARY_MAX_CHARS = int(os.getenv("SUMMARY_MAX_CHARS", "600"))
+# Upper bound on messages read per turn, whatever their size
+CONTEXT_SCAN_LIMIT = 200
+
+def count_tokens(text: str) -> int:
+    return estimate_tokens([text])
+
+@dataclass
+class SessionContext:
+    summary: Optional[str] = None
+    # (role, content) oldest first; the last one is the current user message
+    messages: List[Tuple[str, str]] = field(default_factory=list)
+    # Unsummarized messages already stored for the session (at most
+    # CONTEXT_SCAN_LIMIT), not counting `current`
+    stored_messages: int = 0
+    # Unsummarized history is over the trigger; schedule summarize_session
+    needs_summary: bool = False
+
+def _format_message(m) -> str:
+    return f"{m.role}: {m.content}"
+
+def _load_unsummarized(db: Session, user_id: int, session_id: str):
+    summary = db.query(models.SessionSummary).filter(
+        models.SessionSummary.user_id == user_id,
+        models.SessionSummary.session_id == session_id
+    ).first()
+    query = db.query(models.ChatMessage).filter(
+        models.ChatMessage.user_id == user_id,
+        models.ChatMessage.session_id == session_id
+    )
+    if summary:
+        query = query.filter(models.ChatMessage.id > summary.covered_until_id)
+    # Same order as the history endpoint, so ix_chat_messages_user_session_created serves it unsorted
+    newest_first = query.order_by(
+        models.ChatMessage.created_at.desc(), models.ChatMessage.id.desc()
+    ).limit(CONTEXT_SCAN_LIMIT).all()
+    return summary, newest_first
+
+def build_context(
+    db: Session,
+    user_id: int,
+    session_id: str,
+    budget: int = CONTEXT_TOKEN_BUDGET,
+    current: Optional[models.ChatMessage] = None
+) -> SessionContext:
+    """Summary plus the newest messages that fit in `budget` tokens.
+
+    `current` is the turn's user message when it hasn't been written yet;
+    it is counted as the newest message.
+    """
+    summary, newest_first = _load_unsummarized(db, user_id, session_id)
+    stored_messages = len(newest_first)
+    if current is not None:
+        newest_first = ([current] + newest_first)[:CONTEXT_SCAN_LIMIT]
+
+    used = count_tokens(summary.summary) if summary else 0
+    messages = []
+    for m in newest_first:
+        cost = count_tokens(m.content)
+        if used + cost > budget:
+            if not messages:
+                # Always send the current message, cut to what is left
+                messages.append((m.role, m.content[:max(0, budget - used) * 2]))
+            break
+        messages.append((m.role, m.content))
+        used += cost
+
+    unsummarized = used + sum(count_tokens(m.content) for m in newest_first[len(messages):])
+    return SessionContext(
+        summary=summary.summary if summary else None,
+        messages=list(reversed(messages)),
+        stored_messages=stored_messages,
+        needs_summary=unsummarized > budget * SUMMARY_TRIGGER_RATIO or len(newest_first) == CONTEXT_SCAN_LIMIT
+    )
+
+def _oldest_unsummarized(db: Session, user_id: int, session_id: str, after_id: int):
+    """Yields the session's messages after `after_id`, oldest first, a page at a time."""
+    Message = models.ChatMessage
+    query = db.query(Message).filter(
+        Message.user_id == user_id,
+        Message.session_id == session_id,
+        Message.id > after_id
+    ).order_by(Message.created_at.asc(), Message.id.asc())
+    page = query.limit(CONTEXT_SCAN_LIMIT).all()
+    while page:
+        yield page
+        if len(page) < CONTEXT_SCAN_LIMIT:
+            return
+        last = page[-1]
+        page = query.filter(tuple_(Message.created_at, Message.id) > (last.created_at, last.id)).limit(CONTEXT_SCAN_LIMIT).all()
+
+def _pending_summary(user_id: int, session_id: str, budget: int) -> Optional[Tuple[str, List[str], int]]:
+    """Returns (previous summary, messages to fold, last folded id), or None if nothing to do.
+
+    Folds from the oldest unsummarized message upward, so everything up to
+    the returned id really is in the new summary. One pass folds at most
+    CONTEXT_SCAN_LIMIT messages; a longer backlog is caught up by the
+    passes that later turns schedule.
+    """
+    db = SessionLocal()
+    try:
+        summary = db.query(models.SessionSummary).filter(
+            models.SessionSummary.user_id == user_id,
+            models.SessionSummary.session_id == session_id
+        ).first()
+        remaining = count_tokens(summary.summary) if summary else 0
+        total = 0
+        # (id, line, cost) of the oldest page: the only messages this pass may fold
+        candidates = []
+        for page in _oldest_unsummarized(db, user_id, session_id, summary.covered_until_id if summary else 0):
+            for m in page:
+                line = _format_message(m)
+                cost = count_tokens(line)
+                if len(candidates) < CONTEXT_SCAN_LIMIT:
+                    candidates.append((m.id, line, cost))
+                remaining += cost
+                total += 1
+        if remaining <= budget * SUMMARY_TRIGGER_RATIO:
+            return None
+
+        # Fold the oldest messages, but never the latest exchange
+        fold = 0
+        while fold < min(len(candidates), total - 2) and remaining > budget * SUMMARY_KEEP_RATIO:
+            remaining -= candidates[fold][2]
+            fold += 1
+        if not fold:
+            return None
+        return (summary.summary if summary else ""), [line for _, line, _ in candidates[:fold]], candidates[fold - 1][0]
+    finally:
+        db.close()
+
+def _store_summary(user_id: int, session_id: str, text: str, covered_until_id: int):
+    db = SessionLocal()
+    try:
+        now = datetime.now()
+        stmt = insert(models.SessionSummary).values(
+            user_id=user_id, session_id=session_id, summary=text,
+            covered_until_id=covered_until_id, updated_at=now
+        )
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[models.SessionSummary.user_id, models.SessionSummary.session_id],
+            set_={"summary": text, "covered_until_id": covered_until_id, "updated_at": now}
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+def _summary_prompt(previous: str, lines: List[str]) -> str:
+    return (
+        "あなたは家庭教師アプリの記録係です。以下の「これまでの要約」と「続きの会話」を一つの要約にまとめてください。\n"
+        "生徒が質問した内容、理解できた点・つまずいている点、次に取り組むことが分かるようにし、"
+        f"{SUMMARY_MAX_CHARS}字以内の日本語で、要約本文のみを出力してください。\n\n"
+        f"【これまでの要約】\n{previous or '（なし）'}\n\n"
+        "【続きの会話】\n" + "\n".join(lines)
+    )
+
+# (user_id, session_id) pairs being summarized by this process
+_in_progress = set()
+
+async def summarize_session(llm, user_id: int, session_id: str, budget: int = CONTEXT_TOKEN_BUDGET):
+    """Folds the session's oldest unsummarized messages into its summary.
+
+    Meant to run after the reply has been sent; failures only mean the next
+    turn sees a shorter window, so they are logged and dropped.
+    """
+    key = (user_id, session_id)
+    if llm is None or key in _in_progress:
+        return
+    _in_progress.add(key)
+    try:
+        pending = await run_db(_pending_summary, user_id, session_id, budget)
+        if pending is None:
+            return
+        previous, lines, covered_until_id = pending
+        prompt = _summary_prompt(previous, lines)
+        text = await llm_policy.call(
+            lambda: llm.generate([prompt]),
+            slot=lambda: llm_scheduler.slot(user_id, count_tokens(prompt))
+        )
+        llm_scheduler.charge(count_tokens(text))
+        await run_db(_store_summary, user_id, session_id, text.strip()[:SUMMARY_MAX_CHARS], covered_until_id)
+    except Exception as e:
+        print(f"Session summary failed for {session_id}: {e}", file=sys.stderr)
+    finally:
+        _in_progress.discard(key)
@@ -1,19 +1,76 @@
-from sqlalchemy import create_engine
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./ai_tutor.db"
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./ai_tutor.db")
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+def _sqlite_pragmas():
+    return {
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+        "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+        # Negative values are KiB, so this is a 64 MiB page cache per connection
+        "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),
+    }
+
+def create_db_engine(url: str = SQLALCHEMY_DATABASE_URL):
+    """Creates the engine, applying the SQLite pragmas to every new connection.
+
+    WAL lets readers (history polling, admin logs) run alongside the single
+    writer instead of blocking on it. All settings come from the environment.
+    """
+    if not url.startswith("sqlite"):
+        return create_engine(url, pool_pre_ping=True)
+
+    in_memory = url in ("sqlite://", "sqlite:///:memory:")
+    pool_args = {}
+    if not in_memory:
+        pool_args = {
+            "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+            "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        }
+    db_engine = create_engine(url, connect_args={"check_same_thread": False}, **pool_args)
+    pragmas = _sqlite_pragmas()
+
+    @event.listens_for(db_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not in_memory:
+            cursor.execute(f"PRAGMA journal_mode={pragmas['journal_mode']}")
+        cursor.execute(f"PRAGMA synchronous={pragmas['synchronous']}")
+        cursor.execute(f"PRAGMA busy_timeout={pragmas['busy_timeout']}")
+        cursor.execute(f"PRAGMA mmap_size={pragmas['mmap_size']}")
+        cursor.execute(f"PRAGMA cache_size={pragmas['cache_size']}")
+        cursor.close()
+
+    return db_engine
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+# Dedicated threads for blocking DB work issued from async handlers, so a slow
+# query or commit never stalls the event loop for other users.
+db_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("DB_EXECUTOR_THREADS", "4")),
+    thread_name_prefix="db"
+)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def run_db(fn, *args, **kwargs):
+    """Runs a synchronous DB function on the DB executor and awaits its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, functools.partial(fn, *args, **kwargs))
@@ -1,14 +1,77 @@
+import json
+from dataclasses import asdict, dataclass
+from typing import Optional
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from fastapi import Depends
 from app.database import get_db
 from app import models
+from app.cache import user_cache, settings_cache
+from app.shared import bus
 
-def get_current_user(db: Session = Depends(get_db)):
+@dataclass(frozen=True)
+class CurrentUser:
+    """Immutable snapshot of a User row, safe to share across requests."""
+    id: int
+    username: str
+    email: Optional[str] = None
+
+@dataclass(frozen=True)
+class CachedSettings:
+    id: int
+    learning_mode: str
+
+def get_current_user(db: Session = Depends(get_db)) -> CurrentUser:
     # Simple logic for now: always use a default user
-    user = db.query(models.User).filter(models.User.username == "demo_user").first()
+    username = "demo_user"
+    cached = user_cache.get(username)
+    if cached:
+        return cached
+
+    user = db.query(models.User).filter(models.User.username == username).first()
     if not user:
-        user = models.User(username="demo_user", email="demo@example.com")
+        user = models.User(username=username, email="demo@example.com")
         db.add(user)
+        try:
+            db.commit()
+            db.refresh(user)
+        except IntegrityError:
+            # Another request created it concurrently
+            db.rollback()
+            user = db.query(models.User).filter(models.User.username == username).one()
+
+    current = CurrentUser(id=user.id, username=user.username, email=user.email)
+    user_cache.set(username, current)
+    return current
+
+def cache_settings(settings: models.UserSettings) -> CachedSettings:
+    """Writes a UserSettings row through to the settings cache."""
+    cached = CachedSettings(id=settings.id, learning_mode=settings.learning_mode)
+    settings_cache.set(settings.user_id, cached)
+    return cached
+
+def share_settings(settings: models.UserSettings) -> CachedSettings:
+    """Writes changed settings through to the settings cache of every worker."""
+    cached = cache_settings(settings)
+    bus.publish("settings", str(settings.user_id), json.dumps(asdict(cached)))
+    return cached
+
+def _on_settings_changed(user_id: str, value: Optional[str]):
+    settings_cache.set(int(user_id), CachedSettings(**json.loads(value)))
+
+bus.subscribe("settings", _on_settings_changed)
+
+def get_user_settings(db: Session, user_id: int) -> CachedSettings:
+    """Returns the user's settings from cache, creating the default row if missing."""
+    cached = settings_cache.get(user_id)
+    if cached:
+        return cached
+
+    settings = db.query(models.UserSettings).filter(models.UserSettings.user_id == user_id).first()
+    if not settings:
+        # Create default settings if not exists
+        settings = models.UserSettings(user_id=user_id, learning_mode="supportive")
+        db.add(settings)
         db.commit()
-        db.refresh(user)
-    return user
+        db.refresh(settings)
+    return cache_settings(settings)
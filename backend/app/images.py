@@ -0,0 +1,141 @@
+import os
+import asyncio
+import functools
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Optional
+from app.cache import TTLCache
+
+MAX_UPLOAD_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(15 * 1024 * 1024)))
+# Photos larger than this (longest side, px) are downscaled before they are stored
+MAX_DIMENSION = int(os.getenv("UPLOAD_MAX_DIMENSION", "2048"))
+REENCODE_FORMAT = os.getenv("UPLOAD_REENCODE_FORMAT", "JPEG").upper()
+REENCODE_QUALITY = int(os.getenv("UPLOAD_REENCODE_QUALITY", "85"))
+CHUNK_SIZE = 1024 * 1024
+# Images sent to the model are downscaled to this size and JPEG-compressed
+MODEL_MAX_DIMENSION = int(os.getenv("MODEL_IMAGE_MAX_DIMENSION", "1536"))
+MODEL_IMAGE_QUALITY = int(os.getenv("MODEL_IMAGE_QUALITY", "80"))
+
+# Decoding and resizing are CPU heavy; Pillow releases the GIL for most of it
+image_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("IMAGE_WORKERS", "2")),
+    thread_name_prefix="image"
+)
+
+EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "GIF": "gif"}
+
+class UploadTooLarge(Exception):
+    pass
+
+class UnsupportedImage(Exception):
+    pass
+
+def sniff_image_type(header: bytes) -> Optional[str]:
+    """Detects the image format from its magic bytes instead of trusting the filename."""
+    if header.startswith(b"\xff\xd8\xff"):
+        return "JPEG"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "PNG"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "WEBP"
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return "GIF"
+    return None
+
+def save_stream(source: BinaryIO, dest_path: str, max_bytes: int = MAX_UPLOAD_BYTES) -> int:
+    """Copies `source` to `dest_path` in chunks, aborting as soon as it exceeds max_bytes."""
+    written = 0
+    try:
+        with open(dest_path, "wb") as out:
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > max_bytes:
+                    raise UploadTooLarge(f"File exceeds {max_bytes} bytes")
+                out.write(chunk)
+    except Exception:
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        raise
+    return written
+
+def finalize_upload(tmp_path: str, dest_base: str) -> str:
+    """Validates the uploaded file and stores it as `dest_base`.<ext>.
+
+    Oversized photos are rotated upright, downscaled to MAX_DIMENSION and
+    re-encoded; everything else is kept byte for byte. Returns the final path.
+    """
+    import PIL.Image
+    import PIL.ImageOps
+
+    try:
+        with open(tmp_path, "rb") as f:
+            kind = sniff_image_type(f.read(16))
+        if kind is None:
+            raise UnsupportedImage("Unsupported image type")
+
+        try:
+            with PIL.Image.open(tmp_path) as img:
+                if max(img.size) <= MAX_DIMENSION:
+                    img.verify()
+                    resized = None
+                else:
+                    resized = PIL.ImageOps.exif_transpose(img)
+                    resized.thumbnail((MAX_DIMENSION, MAX_DIMENSION))
+                    if REENCODE_FORMAT == "JPEG" and resized.mode not in ("RGB", "L"):
+                        resized = resized.convert("RGB")
+        except PIL.Image.DecompressionBombError:
+            raise UploadTooLarge("Image has too many pixels")
+        except (PIL.UnidentifiedImageError, OSError, SyntaxError):
+            # Truncated or corrupt data behind valid magic bytes
+            raise UnsupportedImage("Unsupported image type")
+
+        if resized is None:
+            dest_path = f"{dest_base}.{EXTENSIONS[kind]}"
+            shutil.move(tmp_path, dest_path)
+            return dest_path
+
+        dest_path = f"{dest_base}.{EXTENSIONS.get(REENCODE_FORMAT, 'jpg')}"
+        resized.save(dest_path, REENCODE_FORMAT, quality=REENCODE_QUALITY)
+        return dest_path
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def prepare_model_image(path: str) -> dict:
+    """Decodes, downscales and JPEG-encodes an image into an inline model part."""
+    import io
+    import PIL.Image
+    import PIL.ImageOps
+
+    with PIL.Image.open(path) as img:
+        img = PIL.ImageOps.exif_transpose(img)
+        img.thumbnail((MODEL_MAX_DIMENSION, MODEL_MAX_DIMENSION))
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        buffer = io.BytesIO()
+        img.save(buffer, "JPEG", quality=MODEL_IMAGE_QUALITY)
+    return {"mime_type": "image/jpeg", "data": buffer.getvalue()}
+
+# (path, mtime_ns, size) -> prepared part; a replaced file gets a new key
+model_image_cache = TTLCache(
+    maxsize=int(os.getenv("MODEL_IMAGE_CACHE_SIZE", "64")),
+    ttl=float(os.getenv("MODEL_IMAGE_CACHE_TTL_SECONDS", "3600"))
+)
+
+async def load_model_image(path: str) -> dict:
+    """Returns the prepared model part for `path`, preparing it off the event loop on a miss."""
+    stat = await run_image(os.stat, path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    part = model_image_cache.get(key)
+    if part is None:
+        part = await run_image(prepare_model_image, path)
+        model_image_cache.set(key, part)
+    return part
+
+async def run_image(fn, *args, **kwargs):
+    """Runs blocking file or image work on the image executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(image_executor, functools.partial(fn, *args, **kwargs))
@@ -0,0 +1,155 @@
+"""In-process queue for writes that can happen after the response is sent.
+
+Jobs are plain functions taking a Session as their first argument. A single
+worker drains the bounded queue, runs everything waiting (up to
+WRITE_BATCH_SIZE jobs, gathered for at most WRITE_BATCH_WINDOW_MS) in one
+transaction on the DB executor and commits once, so a burst of chat turns
+costs one SQLite write lock instead of one per turn. If a batch fails, its
+jobs are retried one transaction each so a bad job can't take the others
+down with it. `drain()` is awaited on shutdown so queued writes aren't lost.
+"""
+import os
+import sys
+import time
+import asyncio
+from typing import Callable, List, Optional, Set, Tuple
+from app.database import SessionLocal, run_db
+
+_STOP = object()
+
+class WriteQueue:
+    def __init__(self, max_size: int = 1000, batch_size: int = 50, batch_window: float = 0.02):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # submit_detached tasks still waiting to put their job
+        self._detached: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.jobs_done = 0
+        self.jobs_failed = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_size=int(os.getenv("WRITE_QUEUE_MAX", "1000")),
+            batch_size=int(os.getenv("WRITE_BATCH_SIZE", "50")),
+            batch_window=float(os.getenv("WRITE_BATCH_WINDOW_MS", "20")) / 1000.0
+        )
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._worker is not None and self._worker.get_loop() is not loop:
+            # A new event loop (e.g. a restarted test client): the old worker can't run
+            self._queue = self._worker = None
+        if self._worker is None or self._worker.done():
+            self._queue = self._queue or asyncio.Queue(self.max_size)
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, fn: Callable, *args) -> asyncio.Future:
+        """Queues `fn(db, *args)`; waits only if the queue is full.
+
+        Returns a future that resolves once the job's transaction has
+        committed (or fails with the job's error).
+        """
+        self._ensure_worker()
+        done = asyncio.get_running_loop().create_future()
+        await self._queue.put((fn, args, done))
+        return done
+
+    def submit_detached(self, fn: Callable, *args):
+        """Queues `fn(db, *args)` without awaiting, for callers being cancelled.
+
+        An await in a cancelled task (e.g. a stream whose client went away)
+        is interrupted, so the put runs in a task of its own instead.
+        `drain()` waits for these as well.
+        """
+        task = asyncio.get_running_loop().create_task(self.submit(fn, *args))
+        self._detached.add(task)
+        task.add_done_callback(self._detached.discard)
+
+    async def _next_batch(self) -> Tuple[List[tuple], bool]:
+        first = await self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_size:
+            try:
+                timeout = deadline - time.monotonic()
+                item = self._queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(self._queue.get(), timeout)
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._next_batch()
+            if not batch:
+                continue
+            try:
+                await run_db(_run_batch, [(fn, args) for fn, args, _ in batch])
+                results = [None] * len(batch)
+            except Exception as e:
+                print(f"Write batch of {len(batch)} failed, retrying one by one: {e}", file=sys.stderr)
+                results = await run_db(_run_each, [(fn, args) for fn, args, _ in batch])
+            self.batches += 1
+            for (_, _, done), error in zip(batch, results):
+                if error is None:
+                    self.jobs_done += 1
+                    if not done.done():
+                        done.set_result(None)
+                else:
+                    self.jobs_failed += 1
+                    if not done.done():
+                        done.set_exception(error)
+                        # Nobody may be waiting on it; don't warn about an unretrieved exception
+                        done.exception()
+
+    async def drain(self):
+        """Finishes every queued job, then stops the worker."""
+        if self._detached:
+            await asyncio.gather(*self._detached, return_exceptions=True)
+        if self._worker is None or self._worker.done():
+            return
+        await self._queue.put(_STOP)
+        await self._worker
+        self._worker = None
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "batches": self.batches,
+            "jobs_done": self.jobs_done,
+            "jobs_failed": self.jobs_failed,
+        }
+
+def _run_batch(jobs: List[tuple]):
+    db = SessionLocal()
+    try:
+        for fn, args in jobs:
+            fn(db, *args)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def _run_each(jobs: List[tuple]) -> List[Optional[Exception]]:
+    errors = []
+    for fn, args in jobs:
+        try:
+            _run_batch([(fn, args)])
+            errors.append(None)
+        except Exception as e:
+            print(f"Write job {getattr(fn, '__name__', fn)} failed: {e}", file=sys.stderr)
+            errors.append(e)
+    return errors
+
+write_queue = WriteQueue.from_env()
@@ -0,0 +1,175 @@
+"""LLM provider layer used by the chat router.
+
+`LLM_PROVIDER` selects the backend:
+- "gemini" (default): Google Gemini, needs GEMINI_API_KEY
+- "fake": deterministic local stand-in for benchmarks and load tests
+
+Requests are `contents` plus an optional `system` instruction. `contents` is
+either a list of parts (one user turn) or role-tagged turns in Gemini's
+shape, {"role": "user" | "model", "parts": [...]}. `system` should be a
+static persona: providers keep one configured model per distinct value.
+
+The provider is built on first use (`load_provider`), not at import:
+importing and configuring the Gemini SDK takes most of a second, which
+every worker and every tool importing the app would otherwise pay.
+"""
+import os
+import asyncio
+import random
+import threading
+from typing import Any, AsyncIterator, List, Optional
+
+class LLMError(Exception):
+    """An upstream error with an HTTP-like status code (e.g. 429)."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"{status_code} {message}")
+        self.status_code = status_code
+
+def prompt_text(contents: List[Any], system: Optional[str] = None) -> str:
+    """All text in a request, for token estimates and the fake provider."""
+    texts = [system] if system else []
+    for item in contents:
+        if isinstance(item, dict) and "parts" in item:
+            texts.extend(p for p in item["parts"] if isinstance(p, str))
+        elif isinstance(item, str):
+            texts.append(item)
+    return "".join(texts)
+
+class LLMProvider:
+    name = "base"
+
+    async def generate(self, contents: List[Any], system: Optional[str] = None) -> str:
+        raise NotImplementedError
+
+    def stream(self, contents: List[Any], system: Optional[str] = None) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def __init__(self, api_key: str, model_name: str):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self._genai = genai
+        self.model_name = model_name
+        # system instruction -> GenerativeModel; there are only a few personas
+        self._models = {}
+
+    def _model(self, system: Optional[str]):
+        model = self._models.get(system)
+        if model is None:
+            model = self._genai.GenerativeModel(self.model_name, system_instruction=system)
+            self._models[system] = model
+        return model
+
+    async def generate(self, contents: List[Any], system: Optional[str] = None) -> str:
+        response = await self._model(system).generate_content_async(contents)
+        return response.text
+
+    async def stream(self, contents: List[Any], system: Optional[str] = None) -> AsyncIterator[str]:
+        response = await self._model(system).generate_content_async(contents, stream=True)
+        async for chunk in response:
+            yield chunk.text
+
+class FakeProvider(LLMProvider):
+    """Local stand-in with configurable latency, token rate and error rate.
+
+    Replies are canned; mission-mode prompts (those asking for [[SCORE: ...]])
+    get [[RESULT:]] and [[SCORE:]] markers so the scoring path is exercised.
+    """
+
+    name = "fake"
+
+    REPLY = (
+        "いい質問ですね。まずは問題文をよく読んで、わかっている条件を整理してみましょう。"
+        "次に、使えそうな公式を一つずつ当てはめて確かめていきます。"
+        "途中式を自分の言葉で説明できれば、理解はかなり深まっていますよ。"
+    )
+
+    def __init__(
+        self,
+        latency_ms: float = 300.0,
+        tokens_per_sec: float = 50.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        seed: Optional[int] = None
+    ):
+        self.latency = latency_ms / 1000.0
+        self.tokens_per_sec = tokens_per_sec
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._random = random.Random(seed)
+
+    @classmethod
+    def from_env(cls):
+        seed = os.getenv("FAKE_LLM_SEED")
+        return cls(
+            latency_ms=float(os.getenv("FAKE_LLM_LATENCY_MS", "300")),
+            tokens_per_sec=float(os.getenv("FAKE_LLM_TOKENS_PER_SEC", "50")),
+            error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+            rate_limit_rate=float(os.getenv("FAKE_LLM_429_RATE", "0")),
+            seed=int(seed) if seed else None
+        )
+
+    def _reply_tokens(self, contents: List[Any], system: Optional[str]) -> List[str]:
+        # Roughly one token per two characters of Japanese text
+        tokens = [self.REPLY[i:i + 2] for i in range(0, len(self.REPLY), 2)]
+        if "[[SCORE: 数値]]" in prompt_text(contents, system):
+            score = self._random.randint(40, 95)
+            tokens += ["\n", "[[RESULT: ", "練習問題を", "解いた]]", "\n", "[[SCO", f"RE: {score}]]"]
+        return tokens
+
+    async def _start(self):
+        await asyncio.sleep(self.latency)
+        roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            raise LLMError(429, "Resource has been exhausted (fake)")
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise LLMError(500, "Internal error (fake)")
+
+    async def generate(self, contents: List[Any], system: Optional[str] = None) -> str:
+        await self._start()
+        tokens = self._reply_tokens(contents, system)
+        if self.tokens_per_sec > 0:
+            await asyncio.sleep(len(tokens) / self.tokens_per_sec)
+        return "".join(tokens)
+
+    async def stream(self, contents: List[Any], system: Optional[str] = None) -> AsyncIterator[str]:
+        await self._start()
+        for token in self._reply_tokens(contents, system):
+            if self.tokens_per_sec > 0:
+                await asyncio.sleep(1 / self.tokens_per_sec)
+            yield token
+
+def create_provider() -> Optional[LLMProvider]:
+    """Builds the configured provider, or None if Gemini has no API key."""
+    provider = os.getenv("LLM_PROVIDER", "gemini").lower()
+    if provider == "fake":
+        return FakeProvider.from_env()
+
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        return None
+    return GeminiProvider(api_key, os.getenv("GEMINI_MODEL", "gemini-2.0-flash"))
+
+_provider: Optional[LLMProvider] = None
+_provider_built = False
+_provider_lock = threading.Lock()
+
+def get_provider() -> Optional[LLMProvider]:
+    """The configured provider, built by the first caller."""
+    global _provider, _provider_built
+    if not _provider_built:
+        with _provider_lock:
+            if not _provider_built:
+                _provider = create_provider()
+                _provider_built = True
+    return _provider
+
+async def load_provider() -> Optional[LLMProvider]:
+    """get_provider() for async code: the first call builds it off the event loop."""
+    if _provider_built:
+        return _provider
+    return await asyncio.to_thread(get_provider)
@@ -0,0 +1,111 @@
+"""Parsing of the [[SCORE: n]] / [[RESULT: ...]] markers in tutor replies.
+
+Mission prompts ask the model to tag its reply with an understanding score
+and, optionally, quantitative results. Both are removed from the text shown
+to the student. One compiled pattern handles both marker kinds in a single
+pass; `MarkerParser` applies the same rules to a streamed reply chunk by
+chunk.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+MARKER_RE = re.compile(r"\[\[(?:SCORE:\s*(\d+)\s*|RESULT:\s*(.*?))\]\]")
+RESULT_SEPARATOR = " / "
+
+def clamp_score(value: int) -> int:
+    return max(0, min(100, value))
+
+@dataclass
+class Markers:
+    scores: List[int] = field(default_factory=list)
+    results: List[str] = field(default_factory=list)
+
+    def add(self, match: "re.Match"):
+        score, result = match.group(1), match.group(2)
+        if score is not None:
+            self.scores.append(clamp_score(int(score)))
+        elif result.strip():
+            self.results.append(result.strip())
+
+    @property
+    def score(self) -> Optional[int]:
+        # The prompt asks for the score at the end, so the last one wins
+        return self.scores[-1] if self.scores else None
+
+    @property
+    def result(self) -> Optional[str]:
+        return RESULT_SEPARATOR.join(self.results) if self.results else None
+
+@dataclass
+class ParsedReply(Markers):
+    text: str = ""
+
+def parse_markers(raw_text: str) -> ParsedReply:
+    """Returns the reply without markers, plus every score and result in it."""
+    reply = ParsedReply()
+
+    def collect(match):
+        reply.add(match)
+        return ""
+
+    reply.text = MARKER_RE.sub(collect, raw_text).strip()
+    return reply
+
+class MarkerParser(Markers):
+    """Removes markers from a stream of text chunks.
+
+    Text that could still turn into a marker (an unclosed "[[" or a trailing
+    "[") is held back until a later chunk decides it, so markers split
+    across chunks never leak to the client. Scores and results collected so
+    far are available as with ParsedReply.
+    """
+
+    # Give up on an unclosed "[[" after this many characters and emit it as text
+    MAX_MARKER_LEN = 200
+
+    def __init__(self):
+        super().__init__()
+        self._buffer = ""
+
+    def feed(self, chunk: str) -> str:
+        """Adds a chunk and returns the text that is now safe to show."""
+        if not self._buffer and "[" not in chunk:
+            return chunk
+        buffer = self._buffer + chunk
+        out = []
+        pos = 0
+        while True:
+            start = buffer.find("[[", pos)
+            if start == -1:
+                # Hold back a lone trailing "[" in case the next chunk starts with "["
+                end = len(buffer) - 1 if buffer.endswith("[") else len(buffer)
+                out.append(buffer[pos:end])
+                pos = end
+                break
+
+            out.append(buffer[pos:start])
+            pos = start
+            if buffer.find("]]", start) == -1:
+                if len(buffer) - start > self.MAX_MARKER_LEN:
+                    out.append("[")
+                    pos += 1
+                    continue
+                break
+
+            match = MARKER_RE.match(buffer, start)
+            if match:
+                self.add(match)
+                pos = match.end()
+            else:
+                # Not a marker; a later "[[" inside it may still be one
+                out.append("[")
+                pos += 1
+
+        self._buffer = buffer[pos:]
+        return "".join(out)
+
+    def flush(self) -> str:
+        """Returns whatever is still held back once the stream has ended."""
+        rest, self._buffer = self._buffer, ""
+        return rest
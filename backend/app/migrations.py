@@ -0,0 +1,133 @@
+"""Lightweight schema migrations for existing SQLite databases.
+
+`create_all` only creates missing tables, so anything added to an existing
+table (indexes, columns, virtual tables) is applied here. Each step runs
+once; the applied version is tracked in SQLite's `PRAGMA user_version`.
+
+Schema setup is an explicit step, never an import side effect: run
+
+    python -m app.migrations
+
+before starting the app (serve.py does it for its workers). The app's
+lifespan also runs it at startup unless AUTO_MIGRATE=0.
+"""
+import sys
+from sqlalchemy import text
+from app import models
+from app.progress import rebuild_plan_stats
+
+def _add_hot_path_indexes(conn):
+    for table in (models.ChatMessage.__table__, models.Memo.__table__, models.Plan.__table__):
+        for index in table.indexes:
+            index.create(bind=conn, checkfirst=True)
+
+def _add_memo_search(conn):
+    # External-content FTS5 index over memos.content. The trigram tokenizer
+    # matches any substring of 3+ characters, which suits Japanese text
+    # without word boundaries. Triggers keep it in sync with the table.
+    statements = [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS memos_fts USING fts5(
+            content, content='memos', content_rowid='id', tokenize='trigram'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS memos_fts_ai AFTER INSERT ON memos BEGIN
+            INSERT INTO memos_fts(rowid, content) VALUES (new.id, new.content);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS memos_fts_ad AFTER DELETE ON memos BEGIN
+            INSERT INTO memos_fts(memos_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS memos_fts_au AFTER UPDATE OF content ON memos BEGIN
+            INSERT INTO memos_fts(memos_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            INSERT INTO memos_fts(rowid, content) VALUES (new.id, new.content);
+        END""",
+        # Index the memos that already exist
+        "INSERT INTO memos_fts(memos_fts) VALUES ('rebuild')",
+    ]
+    for statement in statements:
+        conn.execute(text(statement))
+
+def _add_unified_search(conn):
+    # One FTS5 (trigram) index over chat messages and plan items. The rowid
+    # encodes the source row (chat message id * 2, plan item id * 2 + 1) so
+    # triggers can update and delete entries without scanning. `owner` holds
+    # an indexed per-user token ("‹user_id›"), so a user's search is an
+    # index intersection rather than a filter over everyone's matches.
+    statements = [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+            body, owner, kind UNINDEXED, ref_id UNINDEXED, parent UNINDEXED, tokenize='trigram'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS search_chat_ai AFTER INSERT ON chat_messages BEGIN
+            INSERT INTO search_index(rowid, body, owner, kind, ref_id, parent)
+            VALUES (new.id * 2, new.content, '‹' || new.user_id || '›', 'chat', new.id, new.session_id);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS search_chat_ad AFTER DELETE ON chat_messages BEGIN
+            DELETE FROM search_index WHERE rowid = old.id * 2;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS search_plan_item_ai AFTER INSERT ON plan_items BEGIN
+            INSERT INTO search_index(rowid, body, owner, kind, ref_id, parent)
+            SELECT new.id * 2 + 1, new.content || coalesce(char(10) || new.last_result, ''),
+                   '‹' || plans.user_id || '›', 'plan', new.id, new.plan_id
+            FROM plans WHERE plans.id = new.plan_id;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS search_plan_item_au AFTER UPDATE OF content, last_result ON plan_items BEGIN
+            DELETE FROM search_index WHERE rowid = old.id * 2 + 1;
+            INSERT INTO search_index(rowid, body, owner, kind, ref_id, parent)
+            SELECT new.id * 2 + 1, new.content || coalesce(char(10) || new.last_result, ''),
+                   '‹' || plans.user_id || '›', 'plan', new.id, new.plan_id
+            FROM plans WHERE plans.id = new.plan_id;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS search_plan_item_ad AFTER DELETE ON plan_items BEGIN
+            DELETE FROM search_index WHERE rowid = old.id * 2 + 1;
+        END""",
+        # Index the rows that already exist
+        """INSERT INTO search_index(rowid, body, owner, kind, ref_id, parent)
+            SELECT id * 2, content, '‹' || user_id || '›', 'chat', id, session_id FROM chat_messages""",
+        """INSERT INTO search_index(rowid, body, owner, kind, ref_id, parent)
+            SELECT plan_items.id * 2 + 1, plan_items.content || coalesce(char(10) || plan_items.last_result, ''),
+                   '‹' || plans.user_id || '›', 'plan', plan_items.id, plan_items.plan_id
+            FROM plan_items JOIN plans ON plans.id = plan_items.plan_id""",
+    ]
+    for statement in statements:
+        conn.execute(text(statement))
+
+def _add_plan_stats(conn):
+    for index in models.PlanItem.__table__.indexes:
+        index.create(bind=conn, checkfirst=True)
+    models.PlanStats.__table__.create(bind=conn, checkfirst=True)
+    # Materialize progress for the plans (and chat scores) that already exist
+    rebuild_plan_stats(conn)
+
+def _add_shared_events(conn):
+    models.SharedEvent.__table__.create(bind=conn, checkfirst=True)
+
+# (version, description, step) in the order they must be applied
+MIGRATIONS = [
+    (1, "composite indexes for chat history, memos and plans", _add_hot_path_indexes),
+    (2, "full-text search index for memos", _add_memo_search),
+    (3, "unified search index for chat messages and plan items", _add_unified_search),
+    (4, "materialized progress stats for plans", _add_plan_stats),
+    (5, "event table for cross-worker notifications", _add_shared_events),
+]
+
+def run_migrations(engine):
+    with engine.begin() as conn:
+        current = conn.execute(text("PRAGMA user_version")).scalar()
+        for version, description, step in MIGRATIONS:
+            if version <= current:
+                continue
+            print(f"Applying migration {version}: {description}", file=sys.stderr)
+            step(conn)
+            conn.execute(text(f"PRAGMA user_version = {version}"))
+
+def prepare_database(engine):
+    """Creates missing tables and applies pending migrations.
+
+    Runs once per deployment: serve.py calls it before starting the
+    workers, so they don't race each other through the migrations.
+    """
+    models.Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+if __name__ == "__main__":
+    from app.database import engine
+    prepare_database(engine)
+    print("Database is up to date", file=sys.stderr)
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, DateTime
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, DateTime, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -30,6 +30,11 @@ class Plan(Base):
     user = relationship("User", back_populates="plans")
     items = relationship("PlanItem", back_populates="plan", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # read_plans: WHERE user_id = ? ORDER BY created_at DESC
+        Index("ix_plans_user_created", "user_id", "created_at"),
+    )
+
 class PlanItem(Base):
     __tablename__ = "plan_items"
 
@@ -44,6 +49,27 @@ class PlanItem(Base):
     
     plan = relationship("Plan", back_populates="items")
 
+    __table_args__ = (
+        # Items of a plan (selectinload, progress stats): WHERE plan_id IN (...)
+        Index("ix_plan_items_plan", "plan_id"),
+    )
+
+class PlanStats(Base):
+    """Materialized progress of one plan, kept current by app/progress.py."""
+    __tablename__ = "plan_stats"
+
+    plan_id = Column(Integer, ForeignKey("plans.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    item_count = Column(Integer, default=0)
+    completed_count = Column(Integer, default=0)
+    score_sum = Column(Integer, default=0)  # sum of the items' understanding_score
+    latest_score = Column(Integer, nullable=True)
+    latest_score_at = Column(DateTime, nullable=True)
+    score_series = Column(Text, default="[]")  # JSON [[time, item id, score], ...], oldest first
+    overdue_count = Column(Integer, default=0)
+    next_due_at = Column(DateTime, nullable=True)  # earliest open due date not yet passed
+    updated_at = Column(DateTime, default=datetime.now)
+
 class Memo(Base):
     __tablename__ = "memos"
 
@@ -54,6 +80,11 @@ class Memo(Base):
 
     user = relationship("User", back_populates="memos")
 
+    __table_args__ = (
+        # read_memos: WHERE user_id = ? ORDER BY created_at DESC
+        Index("ix_memos_user_created", "user_id", "created_at"),
+    )
+
 class UserSettings(Base):
     __tablename__ = "user_settings"
 
@@ -78,6 +109,13 @@ class ChatMessage(Base):
 
     user = relationship("User", back_populates="chat_messages")
 
+    __table_args__ = (
+        # History and the chat context window: WHERE user_id = ? AND session_id = ? ORDER BY created_at
+        Index("ix_chat_messages_user_session_created", "user_id", "session_id", "created_at"),
+        # Admin log listing sorted by created_at DESC
+        Index("ix_chat_messages_created_at", "created_at"),
+    )
+
 class UploadSession(Base):
     __tablename__ = "upload_sessions"
 
@@ -89,3 +127,42 @@ class UploadSession(Base):
     created_at = Column(DateTime, default=datetime.now)
 
     user = relationship("User", back_populates="upload_sessions")
+
+class ResponseCacheEntry(Base):
+    """A cached free-talk reply, keyed by a hash of mode, prompt, question and image."""
+    __tablename__ = "response_cache"
+
+    key = Column(String, primary_key=True)
+    response = Column(Text)
+    hits = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.now, index=True)
+    last_used_at = Column(DateTime, default=datetime.now, index=True)
+
+class SessionSummary(Base):
+    """Rolling summary of a chat session's older messages (ids up to covered_until_id)."""
+    __tablename__ = "session_summaries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    session_id = Column(String)
+    summary = Column(Text)
+    covered_until_id = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "session_id", name="uq_session_summaries_user_session"),
+    )
+
+class SharedEvent(Base):
+    """A state change published by one worker for the others (see app/shared.py)."""
+    __tablename__ = "shared_events"
+
+    id = Column(Integer, primary_key=True)
+    origin = Column(String)  # publishing worker
+    channel = Column(String)
+    key = Column(String)
+    value = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.now, index=True)
+
+    # AUTOINCREMENT: ids are never reused after pruning, so pollers can't miss events
+    __table_args__ = {"sqlite_autoincrement": True}
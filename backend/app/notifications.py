@@ -0,0 +1,78 @@
+import asyncio
+from typing import Dict, Optional, Set
+from app.cache import TTLCache
+from app.shared import Bus, bus
+
+# Marks a session whose state hasn't been seen by this process yet
+UNKNOWN = object()
+
+class UploadNotifier:
+    """Wakes long-poll waiters when an image is uploaded for their session.
+
+    The latest image path per session is kept in memory, so waiters only
+    touch the DB the first time this process sees a session. Uploads and
+    resets go out on the shared bus, so a waiter in one worker is woken by
+    an upload handled by another. wait() must be called from the event
+    loop; publish() and reset() may write to the bus's database, so async
+    code calls them through run_db.
+    """
+
+    def __init__(self, bus: Bus, maxsize: int = 10000, ttl: float = 3600.0):
+        self._bus = bus
+        self._state = TTLCache(maxsize, ttl)
+        self._waiters: Dict[str, Set[asyncio.Future]] = {}
+        bus.subscribe("upload", self._on_event)
+
+    def latest(self, session_id: str):
+        cached = self._state.get(session_id)
+        return UNKNOWN if cached is None else cached[0]
+
+    def remember(self, session_id: str, image_path: Optional[str]):
+        self._state.set(session_id, (image_path,))
+
+    def settle(self, session_id: str, image_path: Optional[str]) -> Optional[str]:
+        """Stores a DB read of the session unless a notification arrived meanwhile.
+
+        Returns the path to use: an upload published while the read was in
+        flight is newer than what the read saw.
+        """
+        current = self.latest(session_id)
+        if current is UNKNOWN:
+            self.remember(session_id, image_path)
+            return image_path
+        return current
+
+    def reset(self, session_id: str):
+        self._bus.publish("upload", session_id, None)
+
+    def publish(self, session_id: str, image_path: str):
+        self._bus.publish("upload", session_id, image_path)
+
+    def _on_event(self, session_id: str, image_path: Optional[str]):
+        # Runs on the event loop (see Bus._deliver)
+        self.remember(session_id, image_path)
+        if image_path is None:
+            return
+        for waiter in self._waiters.pop(session_id, ()):
+            if not waiter.done():
+                waiter.set_result(image_path)
+
+    def waiter_count(self) -> int:
+        return sum(len(w) for w in self._waiters.values())
+
+    async def wait(self, session_id: str, timeout: float) -> Optional[str]:
+        """Returns the uploaded image path, or None if nothing arrived in time."""
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(session_id, set()).add(waiter)
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            waiters = self._waiters.get(session_id)
+            if waiters is not None:
+                waiters.discard(waiter)
+                if not waiters:
+                    del self._waiters[session_id]
+
+upload_notifier = UploadNotifier(bus)
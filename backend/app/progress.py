@@ -0,0 +1,116 @@
+"""Materialized learning-progress stats, one plan_stats row per plan.
+
+Writes that change progress refresh only the rows of the plans they touch:
+item, completion and understanding totals and the overdue count are
+recomputed from that plan's items with one indexed aggregate, and scores
+written by chat turns are appended to a capped score-over-time series. An
+overdue count depends on the clock, so each row also keeps the next open
+due date; rows whose next due date has passed are refreshed when read.
+
+Everything here is Core SQL, so it runs on a Session or a Connection (the
+migration that backfills the table).
+"""
+import os
+import json
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import and_, case, func, or_, select, update
+from sqlalchemy.dialects.sqlite import insert
+from app import models
+
+SCORE_SERIES_MAX = int(os.getenv("PROGRESS_SERIES_MAX", "30"))
+
+_AGGREGATES = ("user_id", "item_count", "completed_count", "score_sum", "overdue_count", "next_due_at", "updated_at")
+
+def refresh_plan_stats(db, plan_ids: List[int], now: Optional[datetime] = None):
+    """Recomputes the stats rows of these plans from their items. Doesn't commit."""
+    if not plan_ids:
+        return
+    now = now or datetime.now()
+    Plan, Item = models.Plan, models.PlanItem
+    is_open = func.coalesce(Item.is_completed, False) == False  # noqa: E712
+    rows = db.execute(
+        select(
+            Plan.id,
+            Plan.user_id,
+            func.count(Item.id),
+            func.count(case((Item.is_completed == True, 1))),  # noqa: E712
+            func.coalesce(func.sum(Item.understanding_score), 0),
+            func.count(case((and_(is_open, Item.due_date < now), 1))),
+            func.min(case((and_(is_open, Item.due_date >= now), Item.due_date))),
+        ).select_from(Plan).outerjoin(Item, Item.plan_id == Plan.id)
+        .where(Plan.id.in_(plan_ids)).group_by(Plan.id)
+    ).all()
+    if not rows:
+        return
+
+    stmt = insert(models.PlanStats).values([
+        {
+            "plan_id": plan_id, "user_id": user_id, "item_count": items, "completed_count": completed,
+            "score_sum": score_sum, "overdue_count": overdue, "next_due_at": next_due,
+            "score_series": "[]", "updated_at": now,
+        }
+        for plan_id, user_id, items, completed, score_sum, overdue, next_due in rows
+    ])
+    # The score series and latest score only change in record_score
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[models.PlanStats.plan_id],
+        set_={name: stmt.excluded[name] for name in _AGGREGATES}
+    ))
+
+def record_score(db, plan_id: int, item_id: int, score: int, at: Optional[datetime] = None):
+    """Refreshes the item's plan after a score write and appends it to the series. Doesn't commit."""
+    at = at or datetime.now()
+    refresh_plan_stats(db, [plan_id], at)
+    _append_scores(db, plan_id, [(at, item_id, score)])
+
+def _append_scores(db, plan_id: int, points: List[tuple]):
+    Stats = models.PlanStats
+    series = json.loads(db.execute(select(Stats.score_series).where(Stats.plan_id == plan_id)).scalar() or "[]")
+    series += [[at.isoformat(timespec="seconds"), item_id, score] for at, item_id, score in points]
+    at, _, score = points[-1]
+    db.execute(update(Stats).where(Stats.plan_id == plan_id).values(
+        score_series=json.dumps(series[-SCORE_SERIES_MAX:]), latest_score=score, latest_score_at=at
+    ))
+
+def refresh_stale(db, user_id: int, now: Optional[datetime] = None) -> bool:
+    """Refreshes the user's rows that are missing or have an overdue count out of date. Doesn't commit."""
+    now = now or datetime.now()
+    Plan, Stats = models.Plan, models.PlanStats
+    stale = db.execute(
+        select(Plan.id).outerjoin(Stats, Stats.plan_id == Plan.id).where(
+            Plan.user_id == user_id,
+            or_(Stats.plan_id.is_(None), Stats.next_due_at <= now)
+        )
+    ).scalars().all()
+    refresh_plan_stats(db, stale, now)
+    return bool(stale)
+
+def load_user_stats(db, user_id: int):
+    """The user's plans (newest first) with their stats rows, as (Plan columns, PlanStats) rows."""
+    Plan, Stats = models.Plan, models.PlanStats
+    return db.execute(
+        select(Plan.id, Plan.title, Plan.target, Plan.created_at, Stats)
+        .join(Stats, Stats.plan_id == Plan.id)
+        .where(Plan.user_id == user_id)
+        .order_by(Plan.created_at.desc())
+    ).all()
+
+def rebuild_plan_stats(db, batch: int = 500):
+    """Fills plan_stats for every plan, with score series taken from chat history."""
+    Plan, Item, Message = models.Plan, models.PlanItem, models.ChatMessage
+    plan_ids = db.execute(select(Plan.id)).scalars().all()
+    for start in range(0, len(plan_ids), batch):
+        refresh_plan_stats(db, plan_ids[start:start + batch])
+
+    history = db.execute(
+        select(Item.plan_id, Message.mission_id, Message.understanding_score, Message.created_at)
+        .join(Item, Item.id == Message.mission_id)
+        .where(Message.understanding_score.is_not(None))
+        .order_by(Message.id)
+    ).all()
+    by_plan = {}
+    for plan_id, item_id, score, at in history:
+        by_plan.setdefault(plan_id, []).append((at, item_id, score))
+    for plan_id, points in by_plan.items():
+        _append_scores(db, plan_id, points[-SCORE_SERIES_MAX:])
@@ -0,0 +1,289 @@
+"""Timeouts, retries, circuit breaking and hedging for upstream LLM calls.
+
+Every attempt gets its own timeout and the whole call an overall deadline,
+so a hung upstream request can't hold a worker indefinitely. After
+`failure_threshold` consecutive failures the breaker opens and calls fail
+fast with `CircuitOpen` for `reset_timeout` seconds; then a single probe is
+let through (half-open) and its outcome closes or re-opens the breaker.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+from collections import deque
+from contextlib import nullcontext
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from app.scheduler import SchedulerBusy
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+class CircuitOpen(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"LLM circuit is open, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    pass
+
+def is_retryable(e: Exception) -> bool:
+    if isinstance(e, asyncio.TimeoutError):
+        return True
+    status = getattr(e, "status_code", None) or getattr(e, "code", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS
+    # SDK errors without a status attribute still carry the code in their text
+    return "429" in str(e)
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self.short_circuited = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def check(self):
+        """Raises CircuitOpen while the breaker is open, without taking the probe."""
+        if self.state == "open":
+            raise CircuitOpen(self._retry_after())
+
+    def _retry_after(self) -> int:
+        remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+        return max(1, int(remaining + 0.999))
+
+    def before_call(self):
+        state = self.state
+        if state == "closed":
+            return
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return
+        self.short_circuited += 1
+        raise CircuitOpen(self._retry_after())
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def abandon(self):
+        """The call ended without an upstream outcome (e.g. client went away)."""
+        self._probing = False
+
+    def stats(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.failures, "short_circuited": self.short_circuited}
+
+class LatencyTracker:
+    """Recent successful attempt latencies, used to pick the hedging delay."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self._samples = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+class RetryPolicy:
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        attempt_timeout: float = 30.0,
+        deadline: float = 60.0,
+        backoff_base: float = 2.0,
+        hedge: bool = False,
+        hedge_min_delay: float = 2.0,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.max_attempts = max_attempts
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.backoff_base = backoff_base
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+        self.hedges_started = 0
+        self.hedges_won = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_attempts=int(os.getenv("LLM_MAX_ATTEMPTS", "3")),
+            attempt_timeout=float(os.getenv("LLM_ATTEMPT_TIMEOUT_SECONDS", "30")),
+            deadline=float(os.getenv("LLM_REQUEST_DEADLINE_SECONDS", "60")),
+            hedge=os.getenv("LLM_HEDGE", "0") == "1",
+            hedge_min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "2")),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+                reset_timeout=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+            )
+        )
+
+    def backoff(self, attempt: int) -> float:
+        return self.backoff_base * (2 ** attempt) + random.uniform(0, 1)
+
+    async def _hedged(self, call: Callable[[], Awaitable], slot: Optional[Callable] = None):
+        """Runs `call`, starting a second copy if the first is slower than p95.
+
+        The second copy is a request of its own, so it takes its own `slot`
+        (and with it the scheduler's rate and in-flight budgets) rather than
+        riding on the first one's.
+        """
+        p95 = self.latency.p95()
+        if not self.hedge or p95 is None:
+            return await call()
+
+        async def hedge():
+            async with (slot() if slot else nullcontext()):
+                return await call()
+
+        first = asyncio.ensure_future(call())
+        pending = {first}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=max(p95, self.hedge_min_delay))
+            if done:
+                return first.result()
+
+            self.hedges_started += 1
+            second = asyncio.ensure_future(hedge())
+            pending = {first, second}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedges_won += 1
+                        return task.result()
+            # Both failed: surface the original request's error
+            return first.result()
+        finally:
+            # Also reached when the attempt is cancelled or times out mid-wait
+            for task in pending:
+                task.cancel()
+
+    async def call(self, call: Callable[[], Awaitable], slot: Optional[Callable] = None):
+        """Runs `call` with per-attempt timeouts, retries and the circuit breaker.
+
+        `slot` is an optional async context manager factory (e.g. a scheduler
+        slot) held for each attempt; time spent waiting for it doesn't count
+        against the attempt timeout.
+        """
+        started = time.monotonic()
+        for attempt in range(self.max_attempts):
+            remaining = self.deadline - (time.monotonic() - started)
+            if remaining <= 0:
+                raise DeadlineExceeded("LLM request deadline exceeded")
+
+            self.breaker.before_call()
+            try:
+                async with (slot() if slot else nullcontext()):
+                    attempt_started = time.monotonic()
+                    timeout = min(self.attempt_timeout, self.deadline - (attempt_started - started))
+                    if timeout <= 0:
+                        raise DeadlineExceeded("LLM request deadline exceeded")
+                    result = await asyncio.wait_for(self._hedged(call, slot), timeout)
+            except Exception as e:
+                if not self._should_retry(e, attempt, started):
+                    raise
+                await asyncio.sleep(self.backoff(attempt))
+                continue
+            except BaseException:
+                # Cancelled: the client went away, so there is no upstream outcome
+                self.breaker.abandon()
+                raise
+
+            self.breaker.record_success()
+            self.latency.add(time.monotonic() - attempt_started)
+            return result
+
+    async def stream(self, open_stream: Callable[[], AsyncIterator], slot: Optional[Callable] = None):
+        """Like call(), for streamed replies.
+
+        The attempt timeout applies to the gap before each chunk. An attempt is
+        only retried if it failed before yielding anything.
+        """
+        started = time.monotonic()
+        for attempt in range(self.max_attempts):
+            if self.deadline - (time.monotonic() - started) <= 0:
+                raise DeadlineExceeded("LLM request deadline exceeded")
+
+            self.breaker.before_call()
+            emitted = False
+            try:
+                async with (slot() if slot else nullcontext()):
+                    chunks = open_stream().__aiter__()
+                    while True:
+                        timeout = min(self.attempt_timeout, self.deadline - (time.monotonic() - started))
+                        if timeout <= 0:
+                            raise DeadlineExceeded("LLM request deadline exceeded")
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                        except StopAsyncIteration:
+                            break
+                        emitted = True
+                        yield chunk
+            except Exception as e:
+                if emitted:
+                    if is_retryable(e):
+                        self.breaker.record_failure()
+                    raise
+                if not self._should_retry(e, attempt, started):
+                    raise
+                await asyncio.sleep(self.backoff(attempt))
+                continue
+            except BaseException:
+                # Cancelled or closed by the consumer: no upstream outcome
+                self.breaker.abandon()
+                raise
+
+            self.breaker.record_success()
+            return
+
+    def _should_retry(self, e: Exception, attempt: int, started: float) -> bool:
+        """Records the failed attempt with the breaker and decides whether to retry."""
+        if isinstance(e, (SchedulerBusy, DeadlineExceeded)):
+            # No slot was free or the deadline ran out while queued: not an upstream failure
+            self.breaker.abandon()
+            return False
+
+        print(f"LLM API Error (Attempt {attempt+1}): {e}", file=sys.stderr)
+        if not is_retryable(e):
+            # Upstream answered (e.g. a 400), so it is healthy
+            self.breaker.record_success()
+            return False
+
+        self.breaker.record_failure()
+        remaining = self.deadline - (time.monotonic() - started)
+        return attempt < self.max_attempts - 1 and self.backoff_base * (2 ** attempt) < remaining
+
+    def stats(self) -> dict:
+        return {
+            **self.breaker.stats(),
+            "latency_p95_seconds": self.latency.p95(),
+            "hedges_started": self.hedges_started,
+            "hedges_won": self.hedges_won,
+        }
+
+llm_policy = RetryPolicy.from_env()
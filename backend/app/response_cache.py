@@ -0,0 +1,111 @@
+"""Shared cache of free-talk replies, persisted in SQLite.
+
+Students in the same class often open a chat with nearly the same question.
+For turns that can't depend on anything but the question (free talk, nothing
+earlier in the session) the reply is looked up by a hash of the learning
+mode, the system prompt, the normalized question and the image before the
+LLM is called. Entries expire after `ttl` seconds; beyond `max_entries` the
+least recently used rows are evicted. Mission turns never use the cache.
+"""
+import os
+import re
+import hashlib
+import threading
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from app import models
+
+_SPACES = re.compile(r"\s+")
+_TRAILING_PUNCT = re.compile(r"[\s?？!！。．.、,，]+$")
+
+def normalize_question(text: str) -> str:
+    """Folds width/case and whitespace so trivially different questions share a key."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = _SPACES.sub(" ", text).strip()
+    return _TRAILING_PUNCT.sub("", text)
+
+class ResponseCache:
+    def __init__(self, enabled: bool = False, ttl: float = 86400.0, max_entries: int = 5000):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            enabled=os.getenv("RESPONSE_CACHE_ENABLED", "0") == "1",
+            ttl=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "86400")),
+            max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+        )
+
+    def make_key(self, learning_mode: str, system_prompt: str, question: str, image: Optional[bytes] = None) -> str:
+        # The prompt itself is hashed, so editing a persona retires its old entries
+        prompt_version = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+        image_digest = hashlib.sha256(image).hexdigest() if image else ""
+        raw = "\x1f".join((learning_mode, prompt_version, normalize_question(question), image_digest))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def get(self, db: Session, key: str) -> Optional[str]:
+        """Returns the cached reply for `key`, marking it recently used. Doesn't commit."""
+        entry = db.get(models.ResponseCacheEntry, key)
+        now = datetime.now()
+        if entry is None or entry.created_at < now - timedelta(seconds=self.ttl):
+            if entry is not None:
+                db.delete(entry)
+            self._count("misses")
+            return None
+        entry.last_used_at = now
+        entry.hits = (entry.hits or 0) + 1
+        self._count("hits")
+        return entry.response
+
+    def put(self, db: Session, key: str, response: str):
+        """Stores a reply and evicts expired / least recently used rows. Doesn't commit."""
+        now = datetime.now()
+        stmt = insert(models.ResponseCacheEntry).values(
+            key=key, response=response, hits=0, created_at=now, last_used_at=now
+        )
+        # Two students may miss on the same question at once; the later reply wins
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[models.ResponseCacheEntry.key],
+            set_={"response": response, "created_at": now, "last_used_at": now}
+        ))
+        self._count("stores")
+
+        Entry = models.ResponseCacheEntry
+        evicted = db.query(Entry).filter(
+            Entry.created_at < now - timedelta(seconds=self.ttl)
+        ).delete(synchronize_session=False)
+        overflow = db.query(func.count(Entry.key)).scalar() - self.max_entries
+        if overflow > 0:
+            oldest = db.query(Entry.key).order_by(Entry.last_used_at.asc()).limit(overflow).subquery()
+            evicted += db.query(Entry).filter(Entry.key.in_(db.query(oldest.c.key))).delete(synchronize_session=False)
+        if evicted:
+            self._count("evictions", evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+            }
+
+response_cache = ResponseCache.from_env()
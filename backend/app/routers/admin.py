@@ -1,21 +1,54 @@
-from fastapi import APIRouter, Depends, HTTPException
+import csv
+import io
+import json
+import base64
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from app import models, schemas
-from app.database import get_db
-from app.deps import get_current_user
+from app.database import get_db, SessionLocal
+from app.deps import CurrentUser, get_current_user
+from app.cache import user_cache, settings_cache
+from app.notifications import upload_notifier
+from app.shared import bus
+from app.images import model_image_cache
+from app.scheduler import llm_scheduler
+from app.resilience import llm_policy
+from app.response_cache import response_cache
+from app.jobs import write_queue
 
 router = APIRouter()
 
-@router.get("/logs", response_model=List[schemas.AdminLogItem])
-def get_admin_logs(
-    username: Optional[str] = None,
-    session_id: Optional[str] = None,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+MAX_PAGE_SIZE = 500
+EXPORT_BATCH_SIZE = 1000
+LOG_FIELDS = ["id", "role", "content", "image_url", "understanding_score", "mission_id", "created_at", "username"]
+
+def _encode_cursor(created_at: datetime, message_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{message_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        created_at, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(message_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def _logs_query(
+    db: Session,
+    username: Optional[str],
+    session_id: Optional[str],
+    since: Optional[datetime],
+    until: Optional[datetime]
 ):
-    # In a real app, we check if current_user.is_admin is True here
-    
     query = db.query(
         models.ChatMessage.id,
         models.ChatMessage.role,
@@ -31,6 +64,101 @@ def get_admin_logs(
         query = query.filter(models.User.username == username)
     if session_id:
         query = query.filter(models.ChatMessage.session_id == session_id)
+    if since:
+        query = query.filter(models.ChatMessage.created_at >= since)
+    if until:
+        query = query.filter(models.ChatMessage.created_at < until)
+
+    # Newest first; id breaks ties so the (created_at, id) cursor is stable
+    return query.order_by(models.ChatMessage.created_at.desc(), models.ChatMessage.id.desc())
 
-    logs = query.order_by(models.ChatMessage.created_at.desc()).all()
+@router.get("/logs", response_model=List[schemas.AdminLogItem])
+def get_admin_logs(
+    response: Response,
+    username: Optional[str] = None,
+    session_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    # In a real app, we check if current_user.is_admin is True here
+    
+    query = _logs_query(db, username, session_id, since, until)
+    if cursor:
+        created_at, message_id = _decode_cursor(cursor)
+        query = query.filter(
+            tuple_(models.ChatMessage.created_at, models.ChatMessage.id) < tuple_(created_at, message_id)
+        )
+
+    logs = query.limit(limit + 1).all()
+    if len(logs) > limit:
+        logs = logs[:limit]
+        # Pass this back as ?cursor= to fetch the next (older) page
+        response.headers["X-Next-Cursor"] = _encode_cursor(logs[-1].created_at, logs[-1].id)
     return logs
+
+@router.get("/logs/export")
+def export_admin_logs(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    username: Optional[str] = None,
+    session_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """Streams every matching log row, fetching from the DB in fixed-size batches."""
+
+    def rows():
+        # Own session: the request-scoped one may be closed while streaming
+        db = SessionLocal()
+        try:
+            query = _logs_query(db, username, session_id, since, until)
+            for row in query.yield_per(EXPORT_BATCH_SIZE):
+                yield row._asdict()
+        finally:
+            db.close()
+
+    if format == "csv":
+        def generate():
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=LOG_FIELDS)
+            writer.writeheader()
+            for row in rows():
+                writer.writerow(row)
+                if buffer.tell() > 64 * 1024:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            yield buffer.getvalue()
+
+        media_type = "text/csv"
+    else:
+        def generate():
+            for row in rows():
+                yield json.dumps(row, ensure_ascii=False, default=_json_default) + "\n"
+
+        media_type = "application/x-ndjson"
+
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=chat_logs.{format}"}
+    )
+
+@router.get("/metrics")
+def get_metrics(current_user: CurrentUser = Depends(get_current_user)):
+    # In-process counters; each worker reports its own
+    return {
+        "user_cache": user_cache.stats(),
+        "settings_cache": settings_cache.stats(),
+        "upload_waiters": upload_notifier.waiter_count(),
+        "model_image_cache": model_image_cache.stats(),
+        "llm_scheduler": llm_scheduler.stats(),
+        "llm_upstream": llm_policy.stats(),
+        "response_cache": response_cache.stats(),
+        "write_queue": write_queue.stats(),
+        "shared_bus": bus.stats(),
+    }
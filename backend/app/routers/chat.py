@@ -1,94 +1,96 @@
 import os
-import re
+import json
 import sys
 import asyncio
-import random
+from dataclasses import dataclass, field
 from typing import List, Optional, Any
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-import google.generativeai as genai
-from dotenv import load_dotenv
 
 from app.schemas import ChatMessage, ChatResponse, ChatHistoryItem
-from app.database import get_db
+from app.database import get_db, run_db
 from app import models
-from app.deps import get_current_user
-
-load_dotenv()
+from app.deps import CurrentUser, get_current_user, cache_settings
+from app.cache import settings_cache
+from app.images import load_model_image
+from app.llm import load_provider
+from app.scheduler import llm_scheduler, estimate_tokens, SchedulerBusy
+from app.resilience import llm_policy, CircuitOpen
+from app.response_cache import response_cache
+from app.context import build_context, summarize_session
+from app.jobs import write_queue
+from app.markers import parse_markers, MarkerParser
+from app.progress import record_score
 
 router = APIRouter()
 
-# Configure Gemini
-api_key = os.getenv("GEMINI_API_KEY")
-if api_key:
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-2.0-flash') # Updated to 2.0-flash
-else:
-    model = None
-
 @router.get("/history/{session_id}", response_model=List[ChatHistoryItem])
 async def get_chat_history(
     session_id: str, 
+    request: Request,
+    response: Response,
+    after_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=500),
     db: Session = Depends(get_db), 
-    user: models.User = Depends(get_current_user)
+    user: CurrentUser = Depends(get_current_user)
 ):
-    history = db.query(models.ChatMessage).filter(
+    """Returns the session's messages, oldest first.
+
+    - after_id: only messages newer than this id (incremental refresh)
+    - before_id: only messages older than this id (loading earlier pages)
+    - limit: page size; with after_id the oldest matching messages are
+      returned, otherwise the newest
+    Without any of these, the whole session is returned.
+    """
+    session_filter = (
         models.ChatMessage.user_id == user.id,
         models.ChatMessage.session_id == session_id
-    ).order_by(models.ChatMessage.created_at.asc()).all()
-    return history
-
-@router.post("", response_model=ChatResponse)
-async def chat_endpoint(
-    chat_msg: ChatMessage, 
-    db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user)
-):
-    if not model:
-        return ChatResponse(response="API Key not configured. Please set GEMINI_API_KEY in backend/.env")
-    
-    # Save user message to DB
-    user_msg_db = models.ChatMessage(
-        user_id=user.id,
-        session_id=chat_msg.session_id,
-        role="user",
-        content=chat_msg.message,
-        image_url=chat_msg.image_url,
-        mission_id=chat_msg.current_mission_id
     )
-    db.add(user_msg_db)
-    db.commit()
 
-    # Fetch User Settings
-    settings = db.query(models.UserSettings).filter(models.UserSettings.user_id == user.id).first()
-    if not settings:
-        settings = models.UserSettings(user_id=user.id, learning_mode="supportive")
-        db.add(settings)
-        db.commit()
-    
-    mode = settings.learning_mode
-    
-    # Context gathering
-    mission_context = ""
-    if chat_msg.current_mission_id:
-        mission = db.query(models.PlanItem).filter(models.PlanItem.id == chat_msg.current_mission_id).first()
-        if mission:
-            mission_context = f"\n\n[現在取り組んでいるミッション: {mission.content}]\n"
-            mission_context += f"このユーザーの現在の理解度スコア: {mission.understanding_score}/100\n"
-            mission_context += "ユーザーがこのミッションの内容を理解しているか、対話を通じて評価してください。"
-    
-    app_guide = (
-        "\n【アプリの操作ガイド】\n"
-        "- スマホ連携: 左下の『画像を同期』からQRを表示してスマホで撮影・送信すると、画面に画像が表示されます。\n"
-        "- ミッション登録: AIの回答の下にある『📅 この内容をミッションに登録』ボタンから学習計画として保存できます。\n"
-        "- メモ機能: 右下のペンアイコン（黄色）からクイックメモを作成・管理できます。\n"
-        "- 学習モード: 左側のサイドバーで『支援』と『受験』を切り替えられます。\n"
-        "- ミッション完了: 理解度スコアが目標（受験:80%, 支援:60%）を超えると、ダッシュボードの『完了』ボタンが有効になります。\n"
-        "操作に関する質問には、これらの情報に基づいて家庭教師として優しく答えてください。"
-    )
+    def history_version():
+        # Messages are never edited, so count + newest id identifies the session state
+        return db.query(func.count(models.ChatMessage.id), func.max(models.ChatMessage.id)).filter(*session_filter).one()
+
+    count, max_id = await run_db(history_version)
+    # The URL already names the session; the raw id may not be header-safe (non-latin-1, quotes)
+    etag = f'W/"{count}-{max_id}-{after_id}-{before_id}-{limit}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    def load_history():
+        query = db.query(models.ChatMessage).filter(*session_filter)
+        if after_id is not None:
+            query = query.filter(models.ChatMessage.id > after_id)
+        if before_id is not None:
+            query = query.filter(models.ChatMessage.id < before_id)
+
+        if limit is None:
+            return query.order_by(models.ChatMessage.created_at.asc(), models.ChatMessage.id.asc()).all()
+        if after_id is not None:
+            return query.order_by(models.ChatMessage.created_at.asc(), models.ChatMessage.id.asc()).limit(limit).all()
+        page = query.order_by(models.ChatMessage.created_at.desc(), models.ChatMessage.id.desc()).limit(limit).all()
+        return list(reversed(page))
+
+    history = await run_db(load_history)
+    response.headers["ETag"] = etag
+    return history
 
+APP_GUIDE = (
+    "\n【アプリの操作ガイド】\n"
+    "- スマホ連携: 左下の『画像を同期』からQRを表示してスマホで撮影・送信すると、画面に画像が表示されます。\n"
+    "- ミッション登録: AIの回答の下にある『📅 この内容をミッションに登録』ボタンから学習計画として保存できます。\n"
+    "- メモ機能: 右下のペンアイコン（黄色）からクイックメモを作成・管理できます。\n"
+    "- 学習モード: 左側のサイドバーで『支援』と『受験』を切り替えられます。\n"
+    "- ミッション完了: 理解度スコアが目標（受験:80%, 支援:60%）を超えると、ダッシュボードの『完了』ボタンが有効になります。\n"
+    "操作に関する質問には、これらの情報に基づいて家庭教師として優しく答えてください。"
+)
+
+def _persona(mission: bool, mode: str) -> str:
     # Define Persona and Rules based on Mode (Mission Focus vs Free Talk)
-    if chat_msg.current_mission_id:
+    if mission:
         # Mission Focus Mode: Coach / Evaluator
         if mode == "exam":
             system_instr = (
@@ -126,93 +128,346 @@ async def chat_endpoint(
                 "このモードでは進捗評価（スコア付与）はせず、楽しく対話してください。\n"
                 "※スコア付与記法 [[SCORE: XX]] は絶対に使用しないでください。"
             )
+    return system_instr + APP_GUIDE
 
-    system_instr += app_guide
+# (is mission turn, learning mode) -> system instruction. Built once, and
+# static, so the provider can keep one configured model per persona.
+PERSONAS = {
+    (mission, mode): _persona(mission, mode)
+    for mission in (True, False)
+    for mode in ("exam", "supportive")
+}
 
-    # Fetch recent history for context (last 10 messages)
-    history_text = ""
-    if chat_msg.session_id:
-        recent_history = db.query(models.ChatMessage).filter(
-            models.ChatMessage.user_id == user.id,
-            models.ChatMessage.session_id == chat_msg.session_id
-        ).order_by(models.ChatMessage.created_at.desc()).limit(11).all()
-        history_text = "\n".join([f"{m.role}: {m.content}" for m in reversed(recent_history)])
-    
-    # Prepare contents for Gemini
-    content_parts = [system_instr + mission_context]
-    if history_text:
-        content_parts.append(f"\n\n【これまでの会話】\n{history_text}")
+def _append_turn(contents: List[dict], role: str, part: Any):
+    """Adds a part to `contents`, merging into the last turn if it has the same role."""
+    if contents and contents[-1]["role"] == role:
+        contents[-1]["parts"].append(part)
+    else:
+        contents.append({"role": role, "parts": [part]})
+
+@dataclass
+class Turn:
+    # Static persona, sent as the model's system instruction
+    system: str
+    # Role-tagged turns: context preface, history, then the current message
+    contents: List[dict] = field(default_factory=list)
+    # Mission PlanItem loaded for this turn, and its plan, so the post-LLM
+    # write needn't look them up again
+    mission_id: Optional[int] = None
+    plan_id: Optional[int] = None
+    # Set for turns eligible for the response cache
+    cache_key: Optional[str] = None
+    # Reply served from the response cache (already saved); skip the LLM
+    cached_reply: Optional[str] = None
+    # The session's history is near the token budget; summarize after replying
+    needs_summary: bool = False
+
+def _prepare_turn(chat_msg: ChatMessage, db: Session, user: CurrentUser, image_part: Optional[dict] = None):
+    """Saves the user message and builds the Gemini request for this turn.
+
+    Everything before the LLM call happens in a single transaction, including
+    the response cache lookup for free-talk turns; on a hit the cached reply
+    is saved as the assistant message right here. The reads come first and
+    the user message is only written at the end, so the transaction holds
+    SQLite's single write lock for the inserts and the commit alone.
+    """
+    user_msg_db = models.ChatMessage(
+        user_id=user.id,
+        session_id=chat_msg.session_id,
+        role="user",
+        content=chat_msg.message,
+        image_url=chat_msg.image_url,
+        mission_id=chat_msg.current_mission_id
+    )
+
+    # Fetch User Settings (cached) and the current mission. On a cache miss
+    # both are loaded with one SELECT.
+    settings = settings_cache.get(user.id)
+    if settings:
+        mission = None
+        if chat_msg.current_mission_id:
+            mission = db.query(models.PlanItem).filter(models.PlanItem.id == chat_msg.current_mission_id).first()
+    else:
+        settings_row, mission = db.query(models.UserSettings, models.PlanItem).select_from(models.User).outerjoin(
+            models.UserSettings, models.UserSettings.user_id == models.User.id
+        ).outerjoin(
+            models.PlanItem, models.PlanItem.id == chat_msg.current_mission_id
+        ).filter(models.User.id == user.id).first()
+
+        if not settings_row:
+            settings_row = models.UserSettings(user_id=user.id, learning_mode="supportive")
+            db.add(settings_row)
+            db.flush()
+        settings = cache_settings(settings_row)
+
+    mode = settings.learning_mode
     
-    # Add current image if available
+    # Context gathering
+    mission_context = ""
+    if mission:
+        mission_context = f"\n\n[現在取り組んでいるミッション: {mission.content}]\n"
+        mission_context += f"このユーザーの現在の理解度スコア: {mission.understanding_score}/100\n"
+        mission_context += "ユーザーがこのミッションの内容を理解しているか、対話を通じて評価してください。"
+
+    # Anything but "exam" gets the supportive persona
+    system_instr = PERSONAS[(bool(chat_msg.current_mission_id), "exam" if mode == "exam" else "supportive")]
+
+    # Session summary plus as many recent messages as fit the token budget
+    context = build_context(db, user.id, chat_msg.session_id, current=user_msg_db) if chat_msg.session_id else None
+
+    turn = Turn(system=system_instr)
+    if mission:
+        turn.mission_id, turn.plan_id = mission.id, mission.plan_id
+    preface = mission_context
+    if context and context.summary:
+        preface += f"\n\n【これまでの会話の要約】\n{context.summary}"
+    if preface:
+        _append_turn(turn.contents, "user", preface.strip())
+
+    history = context.messages if context else [("user", chat_msg.message)]
+    for role, content in history:
+        _append_turn(turn.contents, "model" if role == "assistant" else "user", content)
+    if turn.contents[0]["role"] == "model":
+        # The window can start mid-exchange; Gemini expects the user to speak first
+        turn.contents.insert(0, {"role": "user", "parts": ["（これまでの会話の続きです）"]})
+    if image_part:
+        _append_turn(turn.contents, "user", image_part)
+    if context:
+        turn.needs_summary = context.needs_summary
+
+    # Free-talk opening questions don't depend on anything per-student, so
+    # identical ones can share a reply. Mission turns are scored and never cached;
+    # neither is a turn whose image couldn't be loaded, whose key would
+    # otherwise be the text-only question's.
+    is_opening = not context or (context.stored_messages == 0 and not context.summary)
+    image_loaded = image_part is not None or not chat_msg.image_url
+    if response_cache.enabled and not chat_msg.current_mission_id and is_opening and image_loaded:
+        turn.cache_key = response_cache.make_key(
+            mode, system_instr, chat_msg.message, image_part["data"] if image_part else None
+        )
+        turn.cached_reply = response_cache.get(db, turn.cache_key)
+
+    # Inserted before the cached reply, so the two keep their order by id
+    db.add(user_msg_db)
+    if turn.cached_reply is not None:
+        _add_assistant_message(db, user.id, chat_msg, turn.cached_reply, None)
+    db.commit()
+    return turn
+
+async def _load_image_part(image_url: str):
+    """Returns the prepared (downscaled, cached) image for the model, or None."""
+    try:
+        filename = os.path.basename(image_url)
+        local_path = os.path.join("uploads", filename)
+
+        if os.path.exists(local_path):
+            return await load_model_image(local_path)
+        print(f"Warning: Image path not found: {local_path}", file=sys.stderr)
+    except Exception as e:
+        print(f"Error loading image: {e}", file=sys.stderr)
+    return None
+
+async def _build_turn(chat_msg: ChatMessage, db: Session, user: CurrentUser) -> Turn:
+    # The current image is loaded first: it is part of the response cache key
+    image_part = None
     if chat_msg.image_url:
-        try:
-            filename = os.path.basename(chat_msg.image_url)
-            local_path = os.path.join("uploads", filename)
-            
-            if os.path.exists(local_path):
-                import PIL.Image
-                img = PIL.Image.open(local_path)
-                content_parts.append(img)
-            else:
-                print(f"Warning: Image path not found: {local_path}", file=sys.stderr)
-        except Exception as e:
-            print(f"Error loading image: {e}", file=sys.stderr)
+        image_part = await _load_image_part(chat_msg.image_url)
+    return await run_db(_prepare_turn, chat_msg, db, user, image_part)
 
-    max_retries = 3
-    for attempt in range(max_retries):
+def _add_assistant_message(db: Session, user_id: int, chat_msg: ChatMessage, clean_text: str, score: Optional[int]):
+    db.add(models.ChatMessage(
+        user_id=user_id,
+        session_id=chat_msg.session_id,
+        role="assistant",
+        content=clean_text,
+        understanding_score=score,
+        mission_id=chat_msg.current_mission_id
+    ))
+
+def _save_assistant_message(
+    db: Session,
+    user_id: int,
+    chat_msg: ChatMessage,
+    mission_id: Optional[int],
+    plan_id: Optional[int],
+    clean_text: str,
+    score: Optional[int],
+    res_val: Optional[str],
+    cache_key: Optional[str] = None
+):
+    """Write job for the assistant reply; the write queue commits it in a batch."""
+    _add_assistant_message(db, user_id, chat_msg, clean_text, score)
+    if cache_key and clean_text:
+        response_cache.put(db, cache_key, clean_text)
+
+    # Update the mission loaded before the LLM call, if score or result found
+    if (score is not None or res_val is not None) and mission_id:
+        values = {}
+        if score is not None:
+            values[models.PlanItem.understanding_score] = score
+        if res_val is not None:
+            values[models.PlanItem.last_result] = res_val
+        db.query(models.PlanItem).filter(models.PlanItem.id == mission_id).update(values, synchronize_session=False)
+        if score is not None:
+            record_score(db, plan_id, mission_id, score)
+
+@router.post("", response_model=ChatResponse)
+async def chat_endpoint(
+    chat_msg: ChatMessage, 
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user)
+):
+    # The LLM backend (Gemini, or the local fake for load tests), built on first use
+    llm = await load_provider()
+    if not llm:
+        return ChatResponse(response="API Key not configured. Please set GEMINI_API_KEY in backend/.env")
+    
+    turn = await _build_turn(chat_msg, db, user)
+    if turn.cached_reply is not None:
+        return ChatResponse(response=turn.cached_reply)
+    prompt_tokens = estimate_tokens([turn.system] + turn.contents)
+
+    try:
+        # Timeouts, retries and the circuit breaker live in llm_policy; each
+        # attempt runs once the scheduler grants a slot
+        raw_text = await llm_policy.call(
+            lambda: llm.generate(turn.contents, system=turn.system),
+            slot=lambda: llm_scheduler.slot(user.id, prompt_tokens)
+        )
+    except (SchedulerBusy, CircuitOpen) as e:
+        raise _busy_error(e)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="AIの応答がタイムアウトしました")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"AIとの対話に失敗しました: {e}")
+    llm_scheduler.charge(estimate_tokens([raw_text]))
+
+    reply = parse_markers(raw_text)
+    clean_text, score, res_val = reply.text, reply.score, reply.result
+
+    # Persisted by the write queue; the reply doesn't wait for the commit
+    await write_queue.submit(
+        _save_assistant_message, user.id, chat_msg, turn.mission_id, turn.plan_id, clean_text, score, res_val, turn.cache_key
+    )
+    if turn.needs_summary:
+        background_tasks.add_task(summarize_session, llm, user.id, chat_msg.session_id)
+
+    return ChatResponse(response=clean_text, understanding_score=score, extracted_result=res_val)
+
+def _busy_error(e) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="AIが混雑しています。しばらくしてから再度お試しください。",
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+def _sse(event: dict) -> str:
+    return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+@router.post("/stream")
+async def chat_stream_endpoint(
+    chat_msg: ChatMessage,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user)
+):
+    """Streams the reply as Server-Sent Events.
+
+    Events are JSON objects: {"type": "delta", "text": ...} for each piece of
+    visible text, then one {"type": "done", ...} carrying the final score and
+    result (or {"type": "error", "detail": ...}).
+    """
+    llm = await load_provider()
+    if not llm:
+        async def not_configured():
+            yield _sse({"type": "delta", "text": "API Key not configured. Please set GEMINI_API_KEY in backend/.env"})
+            yield _sse({"type": "done", "understanding_score": None, "extracted_result": None})
+        return StreamingResponse(not_configured(), media_type="text/event-stream")
+
+    turn = await _build_turn(chat_msg, db, user)
+    if turn.cached_reply is not None:
+        async def cached():
+            yield _sse({"type": "delta", "text": turn.cached_reply})
+            yield _sse({"type": "done", "understanding_score": None, "extracted_result": None})
+        return StreamingResponse(cached(), media_type="text/event-stream")
+
+    user_id = user.id
+    prompt_tokens = estimate_tokens([turn.system] + turn.contents)
+
+    # Fail fast with a real 503 while the status code can still be set
+    try:
+        llm_policy.breaker.check()
+        llm_scheduler.check_capacity()
+    except (SchedulerBusy, CircuitOpen) as e:
+        raise _busy_error(e)
+
+    async def event_stream():
+        parser = MarkerParser()
+        pieces = []
+        # Everything the LLM sent, markers included, for the TPM budget
+        received = []
+        # Cleared once the LLM stream has run its course; still set in the
+        # `finally` below means the client disconnected mid-reply
+        interrupted = True
         try:
-            # Pass the list of parts to Gemini
-            response = await model.generate_content_async(content_parts)
-            raw_text = response.text
-            
-            # Extract result
-            res_val = None
-            res_match = re.search(r"\[\[RESULT:\s*(.*?)\]\]", raw_text)
-            if res_match:
-                res_val = res_match.group(1).strip()
-                clean_text = re.sub(r"\[\[RESULT:\s*.*?\]\]", "", raw_text).strip()
-            else:
-                clean_text = raw_text
-
-            # Extract score
-            score = None
-            score_match = re.search(r"\[\[SCORE:\s*(\d+)\]\]", clean_text)
-            if score_match:
-                score = int(score_match.group(1))
-                clean_text = re.sub(r"\[\[SCORE:\s*\d+\]\]", "", clean_text).strip()
-            
-            # Save assistant response to DB
-            assistant_msg_db = models.ChatMessage(
-                user_id=user.id,
-                session_id=chat_msg.session_id,
-                role="assistant",
-                content=clean_text,
-                understanding_score=score,
-                mission_id=chat_msg.current_mission_id
+            chunks = llm_policy.stream(
+                lambda: llm.stream(turn.contents, system=turn.system),
+                slot=lambda: llm_scheduler.slot(user_id, prompt_tokens)
             )
-            db.add(assistant_msg_db)
-            db.commit()
-
-            # Update DB if score or result found and mission exists
-            if (score is not None or res_val is not None) and chat_msg.current_mission_id:
-                mission = db.query(models.PlanItem).filter(models.PlanItem.id == chat_msg.current_mission_id).first()
-                if mission:
-                    if score is not None:
-                        mission.understanding_score = score
-                    if res_val is not None:
-                        mission.last_result = res_val
-                    db.commit()
-
-            return ChatResponse(response=clean_text, understanding_score=score, extracted_result=res_val)
-            
+            async for chunk in chunks:
+                received.append(chunk)
+                text = parser.feed(chunk)
+                if text:
+                    pieces.append(text)
+                    yield _sse({"type": "delta", "text": text})
+            interrupted = False
+        except (SchedulerBusy, CircuitOpen):
+            interrupted = False
+            yield _sse({"type": "error", "detail": "AIが混雑しています。しばらくしてから再度お試しください。"})
+            return
+        except asyncio.TimeoutError:
+            interrupted = False
+            yield _sse({"type": "error", "detail": "AIの応答がタイムアウトしました"})
+            return
         except Exception as e:
-            error_str = str(e)
-            print(f"Gemini API Error (Attempt {attempt+1}): {e}", file=sys.stderr)
-            
-            if "429" in error_str and attempt < max_retries - 1:
-                wait_time = 2 * (2 ** attempt) + random.uniform(0, 1)
-                await asyncio.sleep(wait_time)
-                continue
-            
-            if attempt == max_retries - 1:
-                raise HTTPException(status_code=500, detail=f"AIとの対話に失敗しました: {error_str}")
+            interrupted = False
+            yield _sse({"type": "error", "detail": f"AIとの対話に失敗しました: {e}"})
+            return
+        finally:
+            if received:
+                llm_scheduler.charge(estimate_tokens(received))
+            if interrupted:
+                # Keep the part of the reply the student already saw, and any
+                # score. The stream is being cancelled, so nothing is awaited;
+                # a partial reply never goes into the response cache.
+                partial = ("".join(pieces) + parser.flush()).strip()
+                if partial or parser.score is not None or parser.result is not None:
+                    write_queue.submit_detached(
+                        _save_assistant_message, user_id, chat_msg, turn.mission_id, turn.plan_id, partial, parser.score, parser.result
+                    )
+
+        tail = parser.flush()
+        if tail:
+            pieces.append(tail)
+        clean_text = "".join(pieces).strip()
+        score, res_val = parser.score, parser.result
+
+        # Queued before the last events go out, so a disconnect from here on can't lose it
+        write_queue.submit_detached(
+            _save_assistant_message, user_id, chat_msg, turn.mission_id, turn.plan_id, clean_text, score, res_val, turn.cache_key
+        )
+
+        if tail:
+            yield _sse({"type": "delta", "text": tail})
+        yield _sse({"type": "done", "understanding_score": score, "extracted_result": res_val})
+
+    if turn.needs_summary:
+        # Background tasks run once the stream has finished
+        background_tasks.add_task(summarize_session, llm, user_id, chat_msg.session_id)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
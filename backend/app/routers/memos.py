@@ -1,9 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from app import models, schemas
 from app.database import get_db
-from app.deps import get_current_user
+from app.deps import CurrentUser, get_current_user
+from app.search import (
+    split_terms, fts_query, like_pattern, render_snippet, make_snippet,
+    encode_cursor, decode_cursor, HL_START, HL_END, SNIPPET_TOKENS
+)
 
 router = APIRouter()
 
@@ -11,7 +16,7 @@ router = APIRouter()
 def create_memo(
     memo: schemas.MemoCreate, 
     db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user)
+    user: CurrentUser = Depends(get_current_user)
 ):
     db_memo = models.Memo(user_id=user.id, content=memo.content)
     db.add(db_memo)
@@ -24,16 +29,83 @@ def read_memos(
     skip: int = 0, 
     limit: int = 100, 
     db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user)
+    user: CurrentUser = Depends(get_current_user)
 ):
     memos = db.query(models.Memo).filter(models.Memo.user_id == user.id).order_by(models.Memo.created_at.desc()).offset(skip).limit(limit).all()
     return memos
 
+@router.get("/search", response_model=List[schemas.MemoSearchResult])
+def search_memos(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    sort: str = Query("relevance", pattern="^(relevance|recent)$"),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user)
+):
+    """Full-text search over the user's memos (all terms must match).
+
+    Results are ordered by bm25 relevance or by recency. The X-Next-Cursor
+    response header carries the cursor for the next page.
+    """
+    fts_terms, like_terms = split_terms(q)
+    if not fts_terms and not like_terms:
+        return []
+
+    params = {"user_id": user.id, "limit": limit + 1}
+    where = ["m.user_id = :user_id"]
+    if fts_terms:
+        source = "memos_fts JOIN memos m ON m.id = memos_fts.rowid"
+        where.append("memos_fts MATCH :match")
+        params.update(match=fts_query(fts_terms), hl_start=HL_START, hl_end=HL_END)
+        columns = f"snippet(memos_fts, 0, :hl_start, :hl_end, '…', {SNIPPET_TOKENS}) AS snippet, bm25(memos_fts) AS score"
+    else:
+        # Only short terms: the trigram index can't help, scan this user's memos
+        source = "memos m"
+        columns = "NULL AS snippet, NULL AS score"
+    for i, term in enumerate(like_terms):
+        where.append(f"m.content LIKE :like{i} ESCAPE '\\'")
+        params[f"like{i}"] = like_pattern(term)
+
+    by_relevance = sort == "relevance" and bool(fts_terms)
+    after = decode_cursor(cursor, 2)
+    if by_relevance:
+        keyset = "score > :c_key OR (score = :c_key AND id > :c_id)"
+        order = "score, id"
+    else:
+        keyset = "created_at < :c_key OR (created_at = :c_key AND id < :c_id)"
+        order = "created_at DESC, id DESC"
+    if after:
+        params.update(c_key=after[0], c_id=after[1])
+
+    sql = (
+        f"SELECT * FROM (SELECT m.id, m.content, m.created_at, {columns} FROM {source} WHERE {' AND '.join(where)}) "
+        f"{'WHERE ' + keyset if after else ''} ORDER BY {order} LIMIT :limit"
+    )
+    rows = db.execute(text(sql), params).all()
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.score if by_relevance else last.created_at, last.id)
+
+    return [
+        schemas.MemoSearchResult(
+            id=row.id,
+            content=row.content,
+            created_at=row.created_at,
+            snippet=render_snippet(row.snippet) if row.snippet is not None else make_snippet(row.content, like_terms),
+            score=row.score
+        )
+        for row in rows
+    ]
+
 @router.delete("/{memo_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_memo(
     memo_id: int, 
     db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user)
+    user: CurrentUser = Depends(get_current_user)
 ):
     memo = db.query(models.Memo).filter(models.Memo.id == memo_id, models.Memo.user_id == user.id).first()
     if memo is None:
@@ -1,9 +1,12 @@
+import json
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, selectinload
 from typing import List
 from app import models, schemas
 from app.database import get_db
-from app.deps import get_current_user
+from app.deps import CurrentUser, get_current_user
+from app.progress import refresh_plan_stats, refresh_stale, load_user_stats
 
 router = APIRouter()
 
@@ -11,47 +14,163 @@ router = APIRouter()
 def create_plan(
     plan: schemas.PlanCreate, 
     db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user)
+    user: CurrentUser = Depends(get_current_user)
 ):
+    # One transaction: the plan, then all its items in a single executemany
     db_plan = models.Plan(user_id=user.id, title=plan.title, target=plan.target)
     db.add(db_plan)
+    db.flush()
+    plan_id = db_plan.id
+    _insert_items(db, [(plan_id, item) for item in plan.items])
+    refresh_plan_stats(db, [plan_id])
     db.commit()
-    db.refresh(db_plan)
-    
-    for item in plan.items:
-        db_item = models.PlanItem(
-            plan_id=db_plan.id, 
-            content=item.content, 
-            priority=item.priority,
-            due_date=item.due_date,
-            is_completed=item.is_completed
-        )
-        db.add(db_item)
-    
+    return _load_plans(db, user.id, [plan_id])[0]
+
+@router.post("/batch", response_model=List[schemas.Plan])
+def upsert_plans(
+    batch: schemas.PlanBatch,
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user)
+):
+    """Creates or updates many plans and items in one transaction.
+
+    Plans and items with an `id` are updated (only the fields sent are
+    changed); those without one are created. Returns the plans in request
+    order.
+    """
+    existing_ids = [p.id for p in batch.plans if p.id is not None]
+    existing = {p.id: p for p in _load_plans(db, user.id, existing_ids)}
+    if len(existing) != len(set(existing_ids)):
+        raise HTTPException(status_code=404, detail="Plan not found")
+
+    db_plans = []
+    new_items = []
+    for plan in batch.plans:
+        if plan.id is None:
+            db_plan = models.Plan(user_id=user.id, title=plan.title, target=plan.target)
+            db.add(db_plan)
+        else:
+            db_plan = existing[plan.id]
+            for field, value in plan.model_dump(exclude_unset=True, exclude={"id", "items"}).items():
+                setattr(db_plan, field, value)
+
+        items_by_id = {item.id: item for item in db_plan.items} if plan.id is not None else {}
+        for item in plan.items:
+            if item.id is None:
+                new_items.append((db_plan, item.to_create()))
+            elif item.id in items_by_id:
+                for field, value in item.model_dump(exclude_unset=True, exclude={"id"}).items():
+                    setattr(items_by_id[item.id], field, value)
+            else:
+                raise HTTPException(status_code=404, detail="Plan Item not found")
+        db_plans.append(db_plan)
+
+    # New plans get their ids here; then every new item goes in one executemany
+    db.flush()
+    _insert_items(db, [(db_plan.id, item) for db_plan, item in new_items])
+    # Read before commit expires them; afterwards everything is reloaded in two queries
+    plan_ids = [p.id for p in db_plans]
+    refresh_plan_stats(db, plan_ids)
     db.commit()
-    db.refresh(db_plan)
-    return db_plan
+    by_id = {p.id: p for p in _load_plans(db, user.id, plan_ids)}
+    return [by_id[plan_id] for plan_id in plan_ids]
+
+def _insert_items(db: Session, items: List[tuple]):
+    """Bulk-inserts (plan_id, PlanItemCreate) pairs with a single executemany."""
+    if not items:
+        return
+    db.execute(insert(models.PlanItem), [
+        {
+            "plan_id": plan_id,
+            "content": item.content,
+            "priority": item.priority,
+            "due_date": item.due_date,
+            "is_completed": item.is_completed,
+            "understanding_score": item.understanding_score,
+            "last_result": item.last_result,
+        }
+        for plan_id, item in items
+    ])
+
+def _load_plans(db: Session, user_id: int, plan_ids: List[int]) -> List[models.Plan]:
+    """The user's plans with these ids, items included (one query for all items)."""
+    if not plan_ids:
+        return []
+    return db.query(models.Plan).options(selectinload(models.Plan.items)).filter(
+        models.Plan.id.in_(plan_ids), models.Plan.user_id == user_id
+    ).all()
 
 @router.get("", response_model=List[schemas.Plan])
 def read_plans(
     skip: int = 0, 
     limit: int = 100, 
     db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user)
+    user: CurrentUser = Depends(get_current_user)
 ):
-    plans = db.query(models.Plan).filter(models.Plan.user_id == user.id).order_by(models.Plan.created_at.desc()).offset(skip).limit(limit).all()
+    # Items for every plan on the page come from one extra SELECT ... IN query
+    plans = db.query(models.Plan).options(selectinload(models.Plan.items)).filter(
+        models.Plan.user_id == user.id
+    ).order_by(models.Plan.created_at.desc()).offset(skip).limit(limit).all()
     return plans
 
+@router.get("/stats", response_model=schemas.ProgressStats)
+def read_progress(
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user)
+):
+    """Progress of every plan from the materialized plan_stats rows.
+
+    Usually two small queries: one for rows whose overdue count went out of
+    date (refreshed before reading) and one for the stats themselves.
+    """
+    if refresh_stale(db, user.id):
+        db.commit()
+
+    plans = []
+    for plan_id, title, target, created_at, stats in load_user_stats(db, user.id):
+        items = stats.item_count or 0
+        plans.append(schemas.PlanProgress(
+            plan_id=plan_id,
+            title=title,
+            target=target,
+            created_at=created_at,
+            item_count=items,
+            completed_count=stats.completed_count or 0,
+            completion_ratio=(stats.completed_count or 0) / items if items else 0.0,
+            average_score=(stats.score_sum or 0) / items if items else 0.0,
+            latest_score=stats.latest_score,
+            latest_score_at=stats.latest_score_at,
+            overdue_count=stats.overdue_count or 0,
+            score_series=[
+                schemas.ScorePoint(at=at, item_id=item_id, score=score)
+                for at, item_id, score in json.loads(stats.score_series or "[]")
+            ]
+        ))
+
+    items = sum(p.item_count for p in plans)
+    completed = sum(p.completed_count for p in plans)
+    latest = max((p for p in plans if p.latest_score_at), key=lambda p: p.latest_score_at, default=None)
+    return schemas.ProgressStats(
+        item_count=items,
+        completed_count=completed,
+        completion_ratio=completed / items if items else 0.0,
+        average_score=sum(p.average_score * p.item_count for p in plans) / items if items else 0.0,
+        overdue_count=sum(p.overdue_count for p in plans),
+        latest_score=latest.latest_score if latest else None,
+        latest_score_at=latest.latest_score_at if latest else None,
+        plans=plans
+    )
+
 @router.get("/{plan_id}", response_model=schemas.Plan)
 def read_plan(
     plan_id: int, 
     db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user)
+    user: CurrentUser = Depends(get_current_user)
 ):
-    plan = db.query(models.Plan).filter(models.Plan.id == plan_id, models.Plan.user_id == user.id).first()
-    if plan is None:
+    plans = _load_plans(db, user.id, [plan_id])
+    if not plans:
         raise HTTPException(status_code=404, detail="Plan not found")
-    return plan
+    return plans[0]
 
 @router.put("/{plan_id}/items/{item_id}", response_model=schemas.PlanItem)
 def update_plan_item(
@@ -59,7 +178,7 @@ def update_plan_item(
     item_id: int, 
     item: schemas.PlanItemCreate, 
     db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user)
+    user: CurrentUser = Depends(get_current_user)
 ):
     # Verify the plan belongs to the user
     db_plan = db.query(models.Plan).filter(models.Plan.id == plan_id, models.Plan.user_id == user.id).first()
@@ -71,6 +190,8 @@ def update_plan_item(
         raise HTTPException(status_code=404, detail="Plan Item not found")
     
     db_item.is_completed = item.is_completed
+    db.flush()
+    refresh_plan_stats(db, [plan_id])
     db.commit()
     db.refresh(db_item)
     return db_item
@@ -79,12 +200,13 @@ def update_plan_item(
 def delete_plan(
     plan_id: int, 
     db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user)
+    user: CurrentUser = Depends(get_current_user)
 ):
     plan = db.query(models.Plan).filter(models.Plan.id == plan_id, models.Plan.user_id == user.id).first()
     if plan is None:
         raise HTTPException(status_code=404, detail="Plan not found")
     
     db.delete(plan)
+    db.query(models.PlanStats).filter(models.PlanStats.plan_id == plan_id).delete(synchronize_session=False)
     db.commit()
     return None
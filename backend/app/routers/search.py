@@ -0,0 +1,93 @@
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from app import schemas
+from app.database import get_db
+from app.deps import CurrentUser, get_current_user
+from app.search import (
+    split_terms, fts_query, owner_token, like_pattern, render_snippet, make_snippet,
+    encode_cursor, decode_cursor, HL_START, HL_END, SNIPPET_TOKENS
+)
+
+router = APIRouter()
+
+KINDS = ("chat", "plan")
+
+@router.get("", response_model=List[schemas.SearchResult])
+def search(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    kind: Optional[str] = Query(None, pattern="^(chat|plan)$"),
+    session_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user)
+):
+    """Ranked search over the user's chat messages and plan items.
+
+    Plan items match on their content and last result. `kind` limits the
+    results to one source and `session_id` to one chat session. The
+    X-Next-Cursor response header carries the cursor for the next page.
+    """
+    fts_terms, like_terms = split_terms(q)
+    if not fts_terms and not like_terms:
+        return []
+
+    # The owner phrase narrows the match to this user inside the index
+    match = f'owner : "{owner_token(user.id)}"'
+    if fts_terms:
+        match += f" AND body : ({fts_query(fts_terms)})"
+    params = {"match": match, "limit": limit + 1}
+    where = ["search_index MATCH :match"]
+    if kind:
+        where.append("kind = :kind")
+        params["kind"] = kind
+    if session_id:
+        where.append("kind = 'chat' AND parent = :session_id")
+        params["session_id"] = session_id
+    for i, term in enumerate(like_terms):
+        where.append(f"body LIKE :like{i} ESCAPE '\\'")
+        params[f"like{i}"] = like_pattern(term)
+
+    after = decode_cursor(cursor, 2)
+    if after:
+        params.update(c_score=after[0], c_rowid=after[1])
+
+    # Rank first, then build snippets for the returned page only: snippet()
+    # is far costlier than bm25 and would otherwise run for every match.
+    # bm25 weights: body counts, the owner token doesn't.
+    sql = (
+        "SELECT * FROM (SELECT rowid, kind, ref_id, parent, bm25(search_index, 1.0, 0.0) AS score "
+        f"FROM search_index WHERE {' AND '.join(where)}) "
+        f"{'WHERE score > :c_score OR (score = :c_score AND rowid > :c_rowid)' if after else ''} "
+        "ORDER BY score, rowid LIMIT :limit"
+    )
+    rows = db.execute(text(sql), params).all()
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(rows[-1].score, rows[-1].rowid)
+
+    snippets = {}
+    if rows:
+        page = ", ".join(str(int(row.rowid)) for row in rows)
+        snippet_rows = db.execute(text(
+            f"SELECT rowid, body, snippet(search_index, 0, :hl_start, :hl_end, '…', {SNIPPET_TOKENS}) AS snippet "
+            f"FROM search_index WHERE search_index MATCH :match AND rowid IN ({page})"
+        ), {"match": match, "hl_start": HL_START, "hl_end": HL_END}).all()
+        for row in snippet_rows:
+            snippets[row.rowid] = render_snippet(row.snippet) if fts_terms else make_snippet(row.body, like_terms)
+
+    return [
+        schemas.SearchResult(
+            kind=row.kind,
+            id=row.ref_id,
+            session_id=row.parent if row.kind == "chat" else None,
+            plan_id=int(row.parent) if row.kind == "plan" else None,
+            snippet=snippets.get(row.rowid, ""),
+            score=row.score
+        )
+        for row in rows
+    ]
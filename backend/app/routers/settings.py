@@ -1,30 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from .. import models, schemas
 from ..database import get_db
-from ..deps import get_current_user
+from ..deps import CurrentUser, get_current_user, get_user_settings, share_settings
 
 router = APIRouter(tags=["settings"])
 
 @router.get("", response_model=schemas.UserSettings)
 def get_settings(
     db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user)
+    user: CurrentUser = Depends(get_current_user)
 ):
-    settings = db.query(models.UserSettings).filter(models.UserSettings.user_id == user.id).first()
-    if not settings:
-        # Create default settings if not exists
-        settings = models.UserSettings(user_id=user.id, learning_mode="supportive")
-        db.add(settings)
-        db.commit()
-        db.refresh(settings)
-    return settings
+    return get_user_settings(db, user.id)
 
 @router.put("", response_model=schemas.UserSettings)
 def update_settings(
     settings_update: schemas.UserSettingsBase, 
     db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_user)
+    user: CurrentUser = Depends(get_current_user)
 ):
     settings = db.query(models.UserSettings).filter(models.UserSettings.user_id == user.id).first()
     if not settings:
@@ -35,4 +28,6 @@ def update_settings(
     
     db.commit()
     db.refresh(settings)
+    # Write through (in every worker) so the chat handler sees the new mode immediately
+    share_settings(settings)
     return settings
@@ -1,21 +1,61 @@
-import datetime
 import uuid
 import os
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query, Request
+from fastapi.routing import APIRoute
 from sqlalchemy.orm import Session
 from app import models
-from app.database import get_db
+from app.database import SessionLocal, get_db, run_db
+from app.notifications import upload_notifier, UNKNOWN
+from app import images
+from app.images import run_image
 from app.schemas import SessionStatus
-from app.deps import get_current_user
-from typing import Dict
+from app.deps import CurrentUser, get_current_user
 
-router = APIRouter()
+# Multipart boundaries and part headers sent along with the file
+FORM_OVERHEAD_BYTES = 64 * 1024
 
+def upload_too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail="画像サイズが大きすぎます")
+
+class UploadLimitRoute(APIRoute):
+    """Rejects oversized request bodies before the form is parsed.
+
+    FastAPI reads (and spools to disk) the whole multipart body before the
+    endpoint runs, so a size check in the endpoint comes too late. The
+    declared Content-Length is checked up front, and bodies sent without
+    one are counted as they arrive.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def limited_handler(request: Request):
+            limit = images.MAX_UPLOAD_BYTES + FORM_OVERHEAD_BYTES
+            declared = request.headers.get("content-length", "")
+            if declared.isdigit() and int(declared) > limit:
+                raise upload_too_large()
+
+            received = 0
+
+            async def receive():
+                nonlocal received
+                message = await request.receive()
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise upload_too_large()
+                return message
+
+            return await handler(Request(request.scope, receive))
+
+        return limited_handler
+
+router = APIRouter(route_class=UploadLimitRoute)
+
+# Created by the app lifespan
 UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 @router.get("/session/new", response_model=SessionStatus)
-def create_session(db: Session = Depends(get_db), user: models.User = Depends(get_current_user)):
+def create_session(db: Session = Depends(get_db), user: CurrentUser = Depends(get_current_user)):
     session_id = str(uuid.uuid4())
     db_session = models.UploadSession(
         user_id=user.id,
@@ -25,6 +65,7 @@ def create_session(db: Session = Depends(get_db), user: models.User = Depends(ge
     )
     db.add(db_session)
     db.commit()
+    upload_notifier.remember(session_id, None)
     return SessionStatus(session_id=session_id, has_image=False)
 
 @router.get("/session/{session_id}/status", response_model=SessionStatus)
@@ -39,31 +80,83 @@ def get_session_status(session_id: str, db: Session = Depends(get_db)):
         image_path=db_session.image_path
     )
 
+@router.get("/session/{session_id}/wait", response_model=SessionStatus)
+async def wait_for_upload(session_id: str, timeout: float = Query(25, ge=1, le=60)):
+    """Long-poll: answers as soon as an image is uploaded, or with has_image=False after `timeout` seconds.
+
+    There is no request-scoped DB session here: it would keep its pooled
+    connection checked out for the whole wait.
+    """
+    image_path = upload_notifier.latest(session_id)
+    if image_path is UNKNOWN:
+        # First time this process sees the session: read it once, then rely on notifications
+        def load_session():
+            db = SessionLocal()
+            try:
+                return db.query(models.UploadSession.has_image, models.UploadSession.image_path).filter(
+                    models.UploadSession.session_id == session_id
+                ).first()
+            finally:
+                db.close()
+
+        db_session = await run_db(load_session)
+        if not db_session:
+            raise HTTPException(status_code=404, detail="Session not found")
+        image_path = upload_notifier.settle(session_id, db_session.image_path if db_session.has_image else None)
+
+    if not image_path:
+        image_path = await upload_notifier.wait(session_id, timeout)
+
+    return SessionStatus(session_id=session_id, has_image=bool(image_path), image_path=image_path)
+
 @router.post("/upload/{session_id}")
-async def upload_image(session_id: str, file: UploadFile = File(...), db: Session = Depends(get_db)):
-    db_session = db.query(models.UploadSession).filter(models.UploadSession.session_id == session_id).first()
-    if not db_session:
+async def upload_image(session_id: str, file: UploadFile = File(...)):
+    # Each DB step uses its own short-lived session: a request-scoped one
+    # would keep a pooled connection checked out while the file is saved and decoded
+    def session_exists():
+        db = SessionLocal()
+        try:
+            return db.query(models.UploadSession.id).filter(models.UploadSession.session_id == session_id).first() is not None
+        finally:
+            db.close()
+
+    if not await run_db(session_exists):
         raise HTTPException(status_code=404, detail="Session not found")
-    
-    # Save file
-    file_extension = file.filename.split(".")[-1] if "." in file.filename else "jpg"
-    file_name = f"{session_id}.{file_extension}"
-    file_path = os.path.join(UPLOAD_DIR, file_name)
+
+    # The body was capped by UploadLimitRoute; this is the exact limit on the file itself
+    if file.size is not None and file.size > images.MAX_UPLOAD_BYTES:
+        raise upload_too_large()
+
+    # Save file (the extension comes from the sniffed content, not the filename)
+    tmp_path = os.path.join(UPLOAD_DIR, f"{session_id}.part")
     
     try:
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        await run_image(images.save_stream, file.file, tmp_path)
+        file_path = await run_image(images.finalize_upload, tmp_path, os.path.join(UPLOAD_DIR, session_id))
             
         # Normalize path for web/URL usage (especially on Windows)
         web_path = file_path.replace("\\", "/")
-            
-        db_session.has_image = True
-        db_session.image_path = web_path
-        db.commit()
+
+        def mark_uploaded():
+            db = SessionLocal()
+            try:
+                db.query(models.UploadSession).filter(models.UploadSession.session_id == session_id).update(
+                    {models.UploadSession.has_image: True, models.UploadSession.image_path: web_path},
+                    synchronize_session=False
+                )
+                db.commit()
+            finally:
+                db.close()
+            upload_notifier.publish(session_id, web_path)
+
+        await run_db(mark_uploaded)
         
         return {"status": "success", "file_path": web_path}
-        
+
+    except images.UploadTooLarge:
+        raise upload_too_large()
+    except images.UnsupportedImage:
+        raise HTTPException(status_code=415, detail="対応していない画像形式です（JPEG/PNG/WebP/GIF）")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -76,5 +169,6 @@ def clear_session_image(session_id: str, db: Session = Depends(get_db)):
     db_session.has_image = False
     db_session.image_path = None
     db.commit()
+    upload_notifier.reset(session_id)
     
     return {"status": "success", "message": "Session image status cleared"}
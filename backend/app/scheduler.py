@@ -0,0 +1,225 @@
+"""Process-wide scheduler for outbound LLM requests.
+
+Every chat turn takes a slot before calling the LLM. A slot is granted only
+when the requests-per-minute and tokens-per-minute budgets allow it and
+fewer than `max_in_flight` calls are running. Otherwise the turn waits in a
+bounded queue that is served round-robin across users, so one student
+sending many messages can't starve the rest of the class. When the queue
+is full (or a turn waits too long) the caller gets `SchedulerBusy` and
+should answer 503 with Retry-After.
+"""
+import os
+import sys
+import math
+import time
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Hashable, List
+from app.llm import prompt_text
+from app.shared import worker_count
+
+class SchedulerBusy(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"LLM queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Refills `per_minute` units evenly over a minute; 0 disables the limit."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay_for(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if available now)."""
+        if not self.capacity:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        if self.capacity:
+            self._refill()
+            self.level -= min(amount, self.capacity)
+
+class LLMScheduler:
+    def __init__(
+        self,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_in_flight: int = 16,
+        max_queue: int = 200,
+        max_wait: float = 60.0
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.in_flight = 0
+        # user -> FIFO of (future, tokens, enqueued_at); users are served round-robin
+        self._queues: "OrderedDict[Hashable, Deque[List[Any]]]" = OrderedDict()
+        self._queued = 0
+        self._timer = None
+        self._wait_samples: Deque[float] = deque(maxlen=1000)
+        self.granted = 0
+        self.rejected = 0
+        self.output_tokens = 0
+
+    @classmethod
+    def from_env(cls):
+        # The limits are for the whole deployment; each worker gets an equal share
+        workers = worker_count()
+        max_in_flight = int(os.getenv("LLM_MAX_IN_FLIGHT", "16"))
+        if workers > max_in_flight:
+            # A worker can't run less than one call at a time
+            print(
+                f"LLM_MAX_IN_FLIGHT={max_in_flight} is below the {workers} workers; "
+                f"up to {workers} LLM calls may run at once",
+                file=sys.stderr
+            )
+        return cls(
+            requests_per_minute=float(os.getenv("LLM_RPM", "120")) / workers,
+            tokens_per_minute=float(os.getenv("LLM_TPM", "1000000")) / workers,
+            max_in_flight=max(1, max_in_flight // workers),
+            max_queue=max(1, int(os.getenv("LLM_MAX_QUEUE", "200")) // workers),
+            max_wait=float(os.getenv("LLM_MAX_QUEUE_WAIT_SECONDS", "60"))
+        )
+
+    def _retry_after(self) -> int:
+        rate = self.requests.rate or self.max_in_flight
+        return max(1, math.ceil((self._queued + 1) / rate))
+
+    def _budget_delay(self, tokens: float) -> float:
+        return max(self.requests.delay_for(1), self.tokens.delay_for(tokens))
+
+    def _grant(self, tokens: float, enqueued_at: float):
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        self.in_flight += 1
+        self.granted += 1
+        self._wait_samples.append(time.monotonic() - enqueued_at)
+
+    def _dispatch(self):
+        self._timer = None
+        while self._queues and self.in_flight < self.max_in_flight:
+            user, queue = next(iter(self._queues.items()))
+            future, tokens, enqueued_at = queue[0]
+            delay = self._budget_delay(tokens)
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+
+            queue.popleft()
+            self._queued -= 1
+            del self._queues[user]
+            if queue:
+                # Back of the line: the next user gets the next slot
+                self._queues[user] = queue
+            self._grant(tokens, enqueued_at)
+            future.set_result(None)
+
+    def _remove(self, user: Hashable, entry: List[Any]):
+        queue = self._queues.get(user)
+        if queue is not None and entry in queue:
+            queue.remove(entry)
+            self._queued -= 1
+            if not queue:
+                del self._queues[user]
+
+    def check_capacity(self):
+        """Raises SchedulerBusy if a new request would be rejected right now."""
+        if self._queued >= self.max_queue:
+            self.rejected += 1
+            raise SchedulerBusy(self._retry_after())
+
+    async def acquire(self, user: Hashable, tokens: float = 1):
+        enqueued_at = time.monotonic()
+        if not self._queued and self.in_flight < self.max_in_flight and not self._budget_delay(tokens):
+            self._grant(tokens, enqueued_at)
+            return
+
+        self.check_capacity()
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [future, tokens, enqueued_at]
+        self._queues.setdefault(user, deque()).append(entry)
+        self._queued += 1
+        if self._timer is None:
+            self._dispatch()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+        except asyncio.TimeoutError:
+            if future.done():
+                # Granted at the last moment
+                return
+            self._remove(user, entry)
+            self.rejected += 1
+            raise SchedulerBusy(self._retry_after())
+        except asyncio.CancelledError:
+            if future.done():
+                self.release()
+            else:
+                self._remove(user, entry)
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        if self._timer is None:
+            self._dispatch()
+
+    def charge(self, tokens: float):
+        """Takes a reply's output tokens from the TPM budget once its size is known.
+
+        Slots are granted on the prompt size alone, so the budget can go
+        below zero here; later requests then wait until it has refilled.
+        """
+        self.tokens.take(tokens)
+        self.output_tokens += tokens
+
+    @asynccontextmanager
+    async def slot(self, user: Hashable, tokens: float = 1):
+        await self.acquire(user, tokens)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        samples = sorted(self._wait_samples)
+
+        def pct(p):
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))], 3) if samples else 0.0
+
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self._queued,
+            "queued_users": len(self._queues),
+            "granted": self.granted,
+            "rejected": self.rejected,
+            "output_tokens": self.output_tokens,
+            "wait_seconds_p50": pct(0.5),
+            "wait_seconds_p95": pct(0.95),
+            "wait_seconds_max": round(samples[-1], 3) if samples else 0.0,
+        }
+
+def estimate_tokens(parts: List[Any]) -> int:
+    """Rough prompt size: about one token per two characters of Japanese text.
+
+    Accepts plain parts as well as role-tagged turns ({"role", "parts"}).
+    """
+    return len(prompt_text(parts)) // 2 + 1
+
+llm_scheduler = LLMScheduler.from_env()
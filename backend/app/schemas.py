@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, model_validator
 from datetime import datetime
 from typing import Optional, List
 
@@ -64,6 +64,71 @@ class Plan(PlanBase):
     class Config:
         from_attributes = True
 
+# Upserts: an update changes only the fields sent, so every field is
+# optional; a new row still needs what its create schema requires.
+class PlanItemUpsert(BaseModel):
+    id: Optional[int] = None  # existing item to update; omitted for a new item
+    content: Optional[str] = None
+    priority: Optional[int] = None
+    due_date: Optional[datetime] = None
+    is_completed: Optional[bool] = None
+    understanding_score: Optional[int] = None
+    last_result: Optional[str] = None
+
+    @model_validator(mode="after")
+    def _new_item_has_content(self):
+        if self.id is None and self.content is None:
+            raise ValueError("content is required for a new item")
+        return self
+
+    def to_create(self) -> PlanItemCreate:
+        """The new item, with PlanItemCreate's defaults for the fields not sent."""
+        return PlanItemCreate(**self.model_dump(exclude_unset=True, exclude={"id"}))
+
+class PlanUpsert(BaseModel):
+    id: Optional[int] = None  # existing plan to update; omitted for a new plan
+    title: Optional[str] = None
+    target: Optional[str] = None
+    items: List[PlanItemUpsert] = []
+
+    @model_validator(mode="after")
+    def _new_plan_has_title(self):
+        if self.id is None and self.title is None:
+            raise ValueError("title is required for a new plan")
+        return self
+
+class PlanBatch(BaseModel):
+    plans: List[PlanUpsert]
+
+class ScorePoint(BaseModel):
+    at: datetime
+    item_id: int
+    score: int
+
+class PlanProgress(BaseModel):
+    plan_id: int
+    title: str
+    target: Optional[str] = None
+    created_at: datetime
+    item_count: int
+    completed_count: int
+    completion_ratio: float  # 0.0-1.0
+    average_score: float  # mean understanding_score of the plan's items
+    latest_score: Optional[int] = None
+    latest_score_at: Optional[datetime] = None
+    overdue_count: int  # open items past their due_date
+    score_series: List[ScorePoint] = []  # oldest first
+
+class ProgressStats(BaseModel):
+    item_count: int
+    completed_count: int
+    completion_ratio: float
+    average_score: float
+    overdue_count: int
+    latest_score: Optional[int] = None
+    latest_score_at: Optional[datetime] = None
+    plans: List[PlanProgress]
+
 # --- Memo Schemas ---
 class MemoBase(BaseModel):
     content: str
@@ -78,6 +143,18 @@ class Memo(MemoBase):
     class Config:
         from_attributes = True
 
+class SearchResult(BaseModel):
+    kind: str  # "chat" or "plan"
+    id: int  # ChatMessage.id or PlanItem.id
+    session_id: Optional[str] = None  # chat results
+    plan_id: Optional[int] = None  # plan results
+    snippet: str  # HTML-escaped, matches wrapped in <mark>
+    score: Optional[float] = None  # bm25; lower is more relevant
+
+class MemoSearchResult(Memo):
+    snippet: str  # HTML-escaped, matches wrapped in <mark>
+    score: Optional[float] = None  # bm25; lower is more relevant
+
 class AdminLogItem(ChatHistoryItem):
     username: str
 
@@ -0,0 +1,65 @@
+"""Helpers for the FTS5 (trigram) search endpoints.
+
+The trigram tokenizer only indexes substrings of 3+ characters, so each
+search term is routed: longer terms become a quoted FTS5 MATCH phrase,
+shorter ones (common in Japanese, e.g. "数学") a LIKE filter on the base
+table. Snippets are built with control-character markers and then
+HTML-escaped, so the only markup in a snippet is our own <mark> tags.
+"""
+import re
+import html
+import json
+import base64
+from typing import List, Optional, Tuple
+from fastapi import HTTPException
+
+MIN_FTS_TERM = 3
+SNIPPET_TOKENS = 16
+# Markers passed to snippet(); replaced by <mark> after escaping
+HL_START, HL_END = "\x02", "\x03"
+
+def split_terms(q: str) -> Tuple[List[str], List[str]]:
+    """Splits a query into (FTS5 terms, LIKE terms). All terms must match."""
+    terms = [t for t in re.split(r"\s+", q.strip()) if t]
+    return [t for t in terms if len(t) >= MIN_FTS_TERM], [t for t in terms if len(t) < MIN_FTS_TERM]
+
+def fts_query(terms: List[str]) -> str:
+    # Each term is a quoted phrase, so FTS5 operators in user input are literal
+    return " AND ".join('"' + t.replace('"', '""') + '"' for t in terms)
+
+def owner_token(user_id: int) -> str:
+    """The per-user token stored in search_index.owner (see migration 3)."""
+    return f"‹{user_id}›"
+
+def like_pattern(term: str) -> str:
+    return "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+def render_snippet(raw: str) -> str:
+    return html.escape(raw).replace(HL_START, "<mark>").replace(HL_END, "</mark>")
+
+def make_snippet(text: str, terms: List[str], width: int = 60) -> str:
+    """Snippet for rows matched without FTS (LIKE terms only): text around the first hit."""
+    lowered = text.lower()
+    hits = [(lowered.find(t.lower()), t) for t in terms]
+    hits = [(pos, t) for pos, t in hits if pos >= 0]
+    if not hits:
+        return html.escape(text[:width])
+    pos, term = min(hits)
+    start = max(0, pos - width // 3)
+    end = min(len(text), start + width)
+    raw = text[start:pos] + HL_START + text[pos:pos + len(term)] + HL_END + text[pos + len(term):end]
+    return ("…" if start else "") + render_snippet(raw) + ("…" if end < len(text) else "")
+
+def encode_cursor(*values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor: Optional[str], size: int) -> Optional[list]:
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        if isinstance(values, list) and len(values) == size:
+            return values
+    except ValueError:
+        pass
+    raise HTTPException(status_code=400, detail="Invalid cursor")
@@ -0,0 +1,165 @@
+"""Coordination between worker processes.
+
+Each worker keeps its own in-memory state (upload-ready signals, the user
+and settings caches), which goes stale in every worker but the one that
+changed it. Such changes are published on a `Bus` and delivered to every
+worker's handlers:
+
+- LocalBus delivers within the process (a single worker, the default).
+- SQLiteBus also appends the event to the shared_events table; every
+  worker polls it every SHARED_POLL_MS and delivers other workers' events.
+
+Handlers run on the worker's event loop, whichever thread publishes.
+Budgets that are naturally per process (the LLM scheduler's rate limits)
+are instead split evenly across workers, see `worker_count`.
+"""
+import os
+import sys
+import uuid
+import asyncio
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+from sqlalchemy import delete, func, insert, select
+from app import models
+from app.database import engine, run_db
+
+# handler(key, value)
+Handler = Callable[[str, Optional[str]], None]
+
+def worker_count() -> int:
+    """Worker processes serving the app (WEB_CONCURRENCY, set by serve.py)."""
+    return max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+class Bus:
+    def __init__(self):
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published = 0
+        self.received = 0
+
+    def subscribe(self, channel: str, handler: Handler):
+        self._handlers.setdefault(channel, []).append(handler)
+
+    def publish(self, channel: str, key: str, value: Optional[str] = None):
+        """Delivers the event to this worker's handlers (and, per backend, to the others)."""
+        self.published += 1
+        self._deliver(channel, key, value)
+
+    def _deliver(self, channel: str, key: str, value: Optional[str]):
+        def run():
+            for handler in self._handlers.get(channel, ()):
+                try:
+                    handler(key, value)
+                except Exception as e:
+                    print(f"Bus handler for {channel} failed: {e}", file=sys.stderr)
+
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if self._loop is None or on_loop or self._loop.is_closed():
+            run()
+        else:
+            self._loop.call_soon_threadsafe(run)
+
+    async def start(self):
+        """Binds handler delivery to the running loop; called from the app lifespan."""
+        self._loop = asyncio.get_running_loop()
+
+    async def stop(self):
+        self._loop = None
+
+    def stats(self) -> dict:
+        return {"backend": type(self).__name__, "published": self.published, "received": self.received}
+
+class LocalBus(Bus):
+    pass
+
+class SQLiteBus(Bus):
+    def __init__(self, poll_interval: float = 0.1, retention: float = 300.0):
+        super().__init__()
+        self.poll_interval = poll_interval
+        self.retention = retention
+        # Tells this worker's own events apart when they come back from the table
+        self.origin = uuid.uuid4().hex
+        self._last_id = 0
+        self._poller: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            poll_interval=float(os.getenv("SHARED_POLL_MS", "100")) / 1000.0,
+            retention=float(os.getenv("SHARED_EVENT_RETENTION_SECONDS", "300"))
+        )
+
+    def publish(self, channel: str, key: str, value: Optional[str] = None):
+        """Delivers locally, then records the event for the other workers.
+
+        Writes to the database, so async code calls it through run_db.
+        """
+        super().publish(channel, key, value)
+        with engine.begin() as conn:
+            conn.execute(insert(models.SharedEvent).values(
+                origin=self.origin, channel=channel, key=key, value=value, created_at=datetime.now()
+            ))
+
+    def _fetch(self) -> list:
+        Event = models.SharedEvent
+        with engine.connect() as conn:
+            return conn.execute(
+                select(Event.id, Event.origin, Event.channel, Event.key, Event.value)
+                .where(Event.id > self._last_id).order_by(Event.id)
+            ).all()
+
+    def _prune(self):
+        with engine.begin() as conn:
+            conn.execute(delete(models.SharedEvent).where(
+                models.SharedEvent.created_at < datetime.now() - timedelta(seconds=self.retention)
+            ))
+
+    async def start(self):
+        await super().start()
+        # Only events published from now on matter
+        def last_id():
+            with engine.connect() as conn:
+                return conn.execute(select(func.max(models.SharedEvent.id))).scalar() or 0
+        self._last_id = await run_db(last_id)
+        self._poller = asyncio.get_running_loop().create_task(self._poll())
+
+    async def stop(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            try:
+                await self._poller
+            except asyncio.CancelledError:
+                pass
+            self._poller = None
+        await super().stop()
+
+    async def _poll(self):
+        polls = 0
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                for event_id, origin, channel, key, value in await run_db(self._fetch):
+                    self._last_id = event_id
+                    if origin != self.origin:
+                        self.received += 1
+                        self._deliver(channel, key, value)
+                polls += 1
+                if polls * self.poll_interval >= self.retention / 10:
+                    polls = 0
+                    await run_db(self._prune)
+            except Exception as e:
+                print(f"Shared event poll failed: {e}", file=sys.stderr)
+
+def create_bus() -> Bus:
+    """SHARED_STATE_BACKEND=local|sqlite; defaults to sqlite when running several workers."""
+    backend = os.getenv("SHARED_STATE_BACKEND") or ("sqlite" if worker_count() > 1 else "local")
+    if backend == "sqlite":
+        return SQLiteBus.from_env()
+    if backend != "local":
+        raise ValueError(f"Unknown SHARED_STATE_BACKEND: {backend}")
+    return LocalBus()
+
+bus = create_bus()
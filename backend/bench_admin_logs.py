@@ -0,0 +1,138 @@
+"""Benchmark the admin log listing and export on a large chat_messages table.
+
+Builds a throwaway database with N chat messages and measures:
+
+- keyset pages: walking /admin/logs with the X-Next-Cursor cursor, against
+  the same pages fetched with OFFSET, at increasing depths;
+- the export: peak Python memory (tracemalloc) while streaming the newest
+  --export-rows rows and a tenth of them. Batched fetching keeps the peak
+  about the same for both.
+
+    python bench_admin_logs.py                 # 1M messages
+    python bench_admin_logs.py --messages 200000 --page-size 500
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+
+def main(args):
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from fastapi import Response
+    from sqlalchemy import insert
+    from app.database import engine, SessionLocal
+    from app import models
+    from app.migrations import prepare_database
+    from app.routers.admin import get_admin_logs, export_admin_logs, _logs_query
+
+    prepare_database(engine)
+
+    rnd = random.Random(0)
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"username": f"user{i}", "email": f"user{i}@example.com"} for i in range(1, args.users + 1)
+        ])
+        at = datetime(2024, 1, 1)
+        batch = []
+        for i in range(args.messages):
+            # Several messages share a timestamp now and then, so the id tiebreak matters
+            if rnd.random() < 0.8:
+                at += timedelta(seconds=rnd.randint(1, 30))
+            user_id = rnd.randint(1, args.users)
+            batch.append({
+                "user_id": user_id, "session_id": f"s{user_id}-{i // 200}",
+                "role": "user" if i % 2 == 0 else "assistant",
+                "content": "二次方程式の解の公式を使って解いてみよう。" * rnd.randint(1, 4),
+                "created_at": at,
+            })
+            if len(batch) == 50000:
+                conn.execute(insert(models.ChatMessage), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(models.ChatMessage), batch)
+    print(f"inserted {args.messages} messages in {time.perf_counter() - started:.1f}s")
+
+    def keyset_page(cursor):
+        response = Response()
+        with SessionLocal() as db:
+            rows = get_admin_logs(
+                response=response, username=None, session_id=None, since=None, until=None,
+                cursor=cursor, limit=args.page_size, db=db, current_user=None
+            )
+        return rows, response.headers.get("X-Next-Cursor")
+
+    def offset_page(page):
+        with SessionLocal() as db:
+            return _logs_query(db, None, None, None, None).offset(page * args.page_size).limit(args.page_size).all()
+
+    # Walk the cursor chain once, remembering the cursor of each measured depth
+    depths = sorted({d for d in args.depths if d * args.page_size < args.messages})
+    cursors, cursor = {0: None}, None
+    walk_started = time.perf_counter()
+    for page in range(1, max(depths) + 1):
+        _, cursor = keyset_page(cursor)
+        cursors[page] = cursor
+    walk = time.perf_counter() - walk_started
+    print(f"walked {max(depths)} pages of {args.page_size} by cursor in {walk:.1f}s "
+          f"({walk / max(depths) * 1000:.2f}ms per page)")
+
+    for page in depths:
+        def timed(fn):
+            best = float("inf")
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                found = fn()
+                best = min(best, time.perf_counter() - t0)
+            return best, found
+
+        keyset_time, (keyset_rows, _) = timed(lambda: keyset_page(cursors[page]))
+        offset_time, offset_rows = timed(lambda: offset_page(page))
+        assert [r.id for r in keyset_rows] == [r.id for r in offset_rows], f"page {page} differs"
+        print(f"page {page:>6}  keyset {keyset_time * 1000:8.2f}ms   OFFSET {offset_time * 1000:8.2f}ms")
+
+    def export_peak(rows: int):
+        # Newest `rows` rows: everything from the created_at of the rows-th newest message
+        with SessionLocal() as db:
+            since = _logs_query(db, None, None, None, None).offset(rows - 1).limit(1).one().created_at
+        response = export_admin_logs(
+            format=args.format, username=None, session_id=None, since=since, until=None, current_user=None
+        )
+
+        async def consume():
+            size = 0
+            async for chunk in response.body_iterator:
+                size += len(chunk)
+            return size
+
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        size = asyncio.run(consume())
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return size, peak, elapsed
+
+    export_rows = min(args.export_rows, args.messages)
+    for rows in (export_rows // 10, export_rows):
+        size, peak, elapsed = export_peak(rows)
+        print(f"export {args.format} {rows:>8} rows  {size / 1e6:8.1f}MB streamed  "
+              f"peak {peak / 1e6:6.1f}MB  {elapsed:.1f}s (under tracemalloc)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--depths", type=int, nargs="+", default=[1, 10, 100, 1000, 5000],
+                        help="Pages to time; deeper pages only matter to OFFSET")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per page; the best time is reported")
+    parser.add_argument("--export-rows", type=int, default=20000, help="Rows in the larger export; tracemalloc makes it slow")
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    main(parser.parse_args())
@@ -0,0 +1,60 @@
+"""Micro-benchmark for reply marker parsing (app/markers.py).
+
+Compares the single-pass parser with the previous four-pass regex version
+on a typical mission reply, and times chunk-fed parsing as used by
+/api/chat/stream:
+
+    python bench_markers.py
+    python bench_markers.py --number 50000 --chunk 4
+"""
+import re
+import sys
+import os
+import argparse
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from app.markers import parse_markers, MarkerParser
+
+REPLY = (
+    "よく頑張りましたね！二次方程式の解の公式を使って、判別式の符号から解の個数を判断できています。"
+    "次は係数が分数の場合にも挑戦してみましょう。途中式を自分の言葉で説明できると、さらに理解が深まります。\n"
+    "[[RESULT: 10問中8問正解]]\n"
+) * 3 + "[[SCORE: 75]]"
+
+def legacy_extract(raw_text):
+    """The original implementation: two searches and two substitutions."""
+    res_val = None
+    res_match = re.search(r"\[\[RESULT:\s*(.*?)\]\]", raw_text)
+    if res_match:
+        res_val = res_match.group(1).strip()
+        clean_text = re.sub(r"\[\[RESULT:\s*.*?\]\]", "", raw_text).strip()
+    else:
+        clean_text = raw_text
+    score = None
+    score_match = re.search(r"\[\[SCORE:\s*(\d+)\]\]", clean_text)
+    if score_match:
+        score = int(score_match.group(1))
+        clean_text = re.sub(r"\[\[SCORE:\s*\d+\]\]", "", clean_text).strip()
+    return clean_text, score, res_val
+
+def streamed(text, chunk):
+    parser = MarkerParser()
+    out = [parser.feed(text[i:i + chunk]) for i in range(0, len(text), chunk)]
+    out.append(parser.flush())
+    return "".join(out), parser.score, parser.result
+
+def report(label, seconds, number):
+    print(f"{label:<22} {seconds / number * 1e6:8.2f} µs/reply")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="Replies parsed per measurement")
+    parser.add_argument("--chunk", type=int, default=8, help="Characters per streamed chunk")
+    args = parser.parse_args()
+
+    print(f"reply: {len(REPLY)} chars, {REPLY.count('[[')} markers")
+    report("legacy (4 passes)", min(timeit.repeat(lambda: legacy_extract(REPLY), number=args.number, repeat=5)), args.number)
+    report("parse_markers", min(timeit.repeat(lambda: parse_markers(REPLY), number=args.number, repeat=5)), args.number)
+    report(f"MarkerParser ({args.chunk}-char)",
+           min(timeit.repeat(lambda: streamed(REPLY, args.chunk), number=args.number // 10, repeat=5)), args.number // 10)
@@ -0,0 +1,79 @@
+"""Benchmark memo search: FTS5 trigram index vs a LIKE '%...%' scan.
+
+Builds a throwaway database with N memos spread over a few users (the FTS
+index is filled by the insert trigger) and times both ways of finding one
+user's memos containing a term:
+
+    python bench_memo_search.py                # 100k memos
+    python bench_memo_search.py --memos 20000 --repeat 50
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+def main(args):
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from sqlalchemy import text
+    from app.database import engine
+    from app import models
+    from app.migrations import run_migrations
+    from app.search import fts_query
+
+    models.Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+    rnd = random.Random(0)
+    words = [
+        "二次方程式", "解の公式", "因数分解", "英単語", "関係代名詞", "光合成", "三角関数", "微分",
+        "積分", "歴史年表", "化学反応式", "確率", "漸化式", "古文単語", "物理の公式", "復習", "宿題", "小テスト",
+    ]
+    # Rare terms show up in about one memo per thousand, like most real searches
+    rare = ["ヘロンの公式", "ド・モルガン", "仮定法過去完了", "ケプラーの法則"]
+    filler = "今日はここまで進めた。明日は続きをやる。わからないところを先生に聞く。"
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        rows = [
+            {
+                "user_id": rnd.randint(1, args.users),
+                "content": " ".join(rnd.sample(words, 3) + ([rnd.choice(rare)] if rnd.random() < 0.001 else []))
+                + " " + filler[:rnd.randint(10, len(filler))],
+            }
+            for _ in range(args.memos)
+        ]
+        conn.execute(text("INSERT INTO memos (user_id, content, created_at) VALUES (:user_id, :content, CURRENT_TIMESTAMP)"), rows)
+    print(f"inserted {args.memos} memos for {args.users} users in {time.perf_counter() - started:.1f}s")
+
+    like_sql = text(
+        "SELECT id, content FROM memos WHERE user_id = :user_id AND content LIKE :pattern "
+        "ORDER BY created_at DESC, id DESC LIMIT 20"
+    )
+    fts_sql = text(
+        "SELECT m.id, snippet(memos_fts, 0, '[', ']', '…', 16) FROM memos_fts JOIN memos m ON m.id = memos_fts.rowid "
+        "WHERE memos_fts MATCH :match AND m.user_id = :user_id ORDER BY bm25(memos_fts), m.id LIMIT 20"
+    )
+
+    # Common terms match ~1/6 of all memos; LIKE can stop after 20 hits there
+    for term in ["漸化式", "先生に聞く", "ヘロンの公式", "ケプラーの法則", "存在しない語句"]:
+        with engine.connect() as conn:
+            def timed(sql, params):
+                best = float("inf")
+                for _ in range(args.repeat):
+                    t0 = time.perf_counter()
+                    found = conn.execute(sql, params).all()
+                    best = min(best, time.perf_counter() - t0)
+                return best, len(found)
+
+            like_time, like_n = timed(like_sql, {"user_id": 1, "pattern": f"%{term}%"})
+            fts_time, fts_n = timed(fts_sql, {"user_id": 1, "match": fts_query([term])})
+        print(f"{term:<10} LIKE {like_time * 1000:8.2f}ms ({like_n} rows)   FTS5 {fts_time * 1000:8.2f}ms ({fts_n} rows)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--memos", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=5, help="Memos are spread across this many users")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per query; the best time is reported")
+    main(parser.parse_args())
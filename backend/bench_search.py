@@ -0,0 +1,76 @@
+"""Benchmark GET /api/search over a large chat history.
+
+Builds a throwaway database with N chat messages spread over many users
+(indexed by the search triggers) and times one user's ranked search for
+common, rare and absent terms through the real endpoint function:
+
+    python bench_search.py                       # 1M messages, 200 users
+    python bench_search.py --messages 200000 --users 50
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+def main(args):
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from fastapi import Response
+    from sqlalchemy import text
+    from app.database import engine, SessionLocal
+    from app import models
+    from app.deps import CurrentUser
+    from app.migrations import run_migrations
+    from app.routers.search import search
+
+    models.Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+
+    rnd = random.Random(0)
+    topics = [
+        "二次方程式の解の公式", "因数分解のコツ", "関係代名詞の使い方", "光合成の仕組み", "三角関数のグラフ",
+        "微分と積分の関係", "化学反応式の係数", "確率の求め方", "漸化式の解き方", "古文の助動詞",
+    ]
+    rare = ["ヘロンの公式", "ド・モルガンの法則", "仮定法過去完了", "ケプラーの法則"]
+    reply = "いい質問ですね。まずは問題文をよく読んで、わかっている条件を整理してみましょう。"
+
+    started = time.perf_counter()
+    batch = 50000
+    with engine.begin() as conn:
+        for offset in range(0, args.messages, batch):
+            rows = []
+            for i in range(offset, min(args.messages, offset + batch)):
+                topic = rnd.choice(topics) + (" " + rnd.choice(rare) if rnd.random() < 0.0005 else "")
+                rows.append({
+                    "user_id": rnd.randint(1, args.users),
+                    "session_id": f"s{i // 20}",
+                    "role": "user" if i % 2 == 0 else "assistant",
+                    "content": f"{topic}について教えてください。" if i % 2 == 0 else f"{reply}{topic}は大事なポイントです。",
+                })
+            conn.execute(text(
+                "INSERT INTO chat_messages (user_id, session_id, role, content, created_at) "
+                "VALUES (:user_id, :session_id, :role, :content, CURRENT_TIMESTAMP)"
+            ), rows)
+    print(f"indexed {args.messages} messages for {args.users} users in {time.perf_counter() - started:.0f}s")
+
+    user = CurrentUser(id=1, username="bench")
+    db = SessionLocal()
+    try:
+        for q in ["漸化式", "解の公式 教えて", "ケプラーの法則", "存在しない語句"]:
+            best, found = float("inf"), 0
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                found = len(search(Response(), q=q, kind=None, session_id=None, cursor=None, limit=20, db=db, user=user))
+                best = min(best, time.perf_counter() - t0)
+            print(f"{q:<12} {best * 1000:8.2f}ms ({found} results)")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=10, help="Runs per query; the best time is reported")
+    main(parser.parse_args())
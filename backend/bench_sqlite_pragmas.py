@@ -0,0 +1,128 @@
+"""Benchmark SQLite journal modes: chat history reads alongside chat inserts.
+
+For each journal mode, builds a throwaway database with the engine the app
+uses (app.database.create_db_engine, so SQLITE_* pragmas apply) and, for a
+fixed time, runs reader threads polling a session's history against writer
+threads committing chat turns (a user and an assistant message per
+transaction, like the write queue). DELETE is the rollback journal the app
+used before WAL, so it gives the "before" numbers:
+
+    python bench_sqlite_pragmas.py                         # DELETE vs WAL
+    python bench_sqlite_pragmas.py --readers 8 --writers 2 --seconds 10
+    SQLITE_SYNCHRONOUS=FULL python bench_sqlite_pragmas.py --modes WAL
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+from datetime import datetime
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def run_mode(mode: str, args) -> dict:
+    os.environ["SQLITE_JOURNAL_MODE"] = mode
+    from sqlalchemy import insert, select
+    from sqlalchemy.exc import OperationalError
+    from app import models
+    from app.database import create_db_engine
+
+    engine = create_db_engine(f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        actual = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+        conn.execute(insert(models.User).values(id=1, username="bench", email="bench@example.com"))
+        rnd = random.Random(0)
+        conn.execute(insert(models.ChatMessage), [
+            {
+                "user_id": 1, "session_id": f"s{rnd.randrange(args.sessions)}", "role": "user",
+                "content": "二次方程式の解の公式を使って解いてみよう。" * 3, "created_at": datetime.now(),
+            }
+            for _ in range(args.messages)
+        ])
+
+    Message = models.ChatMessage
+    deadline = time.perf_counter() + args.seconds
+    reads, writes, errors = [], [], []
+    lock = threading.Lock()
+
+    def reader(seed):
+        rnd = random.Random(seed)
+        latencies = []
+        while time.perf_counter() < deadline:
+            session_id = f"s{rnd.randrange(args.sessions)}"
+            t0 = time.perf_counter()
+            try:
+                with engine.connect() as conn:
+                    conn.execute(
+                        select(Message).where(Message.user_id == 1, Message.session_id == session_id)
+                        .order_by(Message.created_at.desc()).limit(50)
+                    ).all()
+            except OperationalError as e:
+                errors.append(str(e.orig))
+                continue
+            latencies.append(time.perf_counter() - t0)
+        with lock:
+            reads.extend(latencies)
+
+    def writer(seed):
+        rnd = random.Random(seed)
+        latencies = []
+        while time.perf_counter() < deadline:
+            session_id = f"s{rnd.randrange(args.sessions)}"
+            t0 = time.perf_counter()
+            try:
+                with engine.begin() as conn:
+                    now = datetime.now()
+                    conn.execute(insert(Message), [
+                        {"user_id": 1, "session_id": session_id, "role": "user", "content": "質問です", "created_at": now},
+                        {"user_id": 1, "session_id": session_id, "role": "assistant", "content": "回答です" * 20, "created_at": now},
+                    ])
+            except OperationalError as e:
+                errors.append(str(e.orig))
+                continue
+            latencies.append(time.perf_counter() - t0)
+        with lock:
+            writes.extend(latencies)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+    threads += [threading.Thread(target=writer, args=(1000 + i,)) for i in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    return {"mode": actual.upper(), "reads": reads, "writes": writes, "errors": errors}
+
+def main(args):
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    print(f"{args.readers} readers, {args.writers} writers, {args.seconds:.0f}s per mode, "
+          f"{args.messages} messages in {args.sessions} sessions")
+    for mode in args.modes:
+        result = run_mode(mode, args)
+        reads, writes = result["reads"], result["writes"]
+        print(
+            f"{result['mode']:<7} reads {len(reads) / args.seconds:8.0f}/s "
+            f"p50 {percentile(reads, 50) * 1000:6.2f}ms p99 {percentile(reads, 99) * 1000:7.2f}ms   "
+            f"turns {len(writes) / args.seconds:6.0f}/s p99 {percentile(writes, 99) * 1000:7.2f}ms   "
+            f"errors {len(result['errors'])}"
+        )
+        for error in sorted(set(result["errors"]))[:3]:
+            print(f"        {error}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=["DELETE", "WAL"], help="SQLITE_JOURNAL_MODE values to compare")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=1)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--messages", type=int, default=50000, help="Messages seeded before the run")
+    parser.add_argument("--sessions", type=int, default=200)
+    main(parser.parse_args())
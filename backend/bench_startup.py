@@ -0,0 +1,86 @@
+"""Startup-time budget check: how long `import main` takes in a fresh process.
+
+Runs `python -X importtime -c "import main"` a few times, with a dummy
+GEMINI_API_KEY so a Gemini deployment is measured, and reports the best
+run and the slowest imports. Exits with status 1 if the best run is over
+the budget, or if a module meant to load on first use (the Gemini SDK,
+Pillow) is imported at startup:
+
+    python bench_startup.py                    # budget 1500 ms
+    python bench_startup.py --budget-ms 800 --top 15
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+# Loaded on first use (app/llm.py, app/images.py); importing them eagerly adds ~1s
+LAZY_MODULES = ("google.generativeai", "PIL")
+
+def measure():
+    """Returns [(module, cumulative us, depth)] for one `import main`, in import order."""
+    env = dict(os.environ, GEMINI_API_KEY="startup-check", LLM_PROVIDER="gemini")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(f"import main failed:\n{result.stderr[-2000:]}")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue  # the header line
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), int(cumulative_us), depth))
+    return modules
+
+def main_subtree(modules):
+    """Splits one run into main's total and the modules imported under it.
+
+    importtime prints a module after everything it imported, so main's
+    subtree is the run of nested lines right before the `main` line.
+    """
+    end = next(i for i, (name, _, depth) in enumerate(modules) if name == "main" and depth == 0)
+    start = end
+    while start > 0 and modules[start - 1][2] > 0:
+        start -= 1
+    return modules[end][1], modules[start:end]
+
+def main(args):
+    total, subtree = None, []
+    for _ in range(args.repeat):
+        run_total, run_subtree = main_subtree(measure())
+        if total is None or run_total < total:
+            total, subtree = run_total, run_subtree
+
+    total_ms = total / 1000
+    print(f"import main: {total_ms:.0f}ms (best of {args.repeat}, budget {args.budget_ms:.0f}ms)")
+    print("slowest imports (cumulative):")
+    # main's direct imports and the modules right under them, largest first
+    top = sorted(((cumulative, name) for name, cumulative, depth in subtree if depth <= 2), reverse=True)
+    for cumulative, name in top[:args.top]:
+        print(f"  {cumulative / 1000:8.1f}ms  {name}")
+
+    failed = False
+    eager = [name for name, _, _ in subtree if any(name == m or name.startswith(m + ".") for m in LAZY_MODULES)]
+    if eager:
+        print(f"FAIL: imported at startup but meant to load on first use: {', '.join(sorted(eager)[:5])}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"FAIL: import main is over budget by {total_ms - args.budget_ms:.0f}ms")
+        failed = True
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", "1500")))
+    parser.add_argument("--repeat", type=int, default=5, help="Runs; the best one is checked")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list")
+    sys.exit(main(parser.parse_args()))
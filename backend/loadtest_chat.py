@@ -0,0 +1,139 @@
+"""Load test for POST /api/chat (and /api/chat/stream).
+
+Drives the chat endpoint with concurrent clients and reports latency
+percentiles and throughput. By default it runs the app in-process against
+the local fake LLM, so no network access or Gemini quota is needed:
+
+    python loadtest_chat.py --requests 500 --concurrency 50
+    python loadtest_chat.py --stream --mission
+    python loadtest_chat.py --url http://127.0.0.1:8000   # against a running server
+
+Fake LLM behaviour is set with FAKE_LLM_LATENCY_MS, FAKE_LLM_TOKENS_PER_SEC,
+FAKE_LLM_ERROR_RATE and FAKE_LLM_429_RATE. --db-delay-ms slows every SQL
+read down; with an instant fake LLM, wall time then follows the DB
+executor's size (DB_EXECUTOR_THREADS) rather than the number of requests:
+
+    export FAKE_LLM_LATENCY_MS=0 FAKE_LLM_TOKENS_PER_SEC=0
+    DB_EXECUTOR_THREADS=1 python loadtest_chat.py --requests 40 --concurrency 40 --db-delay-ms 20
+    DB_EXECUTOR_THREADS=8 python loadtest_chat.py --requests 40 --concurrency 40 --db-delay-ms 20
+
+Requires httpx. The in-process transport buffers whole responses, so
+"first byte" is only meaningful with --url.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+import tempfile
+import contextlib
+
+import httpx
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def run_client(client, path, payload, stream, results):
+    started = time.perf_counter()
+    first_byte = None
+    try:
+        if stream:
+            async with client.stream("POST", path, json=payload) as response:
+                async for _ in response.aiter_bytes():
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - started
+                status = response.status_code
+        else:
+            response = await client.post(path, json=payload)
+            status = response.status_code
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    results.append((status, time.perf_counter() - started, first_byte))
+
+async def main(args):
+    lifespan = contextlib.nullcontext()
+    if args.url:
+        transport = None
+        base_url = args.url
+    else:
+        # Run the app in-process against a throwaway database and the fake LLM
+        os.environ.setdefault("LLM_PROVIDER", "fake")
+        os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/loadtest.db")
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from main import app
+
+        if args.db_delay_ms:
+            from sqlalchemy import event
+            from app.database import engine
+
+            @event.listens_for(engine, "before_cursor_execute")
+            def slow_statement(conn, cursor, statement, parameters, context, executemany):
+                # Reads only: writes take SQLite's single write lock, so slowing
+                # them down would measure that lock rather than the executor
+                if statement.lstrip().upper().startswith("SELECT"):
+                    time.sleep(args.db_delay_ms / 1000.0)
+
+        # The in-process transport doesn't run lifespan events, so run them
+        # here: prepares the database, flushes queued writes at the end
+        lifespan = app.router.lifespan_context(app)
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://loadtest"
+
+    async with lifespan, httpx.AsyncClient(transport=transport, base_url=base_url, timeout=args.timeout) as client:
+        mission_id = None
+        if args.mission:
+            plan = await client.post("/api/plans", json={"title": "loadtest", "items": [{"content": "二次方程式の解の公式"}]})
+            mission_id = plan.json()["items"][0]["id"]
+
+        path = "/api/chat/stream" if args.stream else "/api/chat"
+        semaphore = asyncio.Semaphore(args.concurrency)
+        results = []
+
+        async def one(i):
+            async with semaphore:
+                payload = {
+                    "message": f"質問 {i}: 解の公式の使い方を教えてください",
+                    "session_id": f"loadtest-{i % args.sessions}",
+                    "current_mission_id": mission_id,
+                }
+                await run_client(client, path, payload, args.stream, results)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - started
+
+    ok = [latency for status, latency, _ in results if status == 200]
+    errors = {}
+    for status, _, _ in results:
+        if status != 200:
+            errors[status] = errors.get(status, 0) + 1
+
+    print(f"requests:    {len(results)} ({len(ok)} ok, errors: {errors or 'none'})")
+    print(f"concurrency: {args.concurrency}")
+    if args.db_delay_ms and not args.url:
+        print(f"db:          {args.db_delay_ms:.0f}ms per SELECT, {os.getenv('DB_EXECUTOR_THREADS', '4')} executor threads")
+    print(f"elapsed:     {elapsed:.2f}s")
+    print(f"throughput:  {len(ok) / elapsed:.1f} req/s")
+    if ok:
+        print(f"latency:     p50={percentile(ok, 50) * 1000:.0f}ms p95={percentile(ok, 95) * 1000:.0f}ms "
+              f"p99={percentile(ok, 99) * 1000:.0f}ms mean={statistics.mean(ok) * 1000:.0f}ms")
+    ttfb = [fb for status, _, fb in results if status == 200 and fb is not None]
+    if ttfb:
+        print(f"first byte:  p50={percentile(ttfb, 50) * 1000:.0f}ms p95={percentile(ttfb, 95) * 1000:.0f}ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running server (default: run in-process)")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--sessions", type=int, default=20, help="Number of distinct chat sessions")
+    parser.add_argument("--stream", action="store_true", help="Use /api/chat/stream")
+    parser.add_argument("--mission", action="store_true", help="Send mission turns (scored replies)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--db-delay-ms", type=float, default=0, help="Sleep before every SELECT (in-process only)")
+    asyncio.run(main(parser.parse_args()))
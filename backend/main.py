@@ -1,14 +1,28 @@
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from app.database import engine
-from app import models
-from app.routers import chat, upload, plans, memos, settings, admin
+from app.migrations import prepare_database
+from app.jobs import write_queue
+from app.shared import bus
+from app.routers import chat, upload, plans, memos, settings, admin, search
 
-# Create Database Tables
-models.Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create tables and apply pending schema changes. AUTO_MIGRATE=0 skips
+    # this when it ran as a deploy step (python -m app.migrations, serve.py).
+    if os.getenv("AUTO_MIGRATE", "1") == "1":
+        prepare_database(engine)
+    os.makedirs(upload.UPLOAD_DIR, exist_ok=True)
+    await bus.start()
+    yield
+    # Commit chat writes still waiting in the queue before exiting
+    await write_queue.drain()
+    await bus.stop()
 
-app = FastAPI(title="AI Tutor Backend")
+app = FastAPI(title="AI Tutor Backend", lifespan=lifespan)
 
 # CORS Configuration
 origins = [
@@ -23,6 +37,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Paginated endpoints return the next page's cursor in a header
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include Routers
@@ -32,9 +48,11 @@ app.include_router(plans.router, prefix="/api/plans", tags=["plans"])
 app.include_router(memos.router, prefix="/api/memos", tags=["memos"])
 app.include_router(settings.router, prefix="/api/settings", tags=["settings"])
 app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
+app.include_router(search.router, prefix="/api/search", tags=["search"])
 
 # Serve static files for uploaded images
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# (the directory is created at startup, see lifespan)
+app.mount("/uploads", StaticFiles(directory=upload.UPLOAD_DIR, check_dir=False), name="uploads")
 
 @app.get("/health")
 def health_check():
@@ -45,5 +63,6 @@ def root():
     return {"message": "AI Tutor Backend is running. Access /docs for API documentation."}
 
 if __name__ == "__main__":
+    # Development server; use serve.py for production
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
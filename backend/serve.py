@@ -0,0 +1,39 @@
+"""Production entry point: several uvicorn worker processes on one port.
+
+    python serve.py                      # one worker per CPU core
+    WEB_CONCURRENCY=4 PORT=8000 python serve.py
+
+The database is prepared (tables, migrations) once here, before the
+workers start, so they don't race through the migrations. WEB_CONCURRENCY
+is passed on to the workers: they split the LLM rate limits between them
+and share upload signals and settings changes through the database (see
+app/shared.py). main.py's own `__main__` block stays the reload-enabled
+development server.
+"""
+import os
+import sys
+import uvicorn
+
+def main():
+    workers = int(os.getenv("WEB_CONCURRENCY") or os.cpu_count() or 1)
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from app.database import engine
+    from app.migrations import prepare_database
+    prepare_database(engine)
+    engine.dispose()
+    os.environ["AUTO_MIGRATE"] = "0"
+
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=workers,
+        proxy_headers=True,
+        # Lets in-flight requests and the write queue finish on shutdown
+        timeout_graceful_shutdown=int(os.getenv("GRACEFUL_SHUTDOWN_SECONDS", "30")),
+    )
+
+if __name__ == "__main__":
+    main()
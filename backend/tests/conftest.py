@@ -0,0 +1,71 @@
+"""Shared fixtures: the app on a throwaway SQLite file and the fake LLM.
+
+The engine and the module-level singletons read the environment when the
+app is imported, so it is set here before anything from `app` is loaded.
+"""
+import os
+import tempfile
+
+TEST_DIR = tempfile.mkdtemp()
+# Uploads are written under the working directory
+os.chdir(TEST_DIR)
+
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{TEST_DIR}/test.db",
+    LLM_PROVIDER="fake",
+    FAKE_LLM_LATENCY_MS="0",
+    FAKE_LLM_TOKENS_PER_SEC="0",
+    AUTO_MIGRATE="1",
+)
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from main import app
+from app.database import engine
+
+@pytest.fixture(scope="session")
+def client():
+    # Entering the client runs the lifespan: prepare_database, the shared bus, ...
+    with TestClient(app) as test_client:
+        # Creates the demo user and its settings, and warms their caches
+        test_client.get("/api/settings")
+        yield test_client
+
+class SQLRecorder:
+    """Statements and commits issued on the engine while recording."""
+
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+
+    def clear(self):
+        self.statements.clear()
+        self.commits = 0
+
+    def matching(self, *fragments):
+        return [(sql, params) for sql, params in self.statements if all(f in sql for f in fragments)]
+
+@pytest.fixture
+def sql(client):
+    recorder = SQLRecorder()
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        recorder.statements.append((statement, parameters))
+
+    def on_commit(conn):
+        recorder.commits += 1
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    event.listen(engine, "commit", on_commit)
+    try:
+        yield recorder
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
+        event.remove(engine, "commit", on_commit)
+
+def explain(statement: str, parameters) -> list:
+    """SQLite's EXPLAIN QUERY PLAN details for a captured statement."""
+    with engine.connect() as conn:
+        return [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()]
@@ -0,0 +1,77 @@
+"""The TTL caches, and the user and settings lookups served from them."""
+import dataclasses
+
+import pytest
+
+from app import cache
+from app.cache import TTLCache, settings_cache, user_cache
+from app.deps import CurrentUser
+
+# The demo user every request runs as
+USER_ID = 1
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A monotonic clock the test moves by hand."""
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+def test_entries_expire_after_the_ttl(clock):
+    entries = TTLCache(ttl=10)
+    entries.set("a", 1)
+    assert entries.get("a") == 1
+    clock[0] += 9.9
+    assert entries.get("a") == 1
+    clock[0] += 0.2
+    assert entries.get("a") is None
+    assert entries.stats() == {"size": 0, "hits": 2, "misses": 1}
+
+def test_least_recently_used_entry_is_dropped(clock):
+    entries = TTLCache(maxsize=2)
+    entries.set("a", 1)
+    entries.set("b", 2)
+    entries.get("a")
+    entries.set("c", 3)
+    assert (entries.get("a"), entries.get("b"), entries.get("c")) == (1, None, 3)
+
+def user_selects(sql) -> list:
+    return sql.matching("FROM users")
+
+def test_current_user_is_cached(client, sql):
+    sql.clear()
+    client.get("/api/plans")
+    assert user_selects(sql) == []
+
+    user_cache.clear()
+    client.get("/api/plans")
+    client.get("/api/plans")
+    assert len(user_selects(sql)) == 1
+
+    cached = user_cache.get("demo_user")
+    assert isinstance(cached, CurrentUser) and cached.id == USER_ID
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        cached.id = 2
+
+def settings_selects(sql) -> list:
+    return sql.matching("FROM user_settings")
+
+def test_settings_are_cached_and_refreshed_on_put(client, sql):
+    before = client.get("/api/settings").json()["learning_mode"]
+    sql.clear()
+    client.get("/api/settings")
+    assert settings_selects(sql) == []
+
+    settings_cache.invalidate(USER_ID)
+    client.get("/api/settings")
+    assert len(settings_selects(sql)) == 1
+
+    try:
+        assert client.put("/api/settings", json={"learning_mode": "exam"}).status_code == 200
+        # The PUT wrote through: the next read is the new mode, without a query
+        sql.clear()
+        assert client.get("/api/settings").json()["learning_mode"] == "exam"
+        assert settings_cache.get(USER_ID).learning_mode == "exam"
+        assert settings_selects(sql) == []
+    finally:
+        client.put("/api/settings", json={"learning_mode": before})
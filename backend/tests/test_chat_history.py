@@ -0,0 +1,39 @@
+"""GET /api/chat/history: ETag revalidation and header-safe tags."""
+import pytest
+from app.jobs import write_queue
+
+def test_unchanged_history_is_revalidated_with_304(client):
+    client.post("/api/chat", json={"message": "etag test", "session_id": "etag"})
+    client.portal.call(write_queue.drain)
+
+    first = client.get("/api/chat/history/etag")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert len(first.json()) == 2
+
+    again = client.get("/api/chat/history/etag", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+
+    # A different page of the same session has its own tag
+    page = client.get("/api/chat/history/etag?limit=1", headers={"If-None-Match": etag})
+    assert page.status_code == 200
+    assert page.headers["ETag"] != etag
+
+    # A new message changes the tag
+    client.post("/api/chat", json={"message": "more", "session_id": "etag"})
+    client.portal.call(write_queue.drain)
+    changed = client.get("/api/chat/history/etag", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert len(changed.json()) == 4
+
+@pytest.mark.parametrize("session_id", ["テスト", 'quo"te', "emoji😀"])
+def test_any_session_id_gets_a_valid_etag(client, session_id):
+    response = client.get(f"/api/chat/history/{session_id}")
+    assert response.status_code == 200
+    assert response.json() == []
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"') and etag.endswith('"') and etag.count('"') == 2
+
+    revalidated = client.get(f"/api/chat/history/{session_id}", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
@@ -0,0 +1,67 @@
+"""Per-request query budget for POST /api/chat, so the count can't regress."""
+import pytest
+from app.llm import FakeProvider
+from app.jobs import write_queue
+
+@pytest.fixture
+def llm_calls(monkeypatch, sql):
+    """Records (statements, commits) seen when each LLM call starts."""
+    seen = []
+    generate = FakeProvider.generate
+
+    async def recording_generate(self, contents, system=None):
+        seen.append((len(sql.statements), sql.commits))
+        return await generate(self, contents, system)
+
+    monkeypatch.setattr(FakeProvider, "generate", recording_generate)
+    return seen
+
+def chat(client, message, session_id, mission_id=None):
+    response = client.post("/api/chat", json={
+        "message": message, "session_id": session_id, "current_mission_id": mission_id
+    })
+    assert response.status_code == 200
+    # Wait for the reply's write job to commit
+    client.portal.call(write_queue.drain)
+    return response
+
+def measure_turn(client, sql, llm_calls, session_id, mission_id=None):
+    # The first turn warms the user and settings caches
+    chat(client, "はじめまして", session_id, mission_id)
+    sql.clear()
+    llm_calls.clear()
+    batches = write_queue.stats()["batches"]
+
+    chat(client, "二次方程式の解の公式を教えて", session_id, mission_id)
+
+    assert len(llm_calls) == 1
+    before_llm, commits_before_llm = llm_calls[0]
+    return {
+        "before_llm": before_llm,
+        "commits_before_llm": commits_before_llm,
+        "after_llm": len(sql.statements) - before_llm,
+        "commits_after_llm": sql.commits - commits_before_llm,
+        "write_batches": write_queue.stats()["batches"] - batches,
+    }
+
+def test_free_talk_turn_query_count(client, sql, llm_calls):
+    counts = measure_turn(client, sql, llm_calls, "queries-free")
+    # Insert the user message, read the summary and the context window; one commit
+    assert counts["before_llm"] == 3
+    assert counts["commits_before_llm"] == 1
+    # The assistant message, in one write-queue transaction
+    assert counts["after_llm"] == 1
+    assert counts["commits_after_llm"] == 1
+    assert counts["write_batches"] == 1
+
+def test_mission_turn_query_count(client, sql, llm_calls):
+    plan = client.post("/api/plans", json={"title": "queries", "items": [{"content": "解の公式"}]}).json()
+    counts = measure_turn(client, sql, llm_calls, "queries-mission", plan["items"][0]["id"])
+    # As free talk, plus loading the mission
+    assert counts["before_llm"] == 4
+    assert counts["commits_before_llm"] == 1
+    # Assistant message, mission score and result, plan_stats refresh and
+    # score series (aggregate, upsert, read and write series)
+    assert counts["after_llm"] == 6
+    assert counts["commits_after_llm"] == 1
+    assert counts["write_batches"] == 1
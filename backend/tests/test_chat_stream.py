@@ -0,0 +1,104 @@
+"""POST /api/chat/stream: the SSE events, marker stripping, and persistence after a disconnect."""
+import json
+import asyncio
+
+import pytest
+
+from main import app
+from app.llm import FakeProvider
+from app.jobs import write_queue
+
+@pytest.fixture
+def reply_chunks(monkeypatch):
+    """Makes the fake LLM stream the chunks appended to the returned list.
+
+    A `None` chunk parks the stream until it is cancelled.
+    """
+    chunks = []
+
+    async def scripted_stream(self, contents, system=None):
+        for chunk in chunks:
+            if chunk is None:
+                await asyncio.Event().wait()
+            yield chunk
+
+    monkeypatch.setattr(FakeProvider, "stream", scripted_stream)
+    return chunks
+
+def events(body: str) -> list:
+    return [json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")]
+
+def new_mission(client) -> dict:
+    plan = client.post("/api/plans", json={"title": "stream", "items": [{"content": "連立方程式"}]}).json()
+    return plan["items"][0]
+
+def stored_messages(client, session_id: str) -> list:
+    client.portal.call(write_queue.drain)
+    return client.get(f"/api/chat/history/{session_id}").json()
+
+def test_stream_strips_markers_split_across_chunks(client, reply_chunks):
+    mission = new_mission(client)
+    reply_chunks += ["よくでき", "ました[", "[RESULT: 2問", "正解]]", "\n[[SC", "ORE: 8", "0]]"]
+
+    response = client.post("/api/chat/stream", json={
+        "message": "解けました", "session_id": "stream-markers", "current_mission_id": mission["id"]
+    })
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    received = events(response.text)
+    deltas = [e["text"] for e in received if e["type"] == "delta"]
+    assert "".join(deltas).strip() == "よくできました"
+    assert not any("[" in delta for delta in deltas)
+    assert received[-1] == {"type": "done", "understanding_score": 80, "extracted_result": "2問正解"}
+
+    assistant = stored_messages(client, "stream-markers")[-1]
+    assert (assistant["role"], assistant["content"], assistant["understanding_score"]) == ("assistant", "よくできました", 80)
+    item = next(i for i in client.get(f"/api/plans/{mission['plan_id']}").json()["items"] if i["id"] == mission["id"])
+    assert (item["understanding_score"], item["last_result"]) == (80, "2問正解")
+
+def test_partial_reply_is_saved_when_the_client_disconnects(client, reply_chunks):
+    mission = new_mission(client)
+    # The score arrives, then the stream stalls until the client goes away
+    reply_chunks += ["途中まで", "の説明 [[SCORE: 40]]", "です[", None, "続き"]
+    request = json.dumps({
+        "message": "続きは？", "session_id": "stream-disconnect", "current_mission_id": mission["id"]
+    }).encode()
+
+    async def scenario():
+        body_sent = False
+        disconnected = asyncio.Event()
+        sent = []
+
+        async def receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": request, "more_body": False}
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if len(sent) == 4:
+                # The response start and three deltas are out and the stream
+                # is parked: the client closes the connection
+                disconnected.set()
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0", "spec_version": "2.3"}, "http_version": "1.1",
+            "method": "POST", "scheme": "http", "path": "/api/chat/stream", "raw_path": b"/api/chat/stream",
+            "query_string": b"", "root_path": "", "headers": [(b"content-type", b"application/json")],
+            "client": ("test", 1), "server": ("test", 80),
+        }
+        await asyncio.wait_for(app(scope, receive, send), 5)
+        return b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body").decode()
+
+    received = events(client.portal.call(scenario))
+    assert [e["text"] for e in received] == ["途中まで", "の説明 ", "です"]
+
+    assistant = stored_messages(client, "stream-disconnect")[-1]
+    # What was shown plus the held-back "[", and the score seen before the stall
+    assert (assistant["role"], assistant["content"], assistant["understanding_score"]) == ("assistant", "途中までの説明 です[", 40)
+    item = next(i for i in client.get(f"/api/plans/{mission['plan_id']}").json()["items"] if i["id"] == mission["id"])
+    assert item["understanding_score"] == 40
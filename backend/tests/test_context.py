@@ -0,0 +1,125 @@
+"""Token-budgeted chat context and the rolling session summary."""
+from datetime import datetime, timedelta
+
+from app import models
+from app.context import CONTEXT_SCAN_LIMIT, build_context, summarize_session
+from app.database import SessionLocal
+from app.jobs import write_queue
+from app.response_cache import response_cache
+
+# The demo user every request runs as
+USER_ID = 1
+
+def add_messages(session_id: str, count: int) -> list:
+    """Stores `count` alternating user/assistant messages of 20 characters (11 tokens) each."""
+    db = SessionLocal()
+    try:
+        start = datetime(2026, 1, 1)
+        rows = [
+            models.ChatMessage(
+                user_id=USER_ID, session_id=session_id, role="assistant" if i % 2 else "user",
+                content=f"m{i:03d}" + "あ" * 16, created_at=start + timedelta(seconds=i)
+            )
+            for i in range(count)
+        ]
+        db.add_all(rows)
+        db.commit()
+        return [(row.id, row.role, row.content) for row in rows]
+    finally:
+        db.close()
+
+def context_for(session_id: str, budget: int, current=None):
+    db = SessionLocal()
+    try:
+        return build_context(db, USER_ID, session_id, budget=budget, current=current)
+    finally:
+        db.close()
+
+def current_message(content: str) -> models.ChatMessage:
+    return models.ChatMessage(user_id=USER_ID, session_id="unused", role="user", content=content)
+
+def stored_summary(session_id: str):
+    db = SessionLocal()
+    try:
+        return db.query(models.SessionSummary.summary, models.SessionSummary.covered_until_id).filter(
+            models.SessionSummary.session_id == session_id
+        ).first()
+    finally:
+        db.close()
+
+class RecordingLLM:
+    """Answers summary prompts with a numbered summary and keeps the prompts."""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def generate(self, contents, system=None):
+        self.prompts.append(contents[0])
+        return f"要約{len(self.prompts)}"
+
+def test_newest_messages_that_fit_the_budget(client):
+    stored = add_messages("ctx-trim", 10)
+    context = context_for("ctx-trim", 50, current=current_message("今" * 20))
+
+    # The current message and the three newest stored ones: 4 x 11 tokens
+    assert context.messages == [(role, content) for _, role, content in stored[7:]] + [("user", "今" * 20)]
+    assert context.stored_messages == 10
+    assert context.summary is None
+    assert context.needs_summary
+
+def test_oversized_current_message_is_cut_to_the_budget(client):
+    add_messages("ctx-oversized", 4)
+    context = context_for("ctx-oversized", 50, current=current_message("今" * 200))
+    assert context.messages == [("user", "今" * 100)]
+    assert context.stored_messages == 4
+
+def test_summary_rollover_folds_the_oldest_messages(client):
+    stored = add_messages("ctx-rollover", 250)
+    llm = RecordingLLM()
+
+    client.portal.call(summarize_session, llm, USER_ID, "ctx-rollover")
+
+    # Over 75% of the 3000 budget; the oldest are folded until 50% is left
+    assert len(llm.prompts) == 1
+    folded = [message for message in stored if message[2] in llm.prompts[0]]
+    assert 0 < len(folded) < 250 - 2
+    assert folded == stored[:len(folded)]
+    assert stored_summary("ctx-rollover") == ("要約1", folded[-1][0])
+
+    # The next turn sends the summary and only the messages after it
+    context = context_for("ctx-rollover", 3000)
+    assert context.summary == "要約1"
+    assert context.stored_messages == 250 - len(folded)
+    assert not context.needs_summary
+
+    # Under the trigger now: nothing more to fold
+    client.portal.call(summarize_session, llm, USER_ID, "ctx-rollover")
+    assert len(llm.prompts) == 1
+
+def test_backlog_is_folded_a_page_at_a_time_without_gaps(client):
+    stored = add_messages("ctx-backlog", 450)
+    llm = RecordingLLM()
+
+    client.portal.call(summarize_session, llm, USER_ID, "ctx-backlog")
+    # The whole oldest page goes into the first summary
+    assert stored[0][2] in llm.prompts[0]
+    assert stored_summary("ctx-backlog") == ("要約1", stored[CONTEXT_SCAN_LIMIT - 1][0])
+
+    client.portal.call(summarize_session, llm, USER_ID, "ctx-backlog")
+    # The second pass continues right after the first, with the previous summary
+    assert "要約1" in llm.prompts[1]
+    assert stored[CONTEXT_SCAN_LIMIT][2] in llm.prompts[1]
+    assert stored[CONTEXT_SCAN_LIMIT - 1][2] not in llm.prompts[1]
+
+def test_long_message_mid_conversation_is_not_an_opening(client, monkeypatch):
+    monkeypatch.setattr(response_cache, "enabled", True)
+
+    misses = response_cache.stats()["misses"]
+    client.post("/api/chat", json={"message": "はじめまして", "session_id": "ctx-opening"})
+    assert response_cache.stats()["misses"] == misses + 1
+    client.portal.call(write_queue.drain)
+
+    # Fills the whole budget alone, so it is the only message in the window,
+    # but the session already has history: no response cache lookup
+    client.post("/api/chat", json={"message": "長" * 7000, "session_id": "ctx-opening"})
+    assert response_cache.stats()["misses"] == misses + 1
@@ -0,0 +1,59 @@
+"""With a slow database, concurrent chat turns are bounded by the DB executor, not served one by one."""
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+from sqlalchemy import event
+
+from main import app
+from app import database
+from app.database import engine
+from app.jobs import write_queue
+
+DELAY = 0.05
+REQUESTS = 8
+
+@pytest.fixture
+def slow_db(client):
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        time.sleep(DELAY)
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        yield
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
+
+def run_turns(client, monkeypatch, threads: int, tag: str) -> float:
+    """Wall time of REQUESTS concurrent /api/chat turns on a DB executor with this many threads."""
+    executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="db")
+    monkeypatch.setattr(database, "db_executor", executor)
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as ac:
+            started = time.perf_counter()
+            responses = await asyncio.gather(*(
+                ac.post("/api/chat", json={"message": f"質問 {tag}-{i}", "session_id": f"executor-{tag}-{i}"})
+                for i in range(REQUESTS)
+            ))
+            elapsed = time.perf_counter() - started
+        await write_queue.drain()
+        return responses, elapsed
+
+    try:
+        responses, elapsed = client.portal.call(scenario)
+    finally:
+        executor.shutdown()
+    assert [r.status_code for r in responses] == [200] * REQUESTS
+    return elapsed
+
+def test_wall_time_scales_with_executor_threads(client, monkeypatch, slow_db):
+    one_thread = run_turns(client, monkeypatch, 1, "serial")
+    all_threads = run_turns(client, monkeypatch, REQUESTS, "parallel")
+
+    # Each turn runs at least three statements before the reply: on one thread
+    # the turns queue up, with a thread each they overlap
+    assert one_thread >= REQUESTS * 3 * DELAY
+    assert all_threads < one_thread / 3
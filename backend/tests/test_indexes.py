@@ -0,0 +1,51 @@
+"""The hot list queries are served by their composite indexes, without a sort step."""
+import pytest
+from app.context import build_context
+from app.database import SessionLocal, engine
+from app.migrations import prepare_database
+from conftest import explain
+
+@pytest.fixture(scope="module", autouse=True)
+def seeded(client):
+    prepare_database(engine)
+    client.post("/api/memos", json={"content": "index test memo"})
+    client.post("/api/plans", json={"title": "index test", "items": [{"content": "a"}]})
+    client.post("/api/chat", json={"message": "index test", "session_id": "idx"})
+
+def plan_for(sql, *fragments):
+    statements = sql.matching(*fragments)
+    assert statements, f"no statement matching {fragments}"
+    return explain(*statements[-1])
+
+def assert_uses(plan, index):
+    assert any(f"INDEX {index}" in step for step in plan), plan
+    assert not any("USE TEMP B-TREE" in step for step in plan), plan
+
+def test_chat_history_uses_session_index(client, sql):
+    client.get("/api/chat/history/idx")
+    assert_uses(plan_for(sql, "FROM chat_messages", "ORDER BY chat_messages.created_at ASC"),
+                "ix_chat_messages_user_session_created")
+    client.get("/api/chat/history/idx?limit=20")
+    assert_uses(plan_for(sql, "FROM chat_messages", "ORDER BY chat_messages.created_at DESC"),
+                "ix_chat_messages_user_session_created")
+
+def test_chat_context_uses_session_index(sql):
+    db = SessionLocal()
+    try:
+        build_context(db, 1, "idx")
+    finally:
+        db.close()
+    assert_uses(plan_for(sql, "FROM chat_messages", "ORDER BY chat_messages.created_at DESC"),
+                "ix_chat_messages_user_session_created")
+
+def test_admin_logs_use_created_at_index(client, sql):
+    client.get("/api/admin/logs")
+    assert_uses(plan_for(sql, "FROM chat_messages JOIN users"), "ix_chat_messages_created_at")
+
+def test_memo_list_uses_user_created_index(client, sql):
+    client.get("/api/memos")
+    assert_uses(plan_for(sql, "FROM memos", "ORDER BY memos.created_at DESC"), "ix_memos_user_created")
+
+def test_plan_list_uses_user_created_index(client, sql):
+    client.get("/api/plans")
+    assert_uses(plan_for(sql, "FROM plans", "ORDER BY plans.created_at DESC"), "ix_plans_user_created")
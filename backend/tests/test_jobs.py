@@ -0,0 +1,92 @@
+"""WriteQueue: batching, the per-job fallback, and draining on shutdown."""
+import asyncio
+
+import main
+from app import models
+from app.database import SessionLocal
+from app.jobs import WriteQueue
+from app.shared import LocalBus
+
+def add_memo(db, content):
+    db.add(models.Memo(user_id=1, content=content))
+
+def fail_after_memo(db, content):
+    add_memo(db, content)
+    raise ValueError("bad job")
+
+def stored_memos(*contents) -> set:
+    db = SessionLocal()
+    try:
+        return {m.content for m in db.query(models.Memo).filter(models.Memo.content.in_(contents))}
+    finally:
+        db.close()
+
+def test_waiting_jobs_share_one_transaction(client, sql):
+    queue = WriteQueue(batch_window=0.05)
+    sessions = []
+
+    def job(db, content):
+        sessions.append(db)
+        add_memo(db, content)
+
+    async def scenario():
+        done = [await queue.submit(job, f"batched {i}") for i in range(5)]
+        await asyncio.gather(*done)
+        await queue.drain()
+
+    sql.clear()
+    client.portal.call(scenario)
+    assert len(set(map(id, sessions))) == 1
+    assert sql.commits == 1
+    assert queue.stats() == {"queued": 0, "batches": 1, "jobs_done": 5, "jobs_failed": 0}
+    assert stored_memos(*(f"batched {i}" for i in range(5))) == {f"batched {i}" for i in range(5)}
+
+def test_failing_job_is_isolated_from_its_batch(client):
+    queue = WriteQueue(batch_window=0.05)
+
+    async def scenario():
+        done = [
+            await queue.submit(add_memo, "fallback ok 1"),
+            await queue.submit(fail_after_memo, "fallback bad"),
+            await queue.submit(add_memo, "fallback ok 2"),
+        ]
+        results = await asyncio.gather(*done, return_exceptions=True)
+        await queue.drain()
+        return results
+
+    first, failed, last = client.portal.call(scenario)
+    assert first is None and last is None
+    assert isinstance(failed, ValueError)
+    # The batch rolled back, then each job ran in a transaction of its own
+    assert stored_memos("fallback ok 1", "fallback bad", "fallback ok 2") == {"fallback ok 1", "fallback ok 2"}
+    assert queue.stats()["jobs_done"] == 2
+    assert queue.stats()["jobs_failed"] == 1
+
+def test_lifespan_shutdown_drains_queued_writes(client, monkeypatch):
+    # A window far longer than the test: only the drain can flush these
+    queue = WriteQueue(batch_window=30)
+    monkeypatch.setattr(main, "write_queue", queue)
+    monkeypatch.setattr(main, "bus", LocalBus())
+
+    async def scenario():
+        async with main.lifespan(main.app):
+            for i in range(3):
+                await queue.submit(add_memo, f"drained {i}")
+            await asyncio.sleep(0.05)
+            assert stored_memos("drained 0") == set()
+
+    client.portal.call(scenario)
+    assert stored_memos("drained 0", "drained 1", "drained 2") == {"drained 0", "drained 1", "drained 2"}
+    assert queue.stats()["queued"] == 0
+
+def test_detached_submits_are_drained(client):
+    queue = WriteQueue(batch_window=30)
+    contents = [f"detached {i}" for i in range(3)]
+
+    async def scenario():
+        for content in contents:
+            queue.submit_detached(add_memo, content)
+        await queue.drain()
+
+    client.portal.call(scenario)
+    assert stored_memos(*contents) == set(contents)
@@ -0,0 +1,93 @@
+"""MarkerParser (streamed) must agree with parse_markers (one-shot)."""
+import random
+import pytest
+from app.markers import MarkerParser, parse_markers
+
+# Fragments that make marker-like text likely, including broken and nested ones
+ALPHABET = [
+    "a", "b", "[", "]", "[[", "]]", "[[SCORE: ", "[[RESULT: ", "12", "150", "x]]", "\n", " ",
+    "[[SCORE: 7]]", "[[RESULT: 3問]]",
+]
+
+def stream(text, chunk_sizes):
+    parser = MarkerParser()
+    out, i = [], 0
+    for size in chunk_sizes:
+        out.append(parser.feed(text[i:i + size]))
+        i += size
+    out.append(parser.feed(text[i:]))
+    out.append(parser.flush())
+    return "".join(out).strip(), parser
+
+def random_chunks(rnd, text):
+    sizes, total = [], 0
+    while total < len(text):
+        sizes.append(rnd.randint(1, 5))
+        total += sizes[-1]
+    return sizes
+
+def test_streamed_matches_one_shot_on_random_chunking():
+    rnd = random.Random(0)
+    mismatches = []
+    for _ in range(20000):
+        text = "".join(rnd.choice(ALPHABET) for _ in range(rnd.randint(0, 30)))
+        expected = parse_markers(text)
+        got, parser = stream(text, random_chunks(rnd, text))
+        if (got, parser.scores, parser.results) != (expected.text, expected.scores, expected.results):
+            mismatches.append(text)
+    assert mismatches == []
+
+@pytest.mark.parametrize("chunks", [
+    ["よくできました[[SC", "ORE: 8", "0]]"],
+    ["よくできました[", "[SCORE: 80]", "]"],
+    ["よくできました[[SCORE: 80]", "]"],
+    list("よくできました[[SCORE: 80]]"),
+])
+def test_marker_split_across_chunks(chunks):
+    parser = MarkerParser()
+    shown = [parser.feed(chunk) for chunk in chunks] + [parser.flush()]
+    assert "".join(shown) == "よくできました"
+    assert not any("[" in piece for piece in shown)
+    assert parser.score == 80
+
+def test_lone_trailing_bracket_is_held_then_released():
+    parser = MarkerParser()
+    assert parser.feed("配列 a[") == "配列 a"
+    assert parser.feed("0] です") == "[0] です"
+    assert parser.feed("最後は [") == "最後は "
+    assert parser.flush() == "["
+
+def test_extra_opening_bracket():
+    reply = parse_markers("答え [[[SCORE: 5]]")
+    assert reply.text == "答え ["
+    assert reply.score == 5
+    got, parser = stream("答え [[[SCORE: 5]]", [4, 2, 3, 20])
+    assert (got, parser.score) == ("答え [", 5)
+
+def test_scores_are_clamped():
+    assert parse_markers("[[SCORE: 150]]").score == 100
+    assert parse_markers("[[SCORE: 100]]").score == 100
+    assert parse_markers("[[SCORE: 0]]").score == 0
+    _, parser = stream("[[SCORE: 999]]", [3, 3])
+    assert parser.score == 100
+
+def test_last_score_wins_and_results_are_joined():
+    text = "いいね[[RESULT: 10問中8問]]\n続けよう [[RESULT: 単語3つ]]\n[[SCORE: 60]][[SCORE: 70]]"
+    reply = parse_markers(text)
+    assert reply.text == "いいね\n続けよう"
+    assert reply.results == ["10問中8問", "単語3つ"]
+    assert reply.result == "10問中8問 / 単語3つ"
+    assert reply.score == 70
+    got, parser = stream(text, [5] * 20)
+    assert (got, parser.result, parser.score) == (reply.text, reply.result, reply.score)
+
+def test_unclosed_marker_is_given_up_after_max_length():
+    parser = MarkerParser()
+    assert parser.feed("前置き[[RESULT: ") == "前置き"
+    filler = "あ" * (MarkerParser.MAX_MARKER_LEN + 10)
+    # Past MAX_MARKER_LEN without "]]" the held text is released, not buffered forever
+    shown = parser.feed(filler)
+    assert shown.startswith("[[RESULT: ")
+    assert len(shown) > MarkerParser.MAX_MARKER_LEN
+    assert "前置き" + shown + parser.flush() == "前置き[[RESULT: " + filler
+    assert parser.results == []
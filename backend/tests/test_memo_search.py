@@ -0,0 +1,101 @@
+"""Memo search: index sync, short terms, paging and scoping to the owner."""
+from app import models
+from app.database import SessionLocal
+
+# The demo user every request runs as
+USER_ID = 1
+
+def add_rows(*rows):
+    db = SessionLocal()
+    try:
+        db.add_all(rows)
+        db.commit()
+        return [row.id for row in rows]
+    finally:
+        db.close()
+
+def add_memos(*contents) -> list:
+    return add_rows(*(models.Memo(user_id=USER_ID, content=content) for content in contents))
+
+def other_user_id() -> int:
+    db = SessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.username == "other_student").first()
+        if not user:
+            user = models.User(username="other_student", email="other@example.com")
+            db.add(user)
+            db.commit()
+        return user.id
+    finally:
+        db.close()
+
+def update_row(model, row_id: int, **values):
+    db = SessionLocal()
+    try:
+        db.query(model).filter(model.id == row_id).update(values)
+        db.commit()
+    finally:
+        db.close()
+
+def delete_row(model, row_id: int):
+    db = SessionLocal()
+    try:
+        db.query(model).filter(model.id == row_id).delete()
+        db.commit()
+    finally:
+        db.close()
+
+def memo_ids(client, q: str, **params) -> list:
+    response = client.get("/api/memos/search", params={"q": q, **params})
+    assert response.status_code == 200
+    return [result["id"] for result in response.json()]
+
+def all_pages(client, path: str, params: dict) -> list:
+    ids, cursor = [], None
+    while True:
+        response = client.get(path, params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        ids += [result["id"] for result in response.json()]
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            return ids
+
+def test_memo_index_follows_update_and_delete(client):
+    memo_id, = add_memos("光合成の仕組みをまとめる")
+    assert memo_ids(client, "光合成") == [memo_id]
+
+    update_row(models.Memo, memo_id, content="呼吸の仕組みをまとめる")
+    assert memo_ids(client, "光合成") == []
+    assert memo_ids(client, "呼吸の仕") == [memo_id]
+
+    delete_row(models.Memo, memo_id)
+    assert memo_ids(client, "呼吸の仕") == []
+
+def test_short_terms_fall_back_to_like(client):
+    math, _, other = add_memos("数学の宿題", "宿題は英語だけ", "数学Ⅰの教科書")
+
+    # Under three characters the trigram index can't match; LIKE does
+    assert sorted(memo_ids(client, "数学")) == sorted([math, other])
+    assert memo_ids(client, "数学 宿題") == [math]
+    result, = client.get("/api/memos/search", params={"q": "宿題 英語"}).json()
+    assert result["snippet"] == "<mark>宿題</mark>は英語だけ"
+
+    # Mixed with a long term, the short one still narrows the FTS matches
+    assert memo_ids(client, "教科書 数学") == [other]
+    assert memo_ids(client, "教科書 英語") == []
+
+def test_memo_pages_continue_without_gaps_or_repeats(client):
+    ids = add_memos(*("化学反応式" + "。" * (i % 7) for i in range(23)))
+
+    for sort in ("relevance", "recent"):
+        params = {"q": "化学反応", "sort": sort}
+        paged = all_pages(client, "/api/memos/search", {**params, "limit": 5})
+        assert paged == memo_ids(client, **params, limit=100)
+        assert sorted(paged) == sorted(ids)
+
+def test_other_users_memos_are_never_found(client):
+    mine, = add_memos("三角関数の公式")
+    add_rows(models.Memo(user_id=other_user_id(), content="三角関数のメモ"))
+
+    assert memo_ids(client, "三角関数") == [mine]
+    assert memo_ids(client, "三角") == [mine]
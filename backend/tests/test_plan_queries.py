@@ -0,0 +1,115 @@
+"""Statement counts for the plan endpoints, and what the batch endpoint accepts."""
+import pytest
+
+def is_stats_refresh(statement):
+    # refresh_plan_stats: the per-plan aggregate and the plan_stats upsert
+    return "plan_stats" in statement or "GROUP BY plans.id" in statement
+
+def split(sql):
+    plans = [s for s, _ in sql.statements if not is_stats_refresh(s)]
+    stats = [s for s, _ in sql.statements if is_stats_refresh(s)]
+    return plans, stats
+
+def create(client, title, items=20):
+    response = client.post("/api/plans", json={
+        "title": title, "items": [{"content": f"item {i}"} for i in range(items)]
+    })
+    assert response.status_code == 200
+    return response.json()
+
+def test_create_plan_statement_count(client, sql):
+    sql.clear()
+    plan = create(client, "create count")
+    assert len(plan["items"]) == 20
+
+    plans, stats = split(sql)
+    # INSERT plan, one executemany for all items, then plan + items reloaded
+    assert len(plans) == 4
+    assert len(stats) == 2
+    assert sql.commits == 1
+
+def test_list_plans_is_two_queries(client, sql):
+    for i in range(5):
+        create(client, f"list {i}", items=3)
+    sql.clear()
+    response = client.get("/api/plans")
+    assert response.status_code == 200
+    assert len(response.json()) >= 5
+    # The plans page, then every plan's items in one SELECT ... IN
+    assert len(sql.statements) == 2
+
+def test_batch_upsert_statement_count(client, sql):
+    existing = create(client, "batch", items=2)
+    sql.clear()
+    response = client.post("/api/plans/batch", json={"plans": [
+        {
+            "id": existing["id"],
+            "title": "batch renamed",
+            "items": [
+                {"id": existing["items"][0]["id"], "content": "done", "is_completed": True},
+                {"content": "new item"},
+            ],
+        },
+        {"title": "batch new", "items": [{"content": "a"}, {"content": "b"}]},
+    ]})
+    assert response.status_code == 200
+    first, second = response.json()
+    assert first["title"] == "batch renamed" and len(first["items"]) == 3
+    assert any(item["is_completed"] for item in first["items"])
+    assert second["title"] == "batch new" and len(second["items"]) == 2
+
+    plans, stats = split(sql)
+    # Load the existing plans and their items; INSERT the new plan; UPDATE the
+    # renamed plan and the changed item; one executemany for the new items;
+    # reload both plans and their items
+    assert len(plans) == 8
+    # One aggregate and one upsert for both plans
+    assert len(stats) == 2
+    assert sql.commits == 1
+
+def test_batch_upsert_unknown_plan_is_404(client):
+    response = client.post("/api/plans/batch", json={"plans": [{"id": 999999, "title": "missing"}]})
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Plan not found"
+
+def test_batch_upsert_unknown_item_is_404(client):
+    plan = create(client, "unknown item", items=1)
+    response = client.post("/api/plans/batch", json={"plans": [
+        {"id": plan["id"], "title": plan["title"], "items": [{"id": 999999, "content": "missing"}]}
+    ]})
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Plan Item not found"
+    # Nothing from the rejected batch was applied
+    assert len(client.get(f"/api/plans/{plan['id']}").json()["items"]) == 1
+
+def test_new_items_keep_score_and_result(client):
+    fields = {"understanding_score": 65, "last_result": "8問中5問正解"}
+    created = client.post("/api/plans", json={"title": "scored", "items": [{"content": "a", **fields}]}).json()
+    response = client.post("/api/plans/batch", json={"plans": [
+        {"id": created["id"], "items": [{"content": "b", **fields}]},
+        {"title": "scored new", "items": [{"content": "c", **fields}]},
+    ]})
+    assert response.status_code == 200
+    items = [item for plan in response.json() for item in plan["items"]]
+    assert len(items) == 3
+    assert all((item["understanding_score"], item["last_result"]) == (65, "8問中5問正解") for item in items)
+
+def test_batch_update_changes_only_the_fields_sent(client):
+    plan = client.post("/api/plans", json={"title": "partial", "target": "期末", "items": [
+        {"content": "keep", "priority": 1, "understanding_score": 40, "last_result": "半分"}
+    ]}).json()
+    item = plan["items"][0]
+    response = client.post("/api/plans/batch", json={"plans": [
+        {"id": plan["id"], "items": [{"id": item["id"], "is_completed": True}]}
+    ]})
+    assert response.status_code == 200
+    updated = response.json()[0]
+    assert (updated["title"], updated["target"]) == ("partial", "期末")
+    assert updated["items"] == [{**item, "is_completed": True}]
+
+@pytest.mark.parametrize("plans", [
+    [{"items": [{"content": "no title"}]}],
+    [{"title": "new", "items": [{"priority": 1}]}],
+])
+def test_batch_new_rows_need_their_required_fields(client, plans):
+    assert client.post("/api/plans/batch", json={"plans": plans}).status_code == 422
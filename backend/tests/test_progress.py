@@ -0,0 +1,122 @@
+"""plan_stats kept current by the writes that change progress, and matching a full rebuild."""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import models
+from app.database import SessionLocal
+from app.jobs import write_queue
+from app.llm import FakeProvider
+from app.progress import rebuild_plan_stats, refresh_stale
+
+@pytest.fixture
+def reply(monkeypatch):
+    """Makes the fake LLM answer with the text set in reply[0]."""
+    text = ["よくできました"]
+
+    async def scripted_generate(self, contents, system=None):
+        return text[0]
+
+    monkeypatch.setattr(FakeProvider, "generate", scripted_generate)
+    return text
+
+def new_plan(client, *items) -> dict:
+    response = client.post("/api/plans", json={"title": "progress", "items": list(items)})
+    assert response.status_code == 200
+    return response.json()
+
+def progress(client, plan_id: int) -> dict:
+    response = client.get("/api/plans/stats")
+    assert response.status_code == 200
+    return next(p for p in response.json()["plans"] if p["plan_id"] == plan_id)
+
+def stats_row(plan_id: int) -> dict:
+    db = SessionLocal()
+    try:
+        row = db.get(models.PlanStats, plan_id)
+        # Timestamps differ by when they were taken; the rest must agree
+        return {
+            "item_count": row.item_count, "completed_count": row.completed_count, "score_sum": row.score_sum,
+            "overdue_count": row.overdue_count, "next_due_at": row.next_due_at, "latest_score": row.latest_score,
+            "scores": [(item_id, score) for _, item_id, score in json.loads(row.score_series)],
+        }
+    finally:
+        db.close()
+
+def test_chat_score_updates_the_plan_stats(client, reply):
+    plan = new_plan(client, {"content": "因数分解"}, {"content": "平方完成"})
+    item_id = plan["items"][0]["id"]
+    assert progress(client, plan["id"])["latest_score"] is None
+
+    for score in (40, 70):
+        reply[0] = f"いいですね [[SCORE: {score}]]"
+        response = client.post("/api/chat", json={
+            "message": "解けました", "session_id": f"progress-score-{plan['id']}", "current_mission_id": item_id
+        })
+        assert response.status_code == 200
+        client.portal.call(write_queue.drain)
+
+    stats = progress(client, plan["id"])
+    assert stats["latest_score"] == 70
+    assert stats["average_score"] == 35.0
+    assert [(p["item_id"], p["score"]) for p in stats["score_series"]] == [(item_id, 40), (item_id, 70)]
+
+def test_item_edits_update_the_plan_stats(client):
+    plan = new_plan(client, {"content": "英単語"}, {"content": "英文法"})
+    first, second = plan["items"]
+
+    response = client.put(f"/api/plans/{plan['id']}/items/{first['id']}", json={"content": "英単語", "is_completed": True})
+    assert response.status_code == 200
+    stats = progress(client, plan["id"])
+    assert (stats["completed_count"], stats["completion_ratio"]) == (1, 0.5)
+
+    response = client.post("/api/plans/batch", json={"plans": [
+        {"id": plan["id"], "title": "progress", "items": [{"id": second["id"], "content": "英文法", "understanding_score": 60}, {"content": "長文"}]}
+    ]})
+    assert response.status_code == 200
+    stats = progress(client, plan["id"])
+    assert (stats["item_count"], stats["completed_count"], stats["average_score"]) == (3, 1, 20.0)
+
+def test_overdue_count_follows_the_clock(client):
+    now = datetime.now()
+    plan = new_plan(
+        client,
+        {"content": "過去問", "due_date": (now + timedelta(days=1)).isoformat()},
+        {"content": "模試", "due_date": (now + timedelta(days=3)).isoformat()},
+    )
+    assert progress(client, plan["id"])["overdue_count"] == 0
+
+    db = SessionLocal()
+    try:
+        refresh_stale(db, 1, now + timedelta(hours=1))
+        assert stats_row(plan["id"])["overdue_count"] == 0
+        for days, overdue in ((2, 1), (4, 2)):
+            assert refresh_stale(db, 1, now + timedelta(days=days))
+            db.commit()
+            assert stats_row(plan["id"])["overdue_count"] == overdue
+        # Both passed: no next due date to wait for
+        assert stats_row(plan["id"])["next_due_at"] is None
+    finally:
+        db.close()
+
+def test_incremental_stats_match_a_rebuild(client, reply):
+    plan = new_plan(client, {"content": "漢字"}, {"content": "古文"}, {"content": "現代文"})
+    first, second, third = plan["items"]
+    for item, score in ((first, 50), (second, 80), (first, 90)):
+        reply[0] = f"[[SCORE: {score}]]"
+        client.post("/api/chat", json={"message": "どう？", "session_id": "progress-rebuild", "current_mission_id": item["id"]})
+    client.portal.call(write_queue.drain)
+    client.put(f"/api/plans/{plan['id']}/items/{third['id']}", json={"content": "現代文", "is_completed": True})
+    incremental = stats_row(plan["id"])
+
+    # What the migration computes from the items and the chat history
+    db = SessionLocal()
+    try:
+        db.query(models.PlanStats).delete()
+        rebuild_plan_stats(db)
+        db.commit()
+    finally:
+        db.close()
+    assert stats_row(plan["id"]) == incremental
+    assert incremental["scores"] == [(first["id"], 50), (second["id"], 80), (first["id"], 90)]
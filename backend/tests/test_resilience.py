@@ -0,0 +1,87 @@
+"""Hedged LLM calls: scheduler accounting and cancellation."""
+import asyncio
+
+from app.resilience import RetryPolicy
+from app.scheduler import LLMScheduler
+
+def hedging_policy() -> RetryPolicy:
+    policy = RetryPolicy(max_attempts=1, hedge=True, hedge_min_delay=0.02)
+    for _ in range(policy.latency.min_samples):
+        policy.latency.add(0.001)
+    return policy
+
+class Upstream:
+    """Fake upstream: the first request hangs for `first_delay`, later ones answer quickly."""
+
+    def __init__(self, scheduler: LLMScheduler, first_delay: float = 0.5):
+        self.scheduler = scheduler
+        self.first_delay = first_delay
+        self.in_flight_seen = []
+        self.cancelled = 0
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        number = self.calls
+        self.in_flight_seen.append(self.scheduler.in_flight)
+        try:
+            await asyncio.sleep(self.first_delay if number == 1 else 0.01)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return f"reply {number}"
+
+def test_hedge_takes_its_own_slot():
+    async def scenario():
+        scheduler = LLMScheduler(requests_per_minute=60, max_in_flight=4)
+        policy = hedging_policy()
+        upstream = Upstream(scheduler)
+        result = await policy.call(upstream, slot=lambda: scheduler.slot("u", 10))
+        return scheduler, policy, upstream, result
+
+    scheduler, policy, upstream, result = asyncio.run(scenario())
+    assert result == "reply 2"
+    assert policy.hedges_started == policy.hedges_won == 1
+    # The hedge ran with both slots taken, and both were charged and released
+    assert upstream.in_flight_seen == [1, 2]
+    assert scheduler.granted == 2
+    assert scheduler.in_flight == 0
+    assert scheduler.requests.level < 59
+
+def test_hedge_waits_for_a_free_slot():
+    async def scenario():
+        scheduler = LLMScheduler(max_in_flight=1)
+        policy = hedging_policy()
+        upstream = Upstream(scheduler, first_delay=0.1)
+        result = await policy.call(upstream, slot=lambda: scheduler.slot("u"))
+        return scheduler, policy, upstream, result
+
+    scheduler, policy, upstream, result = asyncio.run(scenario())
+    # The only slot was the first request's, so the hedge never went upstream
+    assert result == "reply 1"
+    assert policy.hedges_started == 1 and policy.hedges_won == 0
+    assert upstream.calls == 1
+    assert scheduler.in_flight == 0 and scheduler.stats()["queue_depth"] == 0
+
+def test_cancel_before_hedge_cancels_first_request():
+    async def scenario():
+        scheduler = LLMScheduler(max_in_flight=4)
+        policy = hedging_policy()
+        policy.hedge_min_delay = 1.0
+        upstream = Upstream(scheduler)
+        task = asyncio.ensure_future(policy.call(upstream, slot=lambda: scheduler.slot("u")))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        # Let the cancelled upstream request unwind; checked here, before
+        # asyncio.run cancels whatever is left over
+        await asyncio.sleep(0.01)
+        return scheduler.in_flight, upstream.calls, upstream.cancelled
+
+    in_flight, calls, cancelled = asyncio.run(scenario())
+    assert calls == 1
+    assert cancelled == 1
+    assert in_flight == 0
@@ -0,0 +1,123 @@
+"""Response cache: which turns use it, and TTL / LRU eviction."""
+import io
+from datetime import datetime, timedelta
+
+import PIL.Image
+import pytest
+
+from app import models
+from app.database import SessionLocal
+from app.jobs import write_queue
+from app.response_cache import ResponseCache, response_cache
+
+@pytest.fixture
+def cache_on(monkeypatch):
+    monkeypatch.setattr(response_cache, "enabled", True)
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    session.query(models.ResponseCacheEntry).delete()
+    session.commit()
+    try:
+        yield session
+    finally:
+        session.close()
+
+def lookups() -> tuple:
+    stats = response_cache.stats()
+    return stats["hits"], stats["misses"]
+
+def chat(client, message: str, session_id: str, **extra) -> dict:
+    response = client.post("/api/chat", json={"message": message, "session_id": session_id, **extra})
+    assert response.status_code == 200
+    client.portal.call(write_queue.drain)
+    return response.json()
+
+def uploaded_image(client, color) -> str:
+    session_id = client.get("/api/upload/session/new").json()["session_id"]
+    buf = io.BytesIO()
+    PIL.Image.new("RGB", (32, 32), color).save(buf, format="PNG")
+    response = client.post(f"/api/upload/upload/{session_id}", files={"file": ("a.png", buf.getvalue(), "image/png")})
+    return response.json()["file_path"]
+
+def cached_keys(db) -> set:
+    return {key for key, in db.query(models.ResponseCacheEntry.key)}
+
+def test_repeated_opening_question_is_served_from_the_cache(client, cache_on, db):
+    hits, misses = lookups()
+    first = chat(client, "光合成って何？", "cache-open-1")
+    second = chat(client, "光合成って何", "cache-open-2")
+    assert lookups() == (hits + 1, misses + 1)
+    assert second["response"] == first["response"]
+
+def test_mission_turns_bypass_the_cache(client, cache_on, db):
+    plan = client.post("/api/plans", json={"title": "cache", "items": [{"content": "光合成"}]}).json()
+    mission = {"current_mission_id": plan["items"][0]["id"]}
+
+    hits, misses = lookups()
+    chat(client, "光合成とは？", "cache-mission-1", **mission)
+    chat(client, "光合成とは？", "cache-mission-2", **mission)
+    assert lookups() == (hits, misses)
+    assert cached_keys(db) == set()
+
+def test_image_turns_do_not_share_text_or_other_images_replies(client, cache_on, db):
+    red, blue = uploaded_image(client, "red"), uploaded_image(client, "blue")
+    chat(client, "これは何？", "cache-image-text")
+
+    hits, misses = lookups()
+    chat(client, "これは何？", "cache-image-red", image_url=red)
+    chat(client, "これは何？", "cache-image-blue", image_url=blue)
+    assert lookups() == (hits, misses + 2)
+    assert len(cached_keys(db)) == 3
+
+    # The same picture again is the same question
+    chat(client, "これは何？", "cache-image-red-again", image_url=red)
+    assert lookups() == (hits + 1, misses + 2)
+
+def test_turn_with_an_unloadable_image_bypasses_the_cache(client, cache_on, db):
+    chat(client, "これは何？", "cache-missing-text")
+
+    hits, misses = lookups()
+    chat(client, "これは何？", "cache-missing-image", image_url="uploads/missing.png")
+    assert lookups() == (hits, misses)
+    assert len(cached_keys(db)) == 1
+
+def test_expired_entry_is_a_miss_and_is_deleted(client, db):
+    cache = ResponseCache(enabled=True, ttl=60)
+    cache.put(db, "fresh", "新しい")
+    cache.put(db, "stale", "古い")
+    db.query(models.ResponseCacheEntry).filter(models.ResponseCacheEntry.key == "stale").update(
+        {"created_at": datetime.now() - timedelta(seconds=61)}
+    )
+
+    assert cache.get(db, "fresh") == "新しい"
+    assert cache.get(db, "stale") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+    db.flush()
+    assert cached_keys(db) == {"fresh"}
+
+def test_put_evicts_expired_entries(client, db):
+    cache = ResponseCache(enabled=True, ttl=60)
+    cache.put(db, "stale", "古い")
+    db.query(models.ResponseCacheEntry).update({"created_at": datetime.now() - timedelta(seconds=61)})
+
+    cache.put(db, "new", "新しい")
+    assert cached_keys(db) == {"new"}
+    assert cache.evictions == 1
+
+def test_put_evicts_least_recently_used_beyond_max_entries(client, db):
+    cache = ResponseCache(enabled=True, max_entries=2)
+    start = datetime.now() - timedelta(minutes=10)
+    for i, key in enumerate(["a", "b"]):
+        cache.put(db, key, key)
+        db.query(models.ResponseCacheEntry).filter(models.ResponseCacheEntry.key == key).update(
+            {"last_used_at": start + timedelta(minutes=i)}
+        )
+
+    # "a" is older but was just read, so "b" is the least recently used
+    assert cache.get(db, "a") == "a"
+    db.flush()
+    cache.put(db, "c", "c")
+    assert cached_keys(db) == {"a", "c"}
+    assert cache.evictions == 1
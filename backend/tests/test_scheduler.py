@@ -0,0 +1,91 @@
+"""LLM scheduler: per-user fairness, the bounded queue, max wait and output-token charging."""
+import asyncio
+
+import pytest
+
+from app.scheduler import LLMScheduler, SchedulerBusy, llm_scheduler
+
+BUSY = "AIが混雑しています。しばらくしてから再度お試しください。"
+
+def test_users_are_served_round_robin():
+    async def scenario():
+        scheduler = LLMScheduler(max_in_flight=1)
+        await scheduler.acquire("holder")
+        order = []
+
+        async def turn(user, n):
+            async with scheduler.slot(user):
+                order.append(f"{user}{n}")
+                await asyncio.sleep(0)
+
+        # One student queues three messages before another sends one
+        tasks = [asyncio.ensure_future(turn("a", n)) for n in (1, 2, 3)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.ensure_future(turn("b", 1)))
+        await asyncio.sleep(0)
+        assert scheduler.stats()["queue_depth"] == 4
+        assert scheduler.stats()["queued_users"] == 2
+
+        scheduler.release()
+        await asyncio.gather(*tasks)
+        return order, scheduler.stats()
+
+    order, stats = asyncio.run(scenario())
+    assert order == ["a1", "b1", "a2", "a3"]
+    assert (stats["in_flight"], stats["queue_depth"]) == (0, 0)
+
+def test_full_queue_is_rejected_with_retry_after():
+    async def scenario():
+        scheduler = LLMScheduler(requests_per_minute=60, max_in_flight=1, max_queue=1)
+        await scheduler.acquire("holder")
+        waiting = asyncio.ensure_future(scheduler.acquire("a"))
+        await asyncio.sleep(0)
+        with pytest.raises(SchedulerBusy) as busy:
+            await scheduler.acquire("b")
+        scheduler.release()
+        await waiting
+        return busy.value, scheduler.stats()
+
+    busy, stats = asyncio.run(scenario())
+    # One request ahead in the queue plus this one, at one request a second
+    assert busy.retry_after == 2
+    assert stats["rejected"] == 1
+
+def test_wait_longer_than_max_wait_is_rejected():
+    async def scenario():
+        scheduler = LLMScheduler(max_in_flight=1, max_wait=0.05)
+        await scheduler.acquire("holder")
+        with pytest.raises(SchedulerBusy):
+            await scheduler.acquire("a")
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    # The expired request left the queue and holds no slot
+    assert (stats["queue_depth"], stats["queued_users"], stats["in_flight"]) == (0, 0, 1)
+    assert stats["rejected"] == 1
+
+def test_output_tokens_are_charged_to_the_budget():
+    scheduler = LLMScheduler(tokens_per_minute=600)
+    assert scheduler.tokens.delay_for(100) == 0
+    # A long reply spends the budget the next prompt needs
+    scheduler.charge(600)
+    assert scheduler.tokens.delay_for(100) > 0
+    assert scheduler.stats()["output_tokens"] == 600
+
+@pytest.fixture
+def saturated(monkeypatch):
+    """Every slot taken and no room in the queue."""
+    monkeypatch.setattr(llm_scheduler, "in_flight", llm_scheduler.max_in_flight)
+    monkeypatch.setattr(llm_scheduler, "max_queue", 0)
+
+@pytest.mark.parametrize("path", ["/api/chat", "/api/chat/stream"])
+def test_busy_scheduler_answers_503(client, saturated, path):
+    response = client.post(path, json={"message": "混んでる？", "session_id": "scheduler-busy"})
+    assert response.status_code == 503
+    assert response.json()["detail"] == BUSY
+    assert int(response.headers["retry-after"]) >= 1
+
+def test_chat_reply_is_charged(client):
+    before = llm_scheduler.stats()["output_tokens"]
+    assert client.post("/api/chat", json={"message": "こんにちは", "session_id": "scheduler-charge"}).status_code == 200
+    assert llm_scheduler.stats()["output_tokens"] > before
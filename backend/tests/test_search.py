@@ -0,0 +1,112 @@
+"""Unified chat/plan search: index sync, short terms, paging and scoping to the owner."""
+from app import models
+from app.database import SessionLocal
+
+# The demo user every request runs as
+USER_ID = 1
+
+def add_rows(*rows):
+    db = SessionLocal()
+    try:
+        db.add_all(rows)
+        db.commit()
+        return [row.id for row in rows]
+    finally:
+        db.close()
+
+def add_chat(session_id: str, *contents, user_id: int = USER_ID) -> list:
+    return add_rows(*(
+        models.ChatMessage(user_id=user_id, session_id=session_id, role="user", content=content)
+        for content in contents
+    ))
+
+def other_user_id() -> int:
+    db = SessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.username == "other_student").first()
+        if not user:
+            user = models.User(username="other_student", email="other@example.com")
+            db.add(user)
+            db.commit()
+        return user.id
+    finally:
+        db.close()
+
+def update_row(model, row_id: int, **values):
+    db = SessionLocal()
+    try:
+        db.query(model).filter(model.id == row_id).update(values)
+        db.commit()
+    finally:
+        db.close()
+
+def delete_row(model, row_id: int):
+    db = SessionLocal()
+    try:
+        db.query(model).filter(model.id == row_id).delete()
+        db.commit()
+    finally:
+        db.close()
+
+def found(client, q: str, **params) -> list:
+    response = client.get("/api/search", params={"q": q, **params})
+    assert response.status_code == 200
+    return [(result["kind"], result["id"]) for result in response.json()]
+
+def all_pages(client, path: str, params: dict) -> list:
+    ids, cursor = [], None
+    while True:
+        response = client.get(path, params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        ids += [result["id"] for result in response.json()]
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            return ids
+
+def test_search_index_follows_chat_and_plan_item_changes(client):
+    message_id, = add_chat("search-sync", "ミトコンドリアの働き")
+    plan = client.post("/api/plans", json={"title": "生物", "items": [{"content": "葉緑体の構造"}]}).json()
+    item_id = plan["items"][0]["id"]
+    assert found(client, "ミトコンドリア") == [("chat", message_id)]
+    assert found(client, "葉緑体") == [("plan", item_id)]
+
+    # Plan items are found by their last result too
+    update_row(models.PlanItem, item_id, content="細胞膜の構造", last_result="ミトコンドリア小テスト8割")
+    assert found(client, "葉緑体") == []
+    assert sorted(found(client, "ミトコンドリア")) == [("chat", message_id), ("plan", item_id)]
+
+    delete_row(models.ChatMessage, message_id)
+    assert client.delete(f"/api/plans/{plan['id']}").status_code == 204
+    assert found(client, "ミトコンドリア") == []
+    assert found(client, "細胞膜") == []
+
+def test_short_terms_fall_back_to_like(client):
+    message_id, = add_chat("search-short", "古文の宿題が多い")
+    add_chat("search-short", "漢文の宿題")
+
+    # Under three characters the trigram index can't match; LIKE does
+    result, = client.get("/api/search", params={"q": "古文", "session_id": "search-short"}).json()
+    assert (result["id"], result["snippet"]) == (message_id, "<mark>古文</mark>の宿題が多い")
+    assert found(client, "宿題 古文", session_id="search-short") == [("chat", message_id)]
+    # Mixed with a long term, the short one still narrows the FTS matches
+    assert found(client, "宿題が 漢文", session_id="search-short") == []
+
+def test_search_pages_continue_without_gaps_or_repeats(client):
+    ids = add_chat("search-pages", *("二次関数のグラフ" + "。" * (i % 5) for i in range(23)))
+
+    params = {"q": "二次関数", "kind": "chat"}
+    paged = all_pages(client, "/api/search", {**params, "limit": 5})
+    assert paged == [ref_id for _, ref_id in found(client, **params, limit=100)]
+    assert sorted(paged) == sorted(ids)
+
+def test_other_users_rows_are_never_found(client):
+    other = other_user_id()
+    mine, = add_chat("search-owner", "三角関数の公式")
+    add_chat("search-owner", "三角関数の問題", user_id=other)
+    plan_id, = add_rows(models.Plan(user_id=other, title="三角関数"))
+    add_rows(models.PlanItem(plan_id=plan_id, content="三角関数の演習"))
+
+    assert found(client, "三角関数") == [("chat", mine)]
+    assert found(client, "三角関数", session_id="search-owner") == [("chat", mine)]
+    assert found(client, "三角") == [("chat", mine)]
+    assert found(client, "三角関数", kind="plan") == []
@@ -0,0 +1,100 @@
+"""SQLiteBus: events crossing workers, and settings changes reaching another worker's cache.
+
+Two SQLiteBus instances on the test database stand in for two workers.
+"""
+import time
+
+import pytest
+
+from app import deps, models
+from app.cache import TTLCache, settings_cache
+from app.database import SessionLocal
+from app.deps import CachedSettings
+from app.shared import SQLiteBus
+
+# The demo user every request runs as
+USER_ID = 1
+
+def wait_until(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+@pytest.fixture
+def worker(client):
+    """Starts SQLiteBus instances on the app's loop and stops them afterwards."""
+    started = []
+
+    def start(**kwargs) -> SQLiteBus:
+        bus = SQLiteBus(poll_interval=0.01, **kwargs)
+        client.portal.call(bus.start)
+        started.append(bus)
+        return bus
+
+    yield start
+    for bus in started:
+        client.portal.call(bus.stop)
+
+def recorder(bus: SQLiteBus, channel: str) -> list:
+    events = []
+    bus.subscribe(channel, lambda key, value: events.append((key, value)))
+    return events
+
+def test_event_reaches_the_other_worker_once(worker):
+    first, second = worker(), worker()
+    seen_first, seen_second = recorder(first, "test"), recorder(second, "test")
+
+    first.publish("test", "key", "value")
+    wait_until(lambda: seen_second)
+    # Let both poll a few more times: nothing is delivered twice
+    time.sleep(0.05)
+    assert seen_first == [("key", "value")]
+    assert seen_second == [("key", "value")]
+    assert (first.received, second.received) == (0, 1)
+
+def test_events_before_start_are_not_replayed(worker):
+    first = worker()
+    first.publish("test", "old", None)
+    second = worker()
+    seen = recorder(second, "test")
+
+    first.publish("test", "new", None)
+    wait_until(lambda: seen)
+    time.sleep(0.05)
+    assert seen == [("new", None)]
+
+def test_settings_change_reaches_the_other_workers_cache(client, worker, monkeypatch):
+    # This worker: publishes through its own bus and caches in its own memory
+    this_worker = SQLiteBus()
+    this_cache = TTLCache()
+
+    def cache_here(settings):
+        cached = CachedSettings(id=settings.id, learning_mode=settings.learning_mode)
+        this_cache.set(settings.user_id, cached)
+        return cached
+
+    monkeypatch.setattr(deps, "bus", this_worker)
+    monkeypatch.setattr(deps, "cache_settings", cache_here)
+
+    # The other worker: the process-wide settings_cache, kept by its bus
+    other_worker = worker()
+    other_worker.subscribe("settings", deps._on_settings_changed)
+    before = client.get("/api/settings").json()
+    settings_cache.set(USER_ID, CachedSettings(id=before["id"], learning_mode="supportive"))
+
+    try:
+        assert client.put("/api/settings", json={"learning_mode": "exam"}).status_code == 200
+        assert this_cache.get(USER_ID).learning_mode == "exam"
+        wait_until(lambda: settings_cache.get(USER_ID).learning_mode == "exam")
+        assert other_worker.received == 1
+    finally:
+        db = SessionLocal()
+        try:
+            db.query(models.UserSettings).filter(models.UserSettings.user_id == USER_ID).update(
+                {"learning_mode": before["learning_mode"]}
+            )
+            db.commit()
+        finally:
+            db.close()
+        settings_cache.invalidate(USER_ID)
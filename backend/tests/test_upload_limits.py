@@ -0,0 +1,103 @@
+"""Upload size limits, corrupt images, and the upload's DB connection use."""
+import io
+
+import PIL.Image
+import pytest
+from starlette.requests import Request
+
+from app import images
+from app.database import engine
+
+TOO_LARGE = "画像サイズが大きすぎます"
+UNSUPPORTED = "対応していない画像形式です（JPEG/PNG/WebP/GIF）"
+
+def png_bytes(size=(64, 64)) -> bytes:
+    buf = io.BytesIO()
+    PIL.Image.effect_noise(size, 64).convert("RGB").save(buf, format="PNG")
+    return buf.getvalue()
+
+@pytest.fixture
+def session_id(client):
+    return client.get("/api/upload/session/new").json()["session_id"]
+
+@pytest.fixture
+def form_parses(monkeypatch):
+    """How many times a request form was parsed."""
+    calls = []
+    real_get_form = Request._get_form
+
+    async def get_form(self, **kwargs):
+        calls.append(1)
+        return await real_get_form(self, **kwargs)
+
+    monkeypatch.setattr(Request, "_get_form", get_form)
+    return calls
+
+def upload(client, session_id, data: bytes, **kwargs):
+    return client.post(f"/api/upload/upload/{session_id}", files={"file": ("a.png", data, "image/png")}, **kwargs)
+
+def test_declared_oversize_rejected_before_parsing(client, session_id, monkeypatch, form_parses):
+    monkeypatch.setattr(images, "MAX_UPLOAD_BYTES", 1000)
+    response = upload(client, session_id, b"\x89PNG\r\n\x1a\n" + b"\0" * 200_000)
+    assert response.status_code == 413
+    assert response.json()["detail"] == TOO_LARGE
+    assert form_parses == []
+
+def test_chunked_oversize_rejected_while_receiving(client, session_id, monkeypatch):
+    monkeypatch.setattr(images, "MAX_UPLOAD_BYTES", 1000)
+    boundary = "limit-test"
+
+    def body():
+        yield (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.png\"\r\n"
+               "Content-Type: image/png\r\n\r\n").encode()
+        for _ in range(100):
+            yield b"\0" * 64 * 1024
+        yield f"\r\n--{boundary}--\r\n".encode()
+
+    response = client.post(
+        f"/api/upload/upload/{session_id}", content=body(),
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    )
+    assert "content-length" not in response.request.headers
+    assert response.status_code == 413
+    assert response.json()["detail"] == TOO_LARGE
+
+def test_file_over_limit_within_form_overhead(client, session_id, monkeypatch):
+    # Passes the body check (limit + form overhead) but not the file check
+    monkeypatch.setattr(images, "MAX_UPLOAD_BYTES", 1000)
+    response = upload(client, session_id, b"\x89PNG\r\n\x1a\n" + b"\0" * 2000)
+    assert response.status_code == 413
+
+def test_truncated_png_is_unsupported(client, session_id):
+    data = png_bytes()
+    response = upload(client, session_id, data[:len(data) // 2])
+    assert response.status_code == 415
+    assert response.json()["detail"] == UNSUPPORTED
+
+def test_decompression_bomb_is_too_large(client, session_id, monkeypatch):
+    monkeypatch.setattr(PIL.Image, "MAX_IMAGE_PIXELS", 100)
+    response = upload(client, session_id, png_bytes())
+    assert response.status_code == 413
+    assert response.json()["detail"] == TOO_LARGE
+
+def test_valid_png_is_stored(client, session_id):
+    response = upload(client, session_id, png_bytes())
+    assert response.status_code == 200
+    assert response.json()["file_path"] == f"uploads/{session_id}.png"
+
+def test_no_connection_held_while_the_file_is_processed(client, session_id, monkeypatch):
+    checked_out = []
+    for name in ("save_stream", "finalize_upload"):
+        real = getattr(images, name)
+
+        def recording(*args, real=real):
+            checked_out.append(engine.pool.checkedout())
+            return real(*args)
+
+        monkeypatch.setattr(images, name, recording)
+
+    response = upload(client, session_id, png_bytes())
+    assert response.status_code == 200
+    assert checked_out == [0, 0]
+    status = client.get(f"/api/upload/session/{session_id}/status").json()
+    assert status["has_image"] and status["image_path"] == f"uploads/{session_id}.png"
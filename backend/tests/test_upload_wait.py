@@ -0,0 +1,98 @@
+"""Long-poll upload waits: many waiters on one session, uploads racing the first read, pool use."""
+import io
+import asyncio
+import time
+
+import httpx
+from PIL import Image
+
+from main import app
+from app.database import engine
+from app.notifications import upload_notifier, UNKNOWN
+from app.routers import upload
+
+def png_bytes() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (4, 4), "red").save(buf, format="PNG")
+    return buf.getvalue()
+
+def new_session(client) -> str:
+    return client.get("/api/upload/session/new").json()["session_id"]
+
+WAITERS = 300
+
+def test_many_waiters_wake_on_upload(client):
+    waiters = WAITERS
+    session_id = new_session(client)
+
+    async def scenario():
+        # Same event loop as the app (the TestClient portal), so the bus delivers here
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as ac:
+            polls = [
+                asyncio.ensure_future(ac.get(f"/api/upload/session/{session_id}/wait", params={"timeout": 30}))
+                for _ in range(waiters)
+            ]
+            while upload_notifier.waiter_count() < waiters:
+                await asyncio.sleep(0.01)
+
+            started = time.monotonic()
+            uploaded = await ac.post(f"/api/upload/upload/{session_id}", files={"file": ("a.png", png_bytes(), "image/png")})
+            responses = await asyncio.gather(*polls)
+            return uploaded, responses, time.monotonic() - started
+
+    uploaded, responses, elapsed = client.portal.call(scenario)
+    assert uploaded.status_code == 200
+    path = uploaded.json()["file_path"]
+    assert [r.status_code for r in responses] == [200] * waiters
+    assert all(r.json()["has_image"] and r.json()["image_path"] == path for r in responses)
+    # Woken by the notification, not by the 30 s timeout
+    assert elapsed < 10
+    assert upload_notifier.waiter_count() == 0
+
+def test_upload_during_first_read_is_not_lost(client, monkeypatch):
+    session_id = new_session(client)
+    # As if this process had never seen the session
+    upload_notifier._state.invalidate(session_id)
+    assert upload_notifier.latest(session_id) is UNKNOWN
+
+    real_run_db = upload.run_db
+
+    async def racing_run_db(fn, *args):
+        # The read sees the session without an image, then the upload's
+        # notification arrives before the waiter resumes
+        result = await real_run_db(fn, *args)
+        upload_notifier._on_event(session_id, "uploads/raced.png")
+        return result
+
+    monkeypatch.setattr(upload, "run_db", racing_run_db)
+    started = time.monotonic()
+    response = client.get(f"/api/upload/session/{session_id}/wait", params={"timeout": 5})
+
+    assert time.monotonic() - started < 4
+    assert response.json() == {"session_id": session_id, "has_image": True, "image_path": "uploads/raced.png"}
+    assert upload_notifier.latest(session_id) == "uploads/raced.png"
+
+def test_parked_waiter_holds_no_connection(client):
+    session_id = new_session(client)
+    # Forces the first-read path, which queries the DB before parking
+    upload_notifier._state.invalidate(session_id)
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as ac:
+            polls = [
+                asyncio.ensure_future(ac.get(f"/api/upload/session/{session_id}/wait", params={"timeout": 30}))
+                for _ in range(3)
+            ]
+            while upload_notifier.waiter_count() < 3:
+                await asyncio.sleep(0.01)
+            checked_out = engine.pool.checkedout()
+
+            # Other requests still get connections while the waiters are parked
+            history = await ac.get("/api/chat/history/pool-check")
+            await ac.post(f"/api/upload/upload/{session_id}", files={"file": ("a.png", png_bytes(), "image/png")})
+            return checked_out, history, await asyncio.gather(*polls)
+
+    checked_out, history, responses = client.portal.call(scenario)
+    assert checked_out == 0
+    assert history.status_code == 200
+    assert all(r.json()["has_image"] for r in responses)
@@ -3,7 +3,7 @@
 import { useState, useEffect, useRef, Suspense } from 'react';
 import { QRCodeSVG } from 'qrcode.react';
 import { useSearchParams } from 'next/navigation';
-import { createSession, getSessionStatus, sendChatMessage, createPlan, getPlans, updatePlanItem, getSettings, updateSettings, getChatHistory, clearSessionImage } from '@/lib/api';
+import { createSession, getSessionStatus, waitForUpload, streamChatMessage, createPlan, getPlans, updatePlanItem, getSettings, updateSettings, getChatHistory, clearSessionImage } from '@/lib/api';
 import VoiceInput from '@/components/VoiceInput';
 import PlanListWidget from '@/components/PlanListWidget';
 import MemoPad from '@/components/MemoPad';
@@ -43,7 +43,7 @@ function HomeContent() {
           // Verify session exists and load history
           const [status, history] = await Promise.all([
             getSessionStatus(sid),
-            getChatHistory(sid)
+            getChatHistory(sid, { limit: 100 })
           ]);
 
           if (history && history.length > 0) {
@@ -172,28 +172,35 @@ function HomeContent() {
     window.scrollTo({ top: document.body.scrollHeight, behavior: 'smooth' });
   };
 
-  // Poll for image upload status
+  // Wait for an image upload (long-poll, re-issued until an image arrives)
   useEffect(() => {
-    // Only poll if QR is showing AND hasn't already got an image
+    // Only wait if QR is showing AND hasn't already got an image
     if (!sessionId || !showQr || uploadedImage) return;
 
-    const interval = setInterval(async () => {
-      try {
-        const status = await getSessionStatus(sessionId);
-        if (status.has_image && status.image_path) {
-          setUploadedImage(status.image_path);
-          setShowQr(false);
-          alert("画像がアップロードされました！");
-
-          // Clear image status on backend immediately so it won't be picked up again
-          await clearSessionImage(sessionId);
+    const controller = new AbortController();
+    const waitLoop = async () => {
+      while (!controller.signal.aborted) {
+        try {
+          const status = await waitForUpload(sessionId, controller.signal);
+          if (status.has_image && status.image_path) {
+            setUploadedImage(status.image_path);
+            setShowQr(false);
+            alert("画像がアップロードされました！");
+
+            // Clear image status on backend immediately so it won't be picked up again
+            await clearSessionImage(sessionId);
+            return;
+          }
+        } catch (e) {
+          if (controller.signal.aborted) return;
+          console.error("Upload wait error", e);
+          await new Promise(resolve => setTimeout(resolve, 2000));
         }
-      } catch (e) {
-        console.error("Polling error", e);
       }
-    }, 2000);
+    };
+    waitLoop();
 
-    return () => clearInterval(interval);
+    return () => controller.abort();
   }, [sessionId, uploadedImage, showQr]);
 
   const handleSend = async () => {
@@ -205,14 +212,31 @@ function HomeContent() {
     setLoading(true);
 
     try {
-      const res = await sendChatMessage(
+      let started = false;
+      const res = await streamChatMessage(
         input,
+        (text: string) => {
+          // Replace the typing indicator with the reply as soon as the first tokens arrive
+          if (!started) {
+            started = true;
+            setLoading(false);
+            setMessages((prev: any) => [...prev, { role: 'assistant', content: text }]);
+          } else {
+            setMessages((prev: any) => {
+              const last = prev[prev.length - 1];
+              return [...prev.slice(0, -1), { ...last, content: last.content + text }];
+            });
+          }
+        },
         sessionId || undefined,
         uploadedImage || undefined,
         currentMission?.id
       );
 
-      setMessages((prev: any) => [...prev, { role: 'assistant', content: res.response }]);
+      // Settle on the server's trimmed text once the stream is complete
+      setMessages((prev: any) => started
+        ? [...prev.slice(0, -1), { role: 'assistant', content: res.response }]
+        : [...prev, { role: 'assistant', content: res.response }]);
 
       // Update understanding score if returned
       if (res.understanding_score !== undefined && res.understanding_score !== null && currentMission) {
@@ -1,14 +1,17 @@
 'use client';
 import { useState, useEffect } from 'react';
 import Link from 'next/link';
-import { getPlans } from '@/lib/api';
+import { getPlanStats } from '@/lib/api';
 
 interface Plan {
-    id: number;
+    plan_id: number;
     title: string;
     target?: string;
     created_at: string;
-    items: { is_completed: boolean }[];
+    item_count: number;
+    completed_count: number;
+    completion_ratio: number;
+    overdue_count: number;
 }
 
 export default function PlansPage() {
@@ -16,8 +19,8 @@ export default function PlansPage() {
     const [loading, setLoading] = useState(true);
 
     useEffect(() => {
-        getPlans()
-            .then(setPlans)
+        getPlanStats()
+            .then(stats => setPlans(stats.plans))
             .catch(console.error)
             .finally(() => setLoading(false));
     }, []);
@@ -48,11 +51,10 @@ export default function PlansPage() {
                 ) : (
                     <div className="grid gap-6 md:grid-cols-2">
                         {plans.map((plan) => {
-                            const completedCount = plan.items.filter(i => i.is_completed).length;
-                            const progress = plan.items.length > 0 ? (completedCount / plan.items.length) * 100 : 0;
+                            const progress = plan.completion_ratio * 100;
 
                             return (
-                                <Link key={plan.id} href={`/plans/${plan.id}`} className="block group">
+                                <Link key={plan.plan_id} href={`/plans/${plan.plan_id}`} className="block group">
                                     <div className="bg-white/80 backdrop-blur-md rounded-2xl p-6 shadow-xl border border-white/50 hover:scale-105 transition-all duration-300">
                                         <div className="flex justify-between items-start mb-4">
                                             <div>
@@ -67,7 +69,7 @@ export default function PlansPage() {
                                         <div className="space-y-2">
                                             <div className="flex justify-between text-sm font-medium text-gray-600">
                                                 <span>進捗状況</span>
-                                                <span>{Math.round(progress)}% ({completedCount}/{plan.items.length})</span>
+                                                <span>{Math.round(progress)}% ({plan.completed_count}/{plan.item_count})</span>
                                             </div>
                                             <div className="w-full bg-gray-200 rounded-full h-2.5 overflow-hidden">
                                                 <div
@@ -14,6 +14,13 @@ export const getSessionStatus = async (sessionId: string) => {
   return res.json();
 };
 
+// Long-poll: resolves as soon as an image is uploaded, or with has_image=false after the timeout
+export const waitForUpload = async (sessionId: string, signal?: AbortSignal, timeoutSeconds = 25) => {
+  const res = await fetch(`${API_BASE_URL}/upload/session/${sessionId}/wait?timeout=${timeoutSeconds}`, { signal });
+  if (!res.ok) throw new Error('Failed to wait for upload');
+  return res.json();
+};
+
 export const uploadImage = async (sessionId: string, file: File) => {
   const formData = new FormData();
   formData.append('file', file);
@@ -45,8 +52,68 @@ export const sendChatMessage = async (message: string, sessionId?: string, image
   return res.json();
 };
 
-export const getChatHistory = async (sessionId: string) => {
-  const res = await fetch(`${API_BASE_URL}/chat/history/${sessionId}`);
+// Streams the reply over Server-Sent Events; onDelta receives visible text as it arrives.
+export const streamChatMessage = async (
+  message: string,
+  onDelta: (text: string) => void,
+  sessionId?: string,
+  imageUrl?: string,
+  currentMissionId?: number
+) => {
+  const res = await fetch(`${API_BASE_URL}/chat/stream`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({
+      message,
+      session_id: sessionId,
+      image_url: imageUrl,
+      current_mission_id: currentMissionId
+    }),
+  });
+
+  if (!res.ok || !res.body) throw new Error('Failed to send message');
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let text = '';
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let sep;
+    while ((sep = buffer.indexOf('\n\n')) !== -1) {
+      const line = buffer.slice(0, sep).trim();
+      buffer = buffer.slice(sep + 2);
+      if (!line.startsWith('data:')) continue;
+
+      const event = JSON.parse(line.slice(5));
+      if (event.type === 'delta') {
+        text += event.text;
+        onDelta(event.text);
+      } else if (event.type === 'done') {
+        return { response: text.trim(), understanding_score: event.understanding_score, extracted_result: event.extracted_result };
+      } else if (event.type === 'error') {
+        throw new Error(event.detail);
+      }
+    }
+  }
+  throw new Error('Stream ended unexpectedly');
+};
+
+// afterId fetches only newer messages; beforeId pages back through older ones.
+// The server sends an ETag, so an unchanged history is revalidated with a 304.
+export const getChatHistory = async (sessionId: string, options: { afterId?: number, beforeId?: number, limit?: number } = {}) => {
+  const params = new URLSearchParams();
+  if (options.afterId !== undefined) params.append('after_id', String(options.afterId));
+  if (options.beforeId !== undefined) params.append('before_id', String(options.beforeId));
+  if (options.limit !== undefined) params.append('limit', String(options.limit));
+  const query = params.toString() ? `?${params.toString()}` : '';
+
+  const res = await fetch(`${API_BASE_URL}/chat/history/${sessionId}${query}`);
   if (!res.ok) throw new Error('Failed to fetch chat history');
   return res.json();
 };
@@ -68,6 +135,29 @@ export const createPlan = async (title: string, items: { content: string, is_com
   return res.json();
 };
 
+// Creates or updates many plans in one request; entries with an id are updated
+export const upsertPlans = async (plans: {
+  id?: number,
+  title: string,
+  target?: string,
+  items: { id?: number, content: string, is_completed?: boolean, priority?: number }[]
+}[]) => {
+  const res = await fetch(`${API_BASE_URL}/plans/batch`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ plans }),
+  });
+  if (!res.ok) throw new Error('Failed to save plans');
+  return res.json();
+};
+
+// Progress of every plan (completion, understanding, overdue items) without the items themselves
+export const getPlanStats = async () => {
+  const res = await fetch(`${API_BASE_URL}/plans/stats`);
+  if (!res.ok) throw new Error('Failed to fetch plan stats');
+  return res.json();
+};
+
 export const getPlan = async (id: number) => {
   const res = await fetch(`${API_BASE_URL}/plans/${id}`);
   if (!res.ok) throw new Error('Failed to fetch plan');
@@ -91,6 +181,17 @@ export const getMemos = async () => {
   return res.json();
 };
 
+// Full-text search; snippets are HTML-escaped with matches wrapped in <mark>
+export const searchMemos = async (q: string, options: { sort?: 'relevance' | 'recent', cursor?: string, limit?: number } = {}) => {
+  const params = new URLSearchParams({ q });
+  if (options.sort) params.set('sort', options.sort);
+  if (options.cursor) params.set('cursor', options.cursor);
+  if (options.limit) params.set('limit', String(options.limit));
+  const res = await fetch(`${API_BASE_URL}/memos/search?${params}`);
+  if (!res.ok) throw new Error('Failed to search memos');
+  return { results: await res.json(), nextCursor: res.headers.get('X-Next-Cursor') };
+};
+
 export const createMemo = async (content: string) => {
   const res = await fetch(`${API_BASE_URL}/memos/`, {
     method: 'POST',
@@ -109,6 +210,19 @@ export const deleteMemo = async (id: number) => {
   return true;
 };
 
+/* --- Search API --- */
+// Ranked search over the user's chat messages and plan items
+export const searchAll = async (q: string, options: { kind?: 'chat' | 'plan', sessionId?: string, cursor?: string, limit?: number } = {}) => {
+  const params = new URLSearchParams({ q });
+  if (options.kind) params.set('kind', options.kind);
+  if (options.sessionId) params.set('session_id', options.sessionId);
+  if (options.cursor) params.set('cursor', options.cursor);
+  if (options.limit) params.set('limit', String(options.limit));
+  const res = await fetch(`${API_BASE_URL}/search?${params}`);
+  if (!res.ok) throw new Error('Failed to search');
+  return { results: await res.json(), nextCursor: res.headers.get('X-Next-Cursor') };
+};
+
 /* --- Settings API --- */
 export const getSettings = async () => {
   const res = await fetch(`${API_BASE_URL}/settings/`);
@@ -127,16 +241,18 @@ export const updateSettings = async (learningMode: string) => {
 };
 
 /* --- Admin API --- */
-export const getAdminLogs = async (username?: string, sessionId?: string) => {
-  let url = `${API_BASE_URL}/admin/logs`;
+// Newest first; pass nextCursor back as `cursor` for the next (older) page
+export const getAdminLogs = async (options: { username?: string, sessionId?: string, since?: string, until?: string, cursor?: string, limit?: number } = {}) => {
   const params = new URLSearchParams();
-  if (username) params.append('username', username);
-  if (sessionId) params.append('session_id', sessionId);
-  if (params.toString()) url += `?${params.toString()}`;
-
-  const res = await fetch(url);
+  if (options.username) params.set('username', options.username);
+  if (options.sessionId) params.set('session_id', options.sessionId);
+  if (options.since) params.set('since', options.since);
+  if (options.until) params.set('until', options.until);
+  if (options.cursor) params.set('cursor', options.cursor);
+  if (options.limit) params.set('limit', String(options.limit));
+  const res = await fetch(`${API_BASE_URL}/admin/logs?${params}`);
   if (!res.ok) throw new Error('Failed to fetch admin logs');
-  return res.json();
+  return { results: await res.json(), nextCursor: res.headers.get('X-Next-Cursor') };
 };
 
 export const clearSessionImage = async (sessionId: string) => {